@@ -1,5 +1,25 @@
-# from . import src 
-from .linalg.nufft_cpu import NUFFT_cpu, NUFFT_excalibur#, NUFFT_mCoil, NUFFT_excalibur
-from .linalg.nufft_hsa import NUFFT_hsa
-from .linalg.nufft_hsa_legacy import NUFFT_hsa_legacy
+# from . import src
+from .linalg.nufft_cpu import NUFFT_cpu, NUFFT_multiframe, NUFFT_excalibur#, NUFFT_mCoil, NUFFT_excalibur
+from .linalg.plan_registry import PlanRegistry
 from .src._helper import helper
+
+# The heterogeneous (HSA) classes are imported at the first access,
+# so that the CPU-only programs do not pay for importing them.
+_lazy_classes = {'NUFFT_hsa': '.linalg.nufft_hsa',
+                 'NUFFT_hsa_legacy': '.linalg.nufft_hsa_legacy'}
+
+import sys as _sys
+if _sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name in _lazy_classes:
+            import importlib
+            value = getattr(importlib.import_module(_lazy_classes[name], __name__), name)
+            globals()[name] = value
+            return value
+        raise AttributeError('module ' + __name__ + ' has no attribute ' + name)
+
+    def __dir__():
+        return sorted(list(globals().keys()) + list(_lazy_classes.keys()))
+else: # module __getattr__ (PEP 562) is not available
+    from .linalg.nufft_hsa import NUFFT_hsa
+    from .linalg.nufft_hsa_legacy import NUFFT_hsa_legacy
@@ -0,0 +1,92 @@
+"""
+Benchmark of the finite differences and the shrinkage of L1TVOLS on the 2D and 3D phantoms
+
+The former implementation (cDiff through the index maps of helper.indxmap_diff(), 
+and the temporary arrays of the shrinkage) is compared with the in-place _TVEngine of solve_cpu, 
+with and without threads: 
+
+    python benchmark_L1TVOLS.py [threads]
+"""
+import sys
+import time
+import numpy
+import pkg_resources
+from pynufft import helper
+from pynufft.linalg.solve_cpu import cDiff, _TVEngine
+
+DATA_PATH = pkg_resources.resource_filename('pynufft', 'src/data/')
+
+def tv_indxmap(x, AHyk, bb, dd, d_indx, dt_indx, mu, LMBD):
+    """
+    The rhs and the shrinkage of the former L1TVOLS loop
+    """
+    ndims = len(d_indx)
+    rhs = mu*AHyk
+    for pp in range(0, ndims):
+        rhs += LMBD*(cDiff(dd[pp] - bb[pp], dt_indx[pp]))
+    zz = [cDiff(x, d_indx[pp]) for pp in range(0, ndims)]
+    s = numpy.zeros_like(zz[0])
+    s_tmp = [0, ]*ndims
+    for pp in range(0, ndims):
+        s_tmp[pp] = zz[pp] + bb[pp]
+        s_r = numpy.hypot(s_tmp[pp].real, s_tmp[pp].imag)
+        s = numpy.hypot(s_r, s.real)
+    s += 1e-5
+    threshold_value = 1/LMBD
+    r = (s > threshold_value)*(s - threshold_value)/s
+    for pp in range(0, ndims):
+        dd[pp] = s_tmp[pp]*r
+    for pp in range(0, ndims):
+        bb[pp] += zz[pp] - dd[pp]
+    return rhs
+
+def tv_engine(engine, x, AHyk, bb, dd, rhs, mu, LMBD):
+    engine.rhs(AHyk, dd, bb, mu, LMBD, rhs)
+    engine.shrink(x, bb, dd, 1/LMBD)
+    return rhs
+
+def timeit(func, repeat):
+    func()
+    t0 = time.time()
+    for pp in range(0, repeat):
+        func()
+    return (time.time() - t0)/repeat
+
+def benchmark(image, threads, repeat):
+    Nd = image.shape
+    ndims = len(Nd)
+    rng = numpy.random.RandomState(0)
+    x = image.astype(numpy.complex64)
+    AHyk = (image + 0.1*rng.randn(*Nd)).astype(numpy.complex64)
+    mu, LMBD = 1.0, 10.0
+    
+    d_indx, dt_indx = helper.indxmap_diff(Nd)
+    bb = [numpy.zeros(Nd, dtype = numpy.complex64) for pp in range(0, ndims)]
+    dd = [numpy.zeros(Nd, dtype = numpy.complex64) for pp in range(0, ndims)]
+    t_indxmap = timeit(lambda: tv_indxmap(x, AHyk, bb, dd, d_indx, dt_indx, mu, LMBD), repeat)
+    rhs0 = tv_indxmap(x, AHyk, bb, dd, d_indx, dt_indx, mu, LMBD)
+    
+    print('Nd = ', Nd)
+    print('   index maps:             %.4f s' % t_indxmap)
+    for nthreads in (None, threads):
+        engine = _TVEngine(Nd, numpy.complex64, nthreads)
+        bb2 = numpy.zeros((ndims, ) + Nd, dtype = numpy.complex64)
+        dd2 = numpy.zeros((ndims, ) + Nd, dtype = numpy.complex64)
+        rhs = numpy.empty(Nd, dtype = numpy.complex64)
+        t_engine = timeit(lambda: tv_engine(engine, x, AHyk, bb2, dd2, rhs, mu, LMBD), repeat)
+        bb2[...] = 0
+        dd2[...] = 0
+        for pp in range(0, repeat + 2): # the same number of updates as the reference
+            tv_engine(engine, x, AHyk, bb2, dd2, rhs, mu, LMBD)
+        engine.close()
+        error = numpy.linalg.norm(rhs - rhs0)/numpy.linalg.norm(rhs0)
+        print('   in place, threads = %-4s %.4f s, speedup = %.2f, relative error = %.2e' % (nthreads, t_engine, t_indxmap/t_engine, error))
+
+if __name__ == '__main__':
+    threads = 4
+    if len(sys.argv) > 1:
+        threads = int(sys.argv[1])
+    image2D = numpy.load(DATA_PATH + 'phantom_256_256.npz')['arr_0']
+    benchmark(image2D, threads, 20)
+    image3D = numpy.load(DATA_PATH + 'phantom_3D_128_128_128.npz')['arr_0']
+    benchmark(image3D, threads, 3)
@@ -0,0 +1,75 @@
+"""
+Benchmark of the conjugate gradient method of NUFFT_hsa
+
+The device-resident CG (solve_hsa._cg) is compared with the same iterations which fetch alpha and beta to the host. 
+The benchmark runs on any OpenCL device, including CPU devices such as pocl: 
+
+    python benchmark_cg_hsa.py [API] [platform_number] [device_number]
+"""
+import sys
+import time
+import numpy
+from pynufft import NUFFT_hsa
+from pynufft.linalg.solve_hsa import _cg
+
+def cg_host_scalars(nufft, gy, maxiter):
+    """
+    The conjugate gradient method with the scalars fetched by .get() in every iteration
+    """
+    size = int(nufft.batch * nufft.Kdprod)
+    reduce_sum = nufft.context.reduce_sum(nufft.multi_Kd)
+    b = nufft.y2k(gy)
+    x = nufft.thr.copy_array(b)
+    r = b - nufft.y2k(nufft.k2y(x))
+    p = nufft.thr.copy_array(r)
+    tmp_array = nufft.thr.empty_like(b)
+    rsold = nufft.thr.empty_like(reduce_sum.parameter.output)
+    tmp_sum = nufft.thr.empty_like(reduce_sum.parameter.output)
+    nufft.prg.cMultiplyConjVec(r, r, tmp_array, local_size=None, global_size=size)
+    reduce_sum(rsold, tmp_array)
+    for pp in range(0, maxiter):
+        Ap = nufft.y2k(nufft.k2y(p))
+        nufft.prg.cMultiplyConjVec(p, Ap, tmp_array, local_size=None, global_size=size)
+        reduce_sum(tmp_sum, tmp_array)
+        alpha = rsold.get()/tmp_sum.get()
+        p2 = nufft.thr.copy_array(p)
+        nufft.prg.cMultiplyScalar(numpy.complex64(alpha), p2, local_size=None, global_size=size)
+        x += p2
+        p2 = nufft.thr.copy_array(Ap)
+        nufft.prg.cMultiplyScalar(numpy.complex64(alpha), p2, local_size=None, global_size=size)
+        r -= p2
+        nufft.prg.cMultiplyConjVec(r, r, tmp_array, local_size=None, global_size=size)
+        rsnew = nufft.thr.empty_like(reduce_sum.parameter.output)
+        reduce_sum(rsnew, tmp_array)
+        beta = rsnew.get()/rsold.get()
+        p2 = nufft.thr.copy_array(p)
+        nufft.prg.cMultiplyScalar(numpy.complex64(beta), p2, local_size=None, global_size=size)
+        p = r + p2
+        rsold = rsnew
+    return x
+
+def benchmark(cg, nufft, gy, maxiter, repeat = 3):
+    cg(nufft, gy, 1).get() # warm up
+    best = None
+    for pp in range(0, repeat):
+        t0 = time.time()
+        cg(nufft, gy, maxiter).get()
+        t1 = time.time()
+        if best is None or t1 - t0 < best:
+            best = t1 - t0
+    return best/maxiter
+
+if __name__ == '__main__':
+    API = sys.argv[1] if len(sys.argv) > 1 else 'ocl'
+    platform_number = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    device_number = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    
+    maxiter = 20
+    for Nd, Kd, M in (((64, 64), (128, 128), 10000), ((128, 128), (256, 256), 40000)):
+        om = numpy.random.uniform(-numpy.pi, numpy.pi, (M, 2))
+        nufft = NUFFT_hsa(API, platform_number, device_number)
+        nufft.plan(om, Nd, Kd, (6, 6))
+        gy = nufft.to_device((numpy.random.randn(M) + 1.0j*numpy.random.randn(M)).astype(numpy.complex64))
+        t_host = benchmark(cg_host_scalars, nufft, gy, maxiter)
+        t_device = benchmark(_cg, nufft, gy, maxiter)
+        print('Nd = %s, M = %d: host scalars %.2f ms/iter, device scalars %.2f ms/iter' % (Nd, M, t_host*1e3, t_device*1e3))
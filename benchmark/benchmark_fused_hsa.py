@@ -0,0 +1,116 @@
+"""
+Benchmark of the fused kernels of NUFFT_hsa
+
+Each fused stage is compared with the chain of kernels which it replaces. 
+The benchmark runs on any OpenCL device, including CPU devices such as pocl: 
+
+    python benchmark_fused_hsa.py [API] [platform_number] [device_number]
+"""
+import sys
+import time
+import numpy
+from pynufft import NUFFT_hsa, helper
+
+def scale_pad_unfused(nufft, gx):
+    return nufft.xx2k(nufft.x2xx(gx))
+
+def scale_pad_fused(nufft, gx):
+    return nufft.x2k(gx)
+
+def crop_rescale_unfused(nufft, k):
+    return nufft.xx2x(nufft.k2xx(k))
+
+def crop_rescale_fused(nufft, k):
+    return nufft.k2x(k)
+
+def coil_reduce_unfused(nufft, gx):
+    s = nufft.thr.array(nufft.st['Nd'], dtype=nufft.dtype)
+    nufft.prg.cMultiplyConjVecInplace(numpy.uint32(1), nufft.volume['gpu_coil_profile'], gx, local_size = None,  global_size = int(nufft.batch * nufft.Ndprod))
+    nufft.prg.cAggregate(nufft.batch, nufft.Ndprod, gx, s, local_size = int(nufft.wavefront), global_size = int(nufft.batch * nufft.Ndprod * nufft.wavefront))
+    return s
+
+def coil_reduce_fused(nufft, gx):
+    return nufft.x2s(gx)
+
+def tv_unfused(nufft, tv):
+    """
+    The rhs and the shrinkage of the former L1TVOLS loop
+    """
+    (xkp1, AHyk, zz, bb, dd, tmp_gpu, d_indx, dt_indx, mu, LMBD) = tv['unfused']
+    size = int(nufft.Ndprod)
+    dtype = numpy.complex64
+    ndims = len(zz)
+    rhs = nufft.thr.copy_array(AHyk)
+    nufft.prg.cMultiplyScalar( dtype(mu), rhs, local_size=None, global_size=size)
+    for pp in range(0, ndims): 
+        in_cDiff = nufft.thr.copy_array(dd[pp])
+        in_cDiff -= bb[pp]
+        nufft.prg.cDiff(dt_indx[pp], in_cDiff, tmp_gpu, local_size=None, global_size=size)
+        nufft.prg.cMultiplyScalar( dtype(LMBD), tmp_gpu, local_size=None, global_size=size)
+        rhs += tmp_gpu
+    for pp in range(0, ndims):
+        nufft.prg.cDiff(d_indx[pp],  xkp1, zz[pp],  local_size=None, global_size=size) 
+    s_tmp = [zz[pp] + bb[pp] for pp in range(0, ndims)]
+    s = nufft.thr.copy_array(s_tmp[0])
+    for pp in range(1, ndims):
+        nufft.prg.cHypot(s, s_tmp[pp], local_size=None, global_size=size)
+    s += 1e-6
+    nufft.prg.cAnisoShrink(dtype(1/LMBD), s, tmp_gpu, local_size=None, global_size=size)
+    tmp_gpu /= s
+    for pp in range(0, ndims):
+        nufft.prg.cMultiplyVec(s_tmp[pp], tmp_gpu, dd[pp], local_size=None, global_size=size) 
+    for pp in range(0, ndims):
+        bb[pp] += zz[pp] - dd[pp]
+    return rhs
+
+def tv_fused(nufft, tv):
+    (xkp1, AHyk, rhs, bb, dd, d_indx, dt_indx, mu, LMBD) = tv['fused']
+    ndims = len(nufft.st['Nd'])
+    nufft.prg.cTVRhs(numpy.uint32(ndims), numpy.uint32(nufft.Ndprod), numpy.float32(mu), numpy.float32(LMBD), 
+                     dt_indx, AHyk, dd, bb, rhs, local_size=None, global_size=int(nufft.Ndprod))
+    nufft.prg.cTVShrink(numpy.uint32(ndims), numpy.uint32(nufft.Ndprod), numpy.float32(1/LMBD), 
+                        d_indx, xkp1, bb, dd, local_size=None, global_size=int(nufft.Ndprod))
+    return rhs
+
+def benchmark(stage, nufft, arg, repeat = 20):
+    stage(nufft, arg) # warm up
+    nufft.thr.synchronize()
+    t0 = time.time()
+    for pp in range(0, repeat):
+        stage(nufft, arg)
+    nufft.thr.synchronize()
+    return (time.time() - t0)/repeat
+
+if __name__ == '__main__':
+    API = sys.argv[1] if len(sys.argv) > 1 else 'ocl'
+    platform_number = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    device_number = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    
+    for Nd, Kd, batch in (((128, 128), (256, 256), None), ((128, 128), (256, 256), 8), ((64, 64, 64), (128, 128, 128), None)):
+        om = numpy.random.uniform(-numpy.pi, numpy.pi, (1000, len(Nd)))
+        nufft = NUFFT_hsa(API, platform_number, device_number)
+        nufft.plan(om, Nd, Kd, (6, )*len(Nd), batch = batch)
+        x = (numpy.random.randn(*nufft.multi_Nd) + 1.0j*numpy.random.randn(*nufft.multi_Nd)).astype(numpy.complex64)
+        gx = nufft.to_device(x)
+        k = nufft.x2k(gx)
+        print('Nd = %s, batch = %s' % (Nd, batch))
+        for name, unfused, fused, arg in (('scale+pad', scale_pad_unfused, scale_pad_fused, gx), 
+                                          ('crop+rescale', crop_rescale_unfused, crop_rescale_fused, k)):
+            print('    %-14s unfused %8.2f ms, fused %8.2f ms' % (name, benchmark(unfused, nufft, arg)*1e3, benchmark(fused, nufft, arg)*1e3))
+        if batch is not None:
+            print('    %-14s unfused %8.2f ms, fused %8.2f ms' % ('coil reduce', benchmark(coil_reduce_unfused, nufft, gx)*1e3, benchmark(coil_reduce_fused, nufft, gx)*1e3))
+        else:
+            ndims = len(Nd)
+            d_indx, dt_indx = helper.indxmap_diff(Nd)
+            z = numpy.zeros((ndims, ) + Nd, dtype = numpy.complex64)
+            tv = {'unfused': (gx, nufft.thr.copy_array(gx), 
+                              [nufft.thr.to_device(z[0]) for pp in range(0, ndims)], 
+                              [nufft.thr.to_device(z[0]) for pp in range(0, ndims)], 
+                              [nufft.thr.to_device(z[0]) for pp in range(0, ndims)], 
+                              nufft.thr.to_device(z[0]), 
+                              [nufft.thr.to_device(d) for d in d_indx], 
+                              [nufft.thr.to_device(d) for d in dt_indx], 1.0, 0.1), 
+                  'fused': (gx, nufft.thr.copy_array(gx), nufft.thr.to_device(z[0]), 
+                            nufft.thr.to_device(z), nufft.thr.to_device(z), 
+                            nufft.thr.to_device(numpy.stack(d_indx)), nufft.thr.to_device(numpy.stack(dt_indx)), 1.0, 0.1)}
+            print('    %-14s unfused %8.2f ms, fused %8.2f ms' % ('TV update', benchmark(tv_unfused, nufft, tv)*1e3, benchmark(tv_fused, nufft, tv)*1e3))
@@ -0,0 +1,38 @@
+"""
+Import-time benchmark of pynufft
+
+Each measurement runs "import pynufft" in a fresh interpreter. 
+The script fails if the CPU-only import pulls in the GPU backends, matplotlib or the unused scipy submodules.
+"""
+import subprocess
+import sys
+
+HEAVY_MODULES = ('reikna', 'pyopencl', 'pycuda', 'matplotlib', 'scipy.signal', 'scipy.special', 'scipy.ndimage', 'scipy.misc')
+
+def import_time(statement = 'import pynufft', repeat = 5):
+    """
+    The best wall time (seconds) of the statement in a fresh interpreter, and the heavy modules which are loaded
+    """
+    script = ('import sys, time\n'
+              't0 = time.time()\n'
+              + statement + '\n'
+              't1 = time.time()\n'
+              'heavy = [m for m in sys.modules if m.split(".")[0] in %r or m in %r]\n'
+              'print(t1 - t0)\n'
+              'print(",".join(sorted(heavy)))\n') % (HEAVY_MODULES, HEAVY_MODULES)
+    best = None
+    for pp in range(0, repeat):
+        output = subprocess.check_output([sys.executable, '-W', 'ignore', '-c', script]).decode().splitlines()
+        seconds = float(output[0])
+        heavy = [m for m in output[1].split(',') if m]
+        if best is None or seconds < best:
+            best = seconds
+    return best, heavy
+
+if __name__ == '__main__':
+    for statement in ('import numpy, scipy.sparse', 'import pynufft', 'from pynufft import NUFFT_hsa'):
+        seconds, heavy = import_time(statement)
+        print('%-35s %8.1f ms   heavy modules: %s' % (statement, seconds*1e3, ', '.join(heavy) or 'none'))
+    seconds, heavy = import_time('import pynufft')
+    if heavy:
+        sys.exit('import pynufft loads ' + ', '.join(heavy))
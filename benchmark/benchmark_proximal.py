@@ -0,0 +1,47 @@
+"""
+Benchmark of the proximal solvers 'fista' and 'admm' of NUFFT_cpu on the 2D phantom
+
+The TV objective ||A x - y||_2^2/2/Kdprod + lamb*TV(x) and the wall time are printed for a few numbers of iterations, 
+with A^H A computed by forward() and adjoint() or by the Toeplitz FFTs: 
+
+    python benchmark_proximal.py [lamb]
+"""
+import sys
+import time
+import numpy
+import pkg_resources
+from pynufft import NUFFT_cpu
+
+DATA_PATH = pkg_resources.resource_filename('pynufft', 'src/data/')
+
+def tv_objective(NufftObj, x, y, lamb):
+    fidelity = 0.5*numpy.linalg.norm(NufftObj.forward(x) - y)**2/NufftObj.Kdprod
+    tv = numpy.sum(numpy.sqrt(sum(numpy.abs(numpy.roll(x, 1, axis) - x)**2 for axis in range(0, x.ndim))))
+    return fidelity + lamb*tv
+
+def benchmark(image, lamb):
+    Nd = image.shape
+    Kd = tuple(2*N for N in Nd)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(0)
+    M = Nd[0]*Nd[1]//2
+    om = rng.uniform(-numpy.pi, numpy.pi, (M, 2))
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd)
+    y = NufftObj.forward(image.astype(numpy.complex64))
+    y += 0.01*numpy.abs(y).max()*(rng.randn(M) + 1.0j*rng.randn(M))
+    
+    print('Nd = ', Nd, ', M = ', M, ', lamb = ', lamb)
+    for solver, kwargs in (('fista', {}), ('fista', {'toeplitz': True}), ('admm', {}), ('admm', {'toeplitz': True})):
+        for maxiter in (10, 30, 100):
+            t0 = time.time()
+            result = NufftObj.solve(y, solver, maxiter = maxiter, prox = 'tv', lamb = lamb, full_output = True, **kwargs)
+            seconds = time.time() - t0
+            print('   %-6s %-18s maxiter = %-4d objective = %.6e, time = %.3f s' % (solver, kwargs, maxiter, tv_objective(NufftObj, result.x, y, lamb), seconds))
+
+if __name__ == '__main__':
+    lamb = 1e-2
+    if len(sys.argv) > 1:
+        lamb = float(sys.argv[1])
+    image = numpy.load(DATA_PATH + 'phantom_256_256.npz')['arr_0'][::2, ::2]
+    benchmark(image, lamb)
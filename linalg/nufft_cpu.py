@@ -18,6 +18,26 @@ Defining the equispaced to non-Cartesian transform as  operator :math:`A`, the N
 
 - selfadjoint_one2many2one () method computes the single-coil to single-coil selfadjoint operation :math:`A^H A` in batch mode. It connects forward_one2many() and adjoint_many2one() methods.  If set_sense() is called first, coil sensitivities and the conjugate are used during forward_one2many() and adjoint_many2one().
 
+- The samples which lie exactly on the grid points of Kd can bypass the min-max interpolator, if plan() is called with ongrid = True. These samples are gathered from an unscaled FFT (J = 1), while the off-grid samples keep the Jd-point interpolator. This reduces the SpMV for partially Cartesian acquisitions at the price of one additional FFT.
+
+- Coincident samples (e.g. the k-space center of radial and PROPELLER trajectories) can be stored once in the interpolator, if plan() is called with dedup = True. forward() expands the unique rows to all the samples and adjoint() sums the duplicated data before gridding.
+
+- The axes excluded by ft_axes can be treated as Cartesian axes, if plan() is called with hybrid = True (e.g. the stack-of-stars and stack-of-spirals acquisitions). om only contains the coordinates of ft_axes and the interpolator is built once for the transformed axes. Each partition along the Cartesian axes is transformed as an additional batch without oversampling or interpolation, so the memory and the time scale linearly with the number of partitions. The non-Cartesian data have the shape of (M, ) + Cartesian axes (+ (batch, )).
+
+- NUFFT_multiframe class transforms T frames with different trajectories but the same Nd, Kd and Jd in one call. The frames share the scaling factor and the preindex arrays, and the per-frame interpolators are stacked as a block-diagonal sparse matrix. The images have the shape of Nd + (T, ) and the data have the shape of (M, T). 
+
+- share() method exports the planned object to the shared memory, and attach() method maps the shared plan read-only in other processes. The workers of a multiprocessing pool therefore share one copy of the interpolator. 
+
+- save() and load() methods store the planned object as a directory of .npy files, which are memory-mapped at loading. Large 3D plans therefore start without reading the whole interpolator.
+
+- The kernels of the solvers (the k-space sampling density and the Laplacian of L1TVOLS, the Toeplitz kernel of 'pcg', the Pipe density compensation weights of 'dc', the operator norm of operator_norm()) are computed at the first solve() and cached in NUFFT_cpu.kernels. plan() clears the cache, and save(), load() and share() include it.
+
+- subset() method returns a lightweight NUFFT_cpu object restricted to a subset of the non-Cartesian samples. The scaling factor, the preindex arrays and the coil sensitivities are shared with the parent plan, and only the rows of the interpolator are sliced. Sliding windows, respiratory bins and outlier rejection can therefore be reconstructed from a single plan.
+
+- solve(..., per_channel = True) solves the channels of a batch plan (or the partitions of a hybrid plan) as independent single-coil problems in a pool of threads or processes, which share one plan. Each channel exits on its own tolerance. 
+
+- solve(..., 'fista') and solve(..., 'admm') minimize ||A x - y||^2/2 + lamb*g(x) with a pluggable proximal operator of g ('l1', 'l2', 'tv' or a function prox(x, threshold)). The step size of FISTA (and the default penalty of ADMM) is taken from operator_norm(), the estimate of ||A^H A|| by the power iteration which is cached per plan, and A^H A can be computed by the Toeplitz FFTs. The same solvers are available in NUFFT_hsa.
+
 - solve() method link many solvers in pynufft.linalg.solver_cpu, which is based on the solvers of scipy.sparse.linalg.cg, scipy.sparse.linalg.'lsmr', 'lsqr', 'dc','bicg','bicgstab','cg', 'gmres','lgmres'  
 
 ------------------
@@ -42,9 +62,9 @@ from __future__ import absolute_import
 import numpy
 import scipy.sparse
 import numpy.fft
+import copy
+import os
 # import scipy.signal
-import scipy.linalg
-import scipy.special
 
 from ..src._helper import helper, helper1
 
@@ -75,9 +95,13 @@ class NUFFT_cpu:
         self.ndims = 0 #: initial value: 0
         self.ft_axes = () #: initial value: ()
         self.batch = None #: initial value: None
+        self.ongrid = None #: initial value: None
+        self.dedup = None #: initial value: None
+        self.hybrid = None #: initial value: None
+        self.kernels = {} #: initial value: {}
         pass
 
-    def plan(self, om, Nd, Kd, Jd, ft_axes = None, batch = None):
+    def plan(self, om, Nd, Kd, Jd, ft_axes = None, batch = None, ongrid = False, dedup = False, hybrid = False):
         """
         Plan the NUFFT_cpu object with the provided geometry.
 
@@ -87,12 +111,18 @@ class NUFFT_cpu:
         :param Jd: The interpolator size. Example: Jd=(6,6) for 2D image; Jd = (6,6,6) for a 3D image
         :param ft_axes: (Optional) The axes for Fourier transform. The default is all axes if None is given.
         :param batch: (Optional) Batch mode. If batch is provided, the last appended axes is the number of identical NUFFT to be transformed. The default is None.
+        :param ongrid: (Optional) If True, the samples on the grid points of Kd bypass the interpolator in forward() and adjoint(). The default is False. 
+        :param dedup: (Optional) If True, the coincident samples share one row of the interpolator. The default is False. 
+        :param hybrid: (Optional) If True, the axes excluded by ft_axes are Cartesian axes and om has len(ft_axes) columns. The elements of Kd and Jd along the Cartesian axes are ignored. The default is False. 
         :type om: numpy.float array, matrix size = M * ndims
         :type Nd: tuple, ndims integer elements. 
         :type Kd: tuple, ndims integer elements. 
         :type Jd: tuple, ndims integer elements. 
         :type ft_axes: None, or tuple with optional integer elements.
         :type batch: None, or integer
+        :type ongrid: boolean
+        :type dedup: boolean
+        :type hybrid: boolean
         :returns: 0
         :rtype: int, float
 
@@ -112,14 +142,30 @@ class NUFFT_cpu:
         
         >>> NufftObj.plan(om, Nd, Kd, Jd, ft_axes, batch)
         
+        or, for a stack-of-stars acquisition with om.shape = (M, 2)
+        
+        >>> NufftObj.plan(om, (256, 256, 64), (512, 512, 64), (6, 6, 1), ft_axes = (0, 1), hybrid = True)
+        
         """         
 
+        self.hybrid = None
+        if hybrid:
+            Nd, Kd, Jd, ft_axes, batch = self._plan_hybrid(om, Nd, Kd, Jd, ft_axes, batch)
+
         self.ndims = len(Nd) #: initial value: len(Nd)
         if ft_axes is None:
             ft_axes = range(0, self.ndims)
         self.ft_axes = ft_axes #: initial value: all axes (range(0, self.ndims)
 #     
-        self.st = helper.plan(om, Nd, Kd, Jd, ft_axes = ft_axes, format = 'CSR')
+        self.dedup = None
+        if dedup:
+            om_unique, inverse = numpy.unique(om, axis = 0, return_inverse = True)
+            self.st = helper.plan(om_unique, Nd, Kd, Jd, ft_axes = ft_axes, format = 'CSR')
+            self._plan_dedup(inverse.ravel())
+            self.st['M'] = numpy.int32(om.shape[0])
+            self.st['om'] = om
+        else:
+            self.st = helper.plan(om, Nd, Kd, Jd, ft_axes = ft_axes, format = 'CSR')
 #         st_tmp = helper.plan0(om, Nd, Kd, Jd)
 #         if self.debug is 1:
 #             print('error between current and old interpolators=', scipy.sparse.linalg.norm(self.st['p'] - st_tmp['p'])/scipy.sparse.linalg.norm(self.st['p']))
@@ -172,6 +218,16 @@ class NUFFT_cpu:
         self.volume = {}
         self.volume['cpu_coil_profile'] = numpy.ones(self.multi_Nd)
         
+        self.kernels = {} # the kernels of the solvers, computed once per plan. See solve_cpu._cached_kernel()
+        
+        self.ongrid = None
+        if ongrid:
+            if len(tuple(ft_axes)) != self.ndims:
+                raise ValueError('ongrid = True requires the Fourier transform along all axes')
+            mask, Gd = helper.detect_ongrid(self._row_om(), self.Nd, self.Kd)
+            if numpy.any(mask):
+                self._plan_ongrid(mask, Gd)
+        
         return 0
         
 #         print('untrimmed',self.st['pHp'].nnz)
@@ -196,11 +252,408 @@ class NUFFT_cpu:
         except:
             print("errors occur in self.precompute_sp()")
             raise
+    def _plan_hybrid(self, om, Nd, Kd, Jd, ft_axes, batch):
+        """
+        Private: split the geometry into the transformed axes and the Cartesian axes. 
+        
+        The Cartesian axes are moved behind the transformed axes and merged with the batch. 
+        
+        :return: Nd, Kd, Jd, ft_axes, batch of the transformed axes 
+        """
+        if ft_axes is None:
+            raise ValueError('hybrid = True requires ft_axes')
+        ft_axes = tuple(ft_axes)
+        cart_axes = tuple(ax for ax in range(0, len(Nd)) if ax not in ft_axes)
+        if len(cart_axes) == 0:
+            raise ValueError('hybrid = True requires at least one axis which is excluded by ft_axes')
+        if om.shape[1] != len(ft_axes):
+            raise ValueError('om must have len(ft_axes) columns in hybrid mode')
+        
+        self.hybrid = {}
+        self.hybrid['Nd'] = Nd
+        self.hybrid['ft_axes'] = ft_axes
+        self.hybrid['cart_axes'] = cart_axes
+        self.hybrid['batch'] = batch
+        if batch is None:
+            self.hybrid['tail'] = tuple(Nd[ax] for ax in cart_axes) # the shape behind M or the transformed axes
+        else:
+            self.hybrid['tail'] = tuple(Nd[ax] for ax in cart_axes) + (batch, )
+        
+        return (tuple(Nd[ax] for ax in ft_axes), 
+                tuple(Kd[ax] for ax in ft_axes), 
+                tuple(Jd[ax] for ax in ft_axes), 
+                range(0, len(ft_axes)), 
+                int(numpy.prod(self.hybrid['tail'])))
+    
+    def _hybrid_x2batch(self, x):
+        """
+        Private: move the Cartesian axes of the image to the batch
+        """
+        n_ft = len(self.hybrid['ft_axes'])
+        x = numpy.moveaxis(x, self.hybrid['ft_axes'], tuple(range(0, n_ft)))
+        return numpy.reshape(x, self.multi_Nd)
+    
+    def _hybrid_batch2x(self, x):
+        """
+        Private: restore the Cartesian axes of the image from the batch
+        """
+        n_ft = len(self.hybrid['ft_axes'])
+        x = numpy.reshape(x, self.Nd + self.hybrid['tail'])
+        return numpy.moveaxis(x, tuple(range(0, n_ft)), self.hybrid['ft_axes'])
+    
+    def _plan_dedup(self, inverse):
+        """
+        Private: the multiplicity map of the coincident samples.
+        
+        :param inverse: the row of the interpolator for each sample, as returned by numpy.unique(om, axis = 0, return_inverse = True)
+        :type inverse: numpy.int array, shape = (M, )
+        """
+        M = inverse.shape[0]
+        self.dedup = {}
+        self.dedup['inverse'] = inverse
+        self.dedup['first'] = numpy.unique(inverse, return_index = True)[1] # the first sample of each row
+        # sum of the duplicated samples, shape = (number of unique samples, M)
+        self.dedup['sum'] = scipy.sparse.csr_matrix((numpy.ones((M, ), dtype = numpy.float32), (inverse, numpy.arange(0, M))), 
+                                                    shape = (self.dedup['first'].shape[0], M))
+        
+    def _row_om(self):
+        """
+        Private: the coordinates of the rows of the interpolator
+        """
+        if self.dedup is None:
+            return self.st['om']
+        else:
+            return self.st['om'][self.dedup['first']]
+        
+    def _plan_ongrid(self, mask, Gd):
+        """
+        Private: split the samples into the off-grid samples (min-max interpolator) and the on-grid samples (J = 1 gather).
+        
+        The full interpolator self.sp is kept for the k-space methods (k2y, y2k, k2y2k) which are used by the solvers. 
+        
+        :param mask: True for the on-grid samples
+        :param Gd: the grid size of the gather
+        :type mask: numpy.bool array, shape = (M, )
+        :type Gd: tuple of int
+        """
+        self.ongrid = {}
+        self.ongrid['mask'] = mask
+        self.ongrid['Gd'] = Gd
+        self.ongrid['offgrid_index'] = numpy.flatnonzero(~mask)
+        self.ongrid['ongrid_index'] = numpy.flatnonzero(mask)
+        self.ongrid['sp'] = self.sp[self.ongrid['offgrid_index']]
+        self.ongrid['spH'] = self.ongrid['sp'].getH().tocsr()
+        self.ongrid['gather'] = helper.ongrid_gather(self._row_om()[mask], self.Nd, Gd)
+        self.ongrid['scatter'] = self.ongrid['gather'].getH().tocsr()
+        if self.parallel_flag == 1:
+            self.ongrid['multi_Gd'] = Gd + (self.batch, )
+            self.ongrid['multi_prodGd'] = (numpy.prod(Gd), self.batch)
+        else:
+            self.ongrid['multi_Gd'] = Gd
+            self.ongrid['multi_prodGd'] = (numpy.prod(Gd), )
+        
+    def _forward_ongrid(self, x):
+        """
+        Private: forward NUFFT with the on-grid samples gathered from the unscaled FFT
+        """
+        k = self.xx2k(self.x2xx(x))
+        y_off = self.ongrid['sp'].dot(self.k2vec(k))
+        g = numpy.fft.fftn(x, s = self.ongrid['Gd'], axes = range(0, self.ndims)) # zero-padded and unscaled FFT
+        y_on = self.ongrid['gather'].dot(numpy.reshape(g, self.ongrid['multi_prodGd'], order='C'))
+        
+        y = numpy.empty((self.sp.shape[0], ) + self.multi_M[1:], dtype = numpy.result_type(y_off, y_on))
+        y[self.ongrid['offgrid_index']] = y_off
+        y[self.ongrid['ongrid_index']] = y_on
+        if self.dedup is not None:
+            y = y[self.dedup['inverse']]
+        return y
+    
+    def _adjoint_ongrid(self, y):
+        """
+        Private: adjoint NUFFT with the on-grid samples scattered to the unscaled FFT
+        """
+        if self.dedup is not None:
+            y = self.dedup['sum'].dot(y)
+        k_vec = self.ongrid['spH'].dot(y[self.ongrid['offgrid_index']])
+        x = self.xx2x(self.k2xx(self.vec2k(k_vec)))
+        
+        g = self.ongrid['scatter'].dot(y[self.ongrid['ongrid_index']])
+        g = numpy.fft.ifftn(numpy.reshape(g, self.ongrid['multi_Gd'], order='C'), axes = range(0, self.ndims))
+        g *= numpy.prod(self.ongrid['Gd'])*1.0/self.Kdprod # same normalization as k2xx(), which uses ifftn over Kd
+        x += g[tuple(slice(0, N) for N in self.Nd)] # cropping
+        return x
+    
+    def subset(self, indices):
+        """
+        Create a NUFFT_cpu object for a subset of the non-Cartesian samples, without re-planning. 
+        
+        The returned object shares sn, NdCPUorder, KdCPUorder and the coil sensitivities with the current object. 
+        Only the rows of the interpolator (sp) are sliced and the gridding matrix (spH) is the transpose of the sliced rows. 
+        
+        :param indices: The indices of the samples to be kept, or a boolean mask of length M
+        :type indices: numpy array of integers or booleans
+        :return: sub: the NUFFT_cpu object with M = number of the selected samples
+        :rtype: sub: NUFFT_cpu 
+        
+        :Example:
+
+        >>> import pynufft
+        >>> NufftObj = pynufft.NUFFT_cpu()
+        >>> NufftObj.plan(om, Nd, Kd, Jd) 
+        >>> NufftBin = NufftObj.subset(resp_bin == 0)
+        >>> image = NufftBin.solve(y[resp_bin == 0], 'cg', maxiter = 30)
+        """
+        indices = numpy.arange(0, self.st['M'])[indices] # boolean masks and slices are converted to integers
+        if indices.ndim != 1:
+            raise TypeError('indices must be a 1D array of integers or a boolean mask of length M')
+        
+        sub = copy.copy(self) # shallow copy: all the arrays are shared
+        sub.st = dict(self.st) # the geometry dictionary is private to the subset
+        sub.st.pop('w', None) # the k-space sampling density depends on the samples
+        sub.kernels = {key: value for key, value in self.kernels.items() if key == 'laplacian'} # the Laplacian only depends on Kd
+        sub.st['M'] = numpy.int32(indices.size)
+        sub.st['om'] = self.st['om'][indices]
+        
+        if self.dedup is None:
+            rows = indices
+        else: # keep the rows which are used by the selected samples
+            rows, inverse = numpy.unique(self.dedup['inverse'][indices], return_inverse = True)
+            sub._plan_dedup(inverse.ravel())
+        sub.sp = self.sp[rows] 
+        sub.spH = sub.sp.getH().tocsr()
+        
+        if self.parallel_flag == 1:
+            sub.multi_M = (sub.st['M'], ) + (self.batch, )
+        else:
+            sub.multi_M = (sub.st['M'], )
+        
+        if self.ongrid is not None:
+            sub._plan_ongrid(self.ongrid['mask'][rows], self.ongrid['Gd'])
+        return sub
+
+    def _single_channel(self):
+        """
+        Private: the single-coil view of a batch plan, for the independent per-channel solves of solve(..., per_channel = True).
+
+        All the arrays are shared with the current object. Only the batch shapes and the coil sensitivities (ones) are replaced.
+        The view has its own kernels, because the cached Pipe weights have the shape multi_M. 
+
+        :return: core: the NUFFT_cpu object with batch = 1
+        :rtype: core: NUFFT_cpu
+        """
+        core = copy.copy(self) # shallow copy: all the arrays are shared
+        core.st = dict(self.st)
+        core.kernels = {key: value for key, value in self.kernels.items() 
+                        if key in ('density', 'laplacian', 'toeplitz', 'operator_norm')} # independent of the batch
+        core.parallel_flag = 0
+        core.batch = 1
+        core.multi_Nd = self.Nd
+        core.uni_Nd = self.Nd
+        core.multi_Kd = self.Kd
+        core.multi_M = (self.st['M'], )
+        core.multi_prodKd = (numpy.prod(self.Kd), )
+        core.sn = numpy.reshape(self.sn, self.Nd)
+        core.volume = {'cpu_coil_profile': numpy.ones(self.Nd)}
+        if self.ongrid is not None:
+            core.ongrid = dict(self.ongrid)
+            core.ongrid['multi_Gd'] = self.ongrid['Gd']
+            core.ongrid['multi_prodGd'] = (numpy.prod(self.ongrid['Gd']), )
+        return core
+
+    def _export_arrays(self):
+        """
+        Private: split the planned object into the arrays and the remaining attributes.
+        
+        The ndarrays and the sparse matrices in the attributes (including st, volume, ongrid, dedup and hybrid) are collected in a flat dictionary, 
+        whose keys are the '/' separated paths of the attributes. The sparse matrices are stored as the data, indices and indptr arrays of CSR.
+        
+        :return: arrays, meta: the flat dictionary of arrays and the nested description of the attributes
+        :rtype: dict, dict
+        """
+        arrays = {}
+        def walk(attributes, prefix):
+            meta = {}
+            for key, value in list(attributes.items()): # the solvers of other threads may add kernels
+                if key in ('shared_memory', 'attached_memory'): # the handles of the shared memory are private to the process
+                    continue
+                path = prefix + key
+                if isinstance(value, numpy.ndarray):
+                    arrays[path] = value
+                    meta[key] = ('ndarray', path)
+                elif scipy.sparse.issparse(value):
+                    value = value.tocsr()
+                    arrays[path + '/data'] = value.data
+                    arrays[path + '/indices'] = value.indices
+                    arrays[path + '/indptr'] = value.indptr
+                    meta[key] = ('csr', path, value.shape)
+                elif isinstance(value, dict):
+                    meta[key] = ('dict', walk(value, path + '/'))
+                else:
+                    meta[key] = ('object', value)
+            return meta
+        meta = walk(self.__dict__, '')
+        return arrays, {'class': type(self).__name__, 'attributes': meta}
+    
+    def _import_arrays(self, arrays, meta):
+        """
+        Private: restore the attributes from the results of _export_arrays(). The arrays are not copied. 
+        
+        :param arrays: the flat dictionary of arrays
+        :param meta: the nested description of the attributes
+        :type arrays: dict
+        :type meta: dict
+        """
+        if meta['class'] != type(self).__name__:
+            raise TypeError('The plan was exported from ' + meta['class'] + ', but the object is ' + type(self).__name__)
+        def build(meta):
+            attributes = {}
+            for key, entry in meta.items():
+                if entry[0] == 'ndarray':
+                    attributes[key] = arrays[entry[1]]
+                elif entry[0] == 'csr':
+                    path = entry[1]
+                    attributes[key] = scipy.sparse.csr_matrix((arrays[path + '/data'], arrays[path + '/indices'], arrays[path + '/indptr']), 
+                                                              shape = entry[2], copy = False)
+                elif entry[0] == 'dict':
+                    attributes[key] = build(entry[1])
+                else:
+                    attributes[key] = entry[1]
+            return attributes
+        self.__dict__.update(build(meta['attributes']))
+    
+    def share(self):
+        """
+        Export the planned object to the shared memory (multiprocessing.shared_memory), which can be attached by other processes.
+        
+        All the arrays of the plan are copied once to one shared memory block. 
+        The returned handle is a small picklable dictionary, which can be sent to the workers of a multiprocessing pool. 
+        The shared memory is released by unshare(). 
+        
+        :return: handle: the name, the layout and the attributes of the shared plan
+        :rtype: dict
+        
+        :Example:
+
+        >>> import pynufft, multiprocessing
+        >>> NufftObj = pynufft.NUFFT_cpu()
+        >>> NufftObj.plan(om, Nd, Kd, Jd) 
+        >>> handle = NufftObj.share()
+        >>> def init(handle):
+        >>>     global worker_nufft
+        >>>     worker_nufft = pynufft.NUFFT_cpu()
+        >>>     worker_nufft.attach(handle)
+        >>> pool = multiprocessing.Pool(4, initializer = init, initargs = (handle, ))
+        >>> ...
+        >>> NufftObj.unshare()
+        """
+        from multiprocessing import shared_memory
+        
+        arrays, meta = self._export_arrays()
+        layout = {}
+        offset = 0
+        for path, array in arrays.items():
+            layout[path] = (offset, array.shape, array.dtype.str)
+            offset += (array.nbytes + 63) // 64 * 64 # 64-byte alignment
+        
+        self.unshare()
+        self.shared_memory = shared_memory.SharedMemory(create = True, size = max(offset, 1))
+        for path, array in arrays.items():
+            numpy.ndarray(array.shape, dtype = array.dtype, buffer = self.shared_memory.buf, offset = layout[path][0])[...] = array
+        
+        return {'name': self.shared_memory.name, 'layout': layout, 'meta': meta}
+    
+    def unshare(self):
+        """
+        Release the shared memory created by share(). The attached objects in other processes must not be used afterwards. 
+        """
+        shm = self.__dict__.pop('shared_memory', None)
+        if shm is not None:
+            shm.close()
+            if os.name == 'posix': # the workers of the same resource tracker may have unregistered the block, see attach()
+                from multiprocessing import resource_tracker
+                resource_tracker.register(shm._name, 'shared_memory')
+            shm.unlink()
+    
+    def attach(self, handle):
+        """
+        Attach the object to the shared plan created by share(), instead of planning.
+        
+        The arrays of the plan are read-only views of the shared memory. Only the scratch arrays of forward() and adjoint() are allocated by the process.
+        
+        :param handle: the handle returned by share()
+        :type handle: dict
+        """
+        from multiprocessing import shared_memory
+        try:
+            shm = shared_memory.SharedMemory(name = handle['name'], track = False) # Python >= 3.13
+        except TypeError:
+            # The owner is responsible for unlinking. 
+            # Unregister the block from the resource tracker, which would unlink it when the worker exits.
+            shm = shared_memory.SharedMemory(name = handle['name'])
+            if os.name == 'posix': # the tracker is only used for the POSIX shared memory
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, 'shared_memory')
+        
+        arrays = {}
+        for path, (offset, shape, dtype) in handle['layout'].items():
+            array = numpy.ndarray(shape, dtype = dtype, buffer = shm.buf, offset = offset)
+            array.flags.writeable = False
+            arrays[path] = array
+        self._import_arrays(arrays, handle['meta'])
+        self.attached_memory = shm # keep the block mapped as long as the object is alive
+    
+    def save(self, path):
+        """
+        Save the planned object to a directory, which can be memory-mapped by load(). 
+        
+        Each array of the plan is saved as an .npy file and the remaining attributes are pickled in plan.pkl.
+        
+        :param path: the directory of the plan, which is created if it does not exist
+        :type path: string
+        """
+        import os
+        import pickle
+        
+        arrays, meta = self._export_arrays()
+        files = {}
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for key, array in arrays.items():
+            files[key] = key.replace('/', '.') + '.npy'
+            numpy.save(os.path.join(path, files[key]), numpy.ascontiguousarray(array))
+        with open(os.path.join(path, 'plan.pkl'), 'wb') as f:
+            pickle.dump({'files': files, 'meta': meta}, f, protocol = pickle.HIGHEST_PROTOCOL)
+    
+    def load(self, path, mmap_mode = 'r'):
+        """
+        Load the plan saved by save(), instead of planning.
+        
+        By default the arrays are memory-mapped (numpy.memmap) and used directly by vec2y() and y2vec(). 
+        The pages are read lazily at the first transform and the page cache is shared by the processes which load the same plan. 
+        plan.pkl is unpickled, so only load the plans from trusted sources. 
+        
+        :param path: the directory written by save()
+        :param mmap_mode: (Optional) The mmap_mode of numpy.load(). 'r' (read-only memory map) is the default. None reads the arrays into memory.
+        :type path: string
+        :type mmap_mode: None or string
+        """
+        import os
+        import pickle
+        
+        with open(os.path.join(path, 'plan.pkl'), 'rb') as f:
+            saved = pickle.load(f)
+        arrays = {}
+        for key, filename in saved['files'].items():
+            arrays[key] = numpy.load(os.path.join(path, filename), mmap_mode = mmap_mode)
+        self._import_arrays(arrays, saved['meta'])
+    
     def reset_sense(self):
         self.volume['cpu_coil_profile'].fill(1.0) 
+        self.kernels.pop('operator_norm_one2many2one', None)
     def set_sense(self, coil_profile):
         
         self.volume = {}
+        self.kernels.pop('operator_norm_one2many2one', None) # depends on the coil sensitivities
         
         if coil_profile.shape == self.Nd + (self.batch, ):        
             self.volume['cpu_coil_profile'] = coil_profile
@@ -266,19 +719,37 @@ class NUFFT_cpu:
         
         
         :param y: data, numpy.complex64. The shape = (M,) or (M, batch) 
-        :param solver: 'cg', 'L1TVOLS', 'lsmr', 'lsqr', 'dc','bicg','bicgstab','cg', 'gmres','lgmres'
+        :param solver: 'cg', 'L1TVOLS', 'lsmr', 'lsqr', 'dc','bicg','bicgstab','cg', 'gmres','lgmres', 'pcg', 'fista', 'admm'
         :param maxiter: the number of iterations
         :type y: numpy array, dtype = numpy.complex64
         :type solver: string
+        :param tol: (Optional) the relative residual to exit early. See solve_cpu.solve()
+        :param callback: (Optional) callback(niter, x, residual) after each iteration, where x is the current image. Returning True exits the solver.
+        :param full_output: (Optional) if True, return a SolveResult with the iteration count, the residuals and the timing
+        :param x0: (Optional) the initial image, e.g. the solution of the previous frame
+        :param per_channel: (Optional) if True, solve each channel (coil, or slice in hybrid mode) independently in a thread pool, 
+                            or in a process pool with pool = 'process'. The number of workers is set by workers. 
         :type maxiter: int
-        :return: numpy array with size  The shape = Nd ('L1TVOLS') or  Nd + (batch,) ('lsmr', 'lsqr', 'dc','bicg','bicgstab','cg', 'gmres','lgmres') 
+        :return: numpy array with size  The shape = Nd ('L1TVOLS') or  Nd + (batch,) ('lsmr', 'lsqr', 'dc','bicg','bicgstab','cg', 'gmres','lgmres', 'pcg', 'fista', 'admm') 
         """        
-        from ..linalg.solve_cpu import solve
+        from ..linalg.solve_cpu import solve, SolveResult
 #         if self.parallel_flag is 1:
 #             x2 = numpy.empty(self.multi_Nd, dtype = self.dtype)
 #             for bat in range(0, self.batch):
 #                 x2[..., bat] = solve(self, y[:,bat], solver, *args, **kwargs)
 #         else:
+        if self.hybrid is not None:
+            if 'L1TVOLS' == solver:
+                raise ValueError('L1TVOLS does not support hybrid = True')
+            core = copy.copy(self) # the same plan in the batch layout
+            core.hybrid = None
+            if kwargs.get('x0') is not None:
+                kwargs['x0'] = self._hybrid_x2batch(kwargs['x0'])
+            x2 = solve(core, numpy.reshape(y, self.multi_M), solver, *args, **kwargs)
+            if isinstance(x2, SolveResult): # full_output
+                x2.x = self._hybrid_batch2x(x2.x)
+                return x2
+            return self._hybrid_batch2x(x2)
         x2 = solve(self,  y,  solver, *args, **kwargs)
         return x2#solve(self,  y,  solver, *args, **kwargs)
 
@@ -291,7 +762,14 @@ class NUFFT_cpu:
         :return: y: The output numpy array, with the size of (M,) or (M, batch)
         :rtype: numpy array with the dtype of numpy.complex64
         """
-        y = self.k2y(self.xx2k(self.x2xx(x)))
+        if self.hybrid is not None:
+            x = self._hybrid_x2batch(x)
+        if self.ongrid is None:
+            y = self.k2y(self.xx2k(self.x2xx(x)))
+        else:
+            y = self._forward_ongrid(x)
+        if self.hybrid is not None:
+            y = numpy.reshape(y, (self.st['M'], ) + self.hybrid['tail'])
 
         return y
 
@@ -304,7 +782,14 @@ class NUFFT_cpu:
         :return: x: The output numpy array, with the size of Nd or Nd + (batch, )
         :rtype: numpy array with the dtype of numpy.complex64
         """     
-        x = self.xx2x(self.k2xx(self.y2k(y)))
+        if self.hybrid is not None:
+            y = numpy.reshape(y, self.multi_M)
+        if self.ongrid is None:
+            x = self.xx2x(self.k2xx(self.y2k(y)))
+        else:
+            x = self._adjoint_ongrid(y)
+        if self.hybrid is not None:
+            x = self._hybrid_batch2x(x)
 
         return x
     def selfadjoint_one2many2one(self, x):
@@ -323,12 +808,50 @@ class NUFFT_cpu:
         :rtype: numpy array with dtype =numpy.complex64
         """       
 #         x2 = self.adjoint(self.forward(x))
+        if self.hybrid is not None:
+            x = self._hybrid_x2batch(x)
         
         x2 = self.xx2x(self.k2xx(self.k2y2k(self.xx2k(self.x2xx(x)))))
+        if self.hybrid is not None:
+            x2 = self._hybrid_batch2x(x2)
 #         x2 = self.k2xx(self.W*self.xx2k(x))
 #         x2 = self.k2xx(self.k2y2k(self.xx2k(x)))
         
         return x2
+    def operator_norm(self, one2many2one = False, maxiter = 100, tol = 1e-4):
+        """
+        The largest eigenvalue ||A^H A|| of selfadjoint() (or selfadjoint_one2many2one()), estimated by the power iteration. 
+        
+        The estimate is computed at the first call and cached in self.kernels, so it is saved, loaded and shared with the plan. 
+        plan() clears the cache, and set_sense() and reset_sense() clear the estimate of selfadjoint_one2many2one(). 
+        The cached estimate is recomputed only if a smaller tol is requested. 
+        'fista' and 'admm' take their step size and penalty from the cached estimate. 
+        
+        :param one2many2one: if True, the operator is selfadjoint_one2many2one() of the batch plan, which includes the coil sensitivities
+        :param maxiter: the maximum number of the power iterations
+        :param tol: the relative change of the estimate to exit
+        :type one2many2one: boolean
+        :type maxiter: int
+        :type tol: float
+        :return: L: the estimate of ||A^H A||
+        :rtype: float
+        """
+        from ..linalg.solve_cpu import _power_iteration
+        if one2many2one and self.parallel_flag == 1:
+            name = 'operator_norm_one2many2one'
+            AHA = self.selfadjoint_one2many2one
+            shape = self.Nd
+        else: # the single-coil selfadjoint_one2many2one() is selfadjoint()
+            name = 'operator_norm'
+            def AHA(x): # selfadjoint() of the Cartesian partitions of the hybrid plan, which are batches
+                return self.xx2x(self.k2xx(self.k2y2k(self.xx2k(self.x2xx(x)))))
+            shape = self.multi_Nd
+        cache = self.kernels.get(name, None)
+        if cache is None or tol < cache['tol']:
+            cache = {'L': _power_iteration(AHA, shape, self.dtype, maxiter, tol), 'tol': tol}
+            self.kernels[name] = cache
+        return cache['L']
+    
     def selfadjoint2(self, x):
         try:
             x2 = self.k2xx(self.W*self.xx2k(x))
@@ -391,6 +914,8 @@ class NUFFT_cpu:
         '''
         y = self.sp.dot(k_vec)
 #         y = self.st['ell'].spmv(k_vec)
+        if self.dedup is not None: # expand the unique rows to all samples
+            y = y[self.dedup['inverse']]
         
         return y
     def k2y(self, k):
@@ -405,6 +930,8 @@ class NUFFT_cpu:
        regridding non-uniform data, (unsorted vector)
         '''
 #         k_vec = self.st['p'].getH().dot(y)
+        if self.dedup is not None: # sum the coincident samples before gridding
+            y = self.dedup['sum'].dot(y)
         k_vec = self.spH.dot(y)
 #         k_vec = self.st['ell'].spmvH(y)
         
@@ -471,6 +998,92 @@ class NUFFT_cpu:
         return k
 
 
+class NUFFT_multiframe(NUFFT_cpu):
+    """
+    Class NUFFT_multiframe for dynamic series.
+    
+    T frames with different trajectories share Nd, Kd, Jd, the scaling factor sn and the preindex arrays. 
+    The frames are stored in the batch axis and transformed by one batched FFT over the Kd + (T, ) array. 
+    The per-frame interpolators are interleaved as a block-diagonal sparse matrix, whose rows and columns follow the C-order of (M, T) and Kd + (T, ).
+   """
+    def plan(self, om, Nd, Kd, Jd, ft_axes = None, batch = None):
+        """
+        Plan the NUFFT_multiframe object with the provided trajectories.
+
+        :param om: The list of T trajectories. Each trajectory has the same number of samples M. 
+        :param Nd: The matrix size of equispaced image. 
+        :param Kd: The matrix size of the oversampled frequency grid.
+        :param Jd: The interpolator size. 
+        :param ft_axes: (Optional) The axes for Fourier transform. The default is all axes if None is given.
+        :param batch: (Optional) The batch is the number of frames T. Other values raise ValueError. 
+        :type om: list of numpy.float arrays, matrix size = M * ndims
+        :type Nd: tuple, ndims integer elements. 
+        :type Kd: tuple, ndims integer elements. 
+        :type Jd: tuple, ndims integer elements. 
+        :type ft_axes: None, or tuple with optional integer elements.
+        :type batch: None or int
+        :returns: 0
+        :rtype: int
+
+        :Example:
+
+        >>> import pynufft
+        >>> NufftObj = pynufft.NUFFT_multiframe()
+        >>> NufftObj.plan([om0, om1, om2], Nd, Kd, Jd) 
+        >>> y = NufftObj.forward(x) # x.shape = Nd + (3, ), y.shape = (M, 3)
+        """
+        T = len(om)
+        M = om[0].shape[0]
+        if batch is not None and batch != T:
+            raise ValueError('The batch of NUFFT_multiframe is the number of frames T = ' + str(T) + ', but batch = ' + str(batch))
+        for omt in om:
+            if omt.shape != om[0].shape:
+                raise ValueError('all frames must have the same number of samples')
+        
+        # one interpolator for all frames, the rows are ordered as t*M + m
+        NUFFT_cpu.plan(self, numpy.concatenate(om, axis = 0), Nd, Kd, Jd, ft_axes = ft_axes, batch = T)
+        
+        # interleave the frames: (t*M + m, k) -> (m*T + t, k*T + t)
+        p = self.sp.tocoo()
+        t = p.row // M
+        self.sp = scipy.sparse.csr_matrix((p.data, (p.row % M * T + t, p.col * T + t)), 
+                                          shape = (M*T, self.Kdprod*T))
+        self.spH = self.sp.getH().tocsr()
+        
+        self.st['M'] = numpy.int32(M)
+        self.st['om'] = numpy.stack(om, axis = 2) # (M, ndims, T)
+        self.multi_M = (self.st['M'], T)
+        self.multi_prodKd = (self.Kdprod*T, )
+        
+        return 0
+    
+    def subset(self, indices):
+        """
+        Not supported: the frames share one block-diagonal interpolator. Plan the subsets of the frames instead. 
+        """
+        raise TypeError('subset() is not supported by NUFFT_multiframe, whose frames share one block-diagonal interpolator')
+    
+    def _single_channel(self):
+        """
+        Not supported: the frames are not the channels of one interpolator. 
+        """
+        raise TypeError('solve(..., per_channel = True) is not supported by NUFFT_multiframe, whose frames share one block-diagonal interpolator')
+    
+    def vec2y(self, k_vec):
+        """
+        Private: interpolation of all frames by the block-diagonal interpolator
+        """
+        y = self.sp.dot(k_vec)
+        return numpy.reshape(y, self.multi_M)
+    
+    def y2vec(self, y):
+        """
+        Private: gridding of all frames by the block-diagonal gridding matrix
+        """
+        k_vec = self.spH.dot(numpy.ravel(y))
+        return k_vec
+
+
 class NUFFT_excalibur(NUFFT_cpu):
     """
     Class NUFFT_hsa for heterogeneous systems.
@@ -6,12 +6,11 @@ from __future__ import absolute_import
 import numpy
 import scipy.sparse
 import numpy.fft
-import scipy.signal
-import scipy.linalg
-import scipy.special
+import threading
 from functools import wraps as _wraps
 
 from ..src._helper import helper, helper1
+logger = helper.logger
 class hypercube:
     def __init__(self, shape, steps, invsteps, nelements, batch, dtype):
         self.shape = shape
@@ -36,22 +35,217 @@ def push_cuda_context(hsa_method):
         return hsa_method(*args, **kwargs)
     return wrapper
 
+class HSAContext:
+    """
+    HSAContext class.
+    The device, the thread (reikna Thread) and the compiled kernel sets, which are shared by many NUFFT_hsa objects. 
+    
+    The contexts are normally obtained by get_context(), which creates each context only once per process. 
+    The compiled FFTs are cached by fft(), so the objects with the same Kd and batch share one FFT computation. 
+    The device binaries are also kept in the on-disk compiler cache of the backend (pyopencl or pycuda), which is keyed by the kernel source and the device. 
+    A deployment can fill both caches in advance with prewarm().
+    """
+    def __init__(self, API = None, platform_number = None, device_number = None):
+        """
+        Constructor.
+        
+        :param API: The API for the heterogeneous system. API='cuda' or API='ocl'. If None, cuda is tried first, then ocl.
+        :param platform_number: The number of the platform found by the API. The default is 0.
+        :param device_number: The number of the device found on the platform. The default is 0.
+        :type API: string
+        :type platform_number: integer 
+        :type device_number: integer 
+        """
+        from reikna import cluda
+        if API is None:
+            API = detect_api()
+        if platform_number is None:
+            platform_number = 0
+        if device_number is None:
+            device_number = 0
+        
+        if 'cuda' == API:
+            api = cluda.cuda_api()
+        elif 'ocl' == API:
+            api = cluda.ocl_api()
+        else:
+            raise ValueError("API must be 'cuda' or 'ocl'")
+        
+        self.API = API
+        self.platform_number = platform_number
+        self.device_number = device_number
+        self.device = api.get_platforms()[platform_number].get_devices()[device_number] #: device name
+        self.thr = api.Thread(self.device) #: reikna Thread
+        
+#         """
+#         Wavefront: as warp in cuda. Can control the width in a workgroup
+#         Wavefront is required in spmv_vector as it improves data coalescence.
+#         see cCSR_spmv and zSparseMatVec
+#         """
+        self.wavefront = api.DeviceParameters(self.device).warp_size
+        
+        from ..src import re_subroutine #import create_kernel_sets
+        kernel_sets = re_subroutine.create_kernel_sets(API)
+        self.prg = self.thr.compile(kernel_sets, 
+                                render_kwds=dict(LL =  str(self.wavefront)), 
+                                fast_math=False)
+        logger.info('HSAContext: API = %s, device = %s, wavefront = %s', API, self.device, self.wavefront)
+        
+        self.ffts = {} # (shape, axes): compiled reikna FFT
+        self.ffts_lock = threading.Lock()
+        self.reductions = {} # shape: compiled reikna Reduce
+    
+    def fft(self, shape, axes):
+        """
+        Get the compiled FFT of the shape. The FFT is compiled at the first call and reused afterwards. 
+        
+        :param shape: The shape of the complex64 array, i.e. Kd or Kd + (batch, )
+        :param axes: The axes to be transformed
+        :type shape: tuple of int
+        :type axes: tuple of int
+        :return: fft: the compiled reikna FFT computation
+        """
+        key = (tuple(int(n) for n in shape), tuple(int(ax) for ax in axes))
+        with self.ffts_lock:
+            if key not in self.ffts:
+                import reikna.fft
+                self.ffts[key] = reikna.fft.FFT(numpy.empty(key[0], dtype=numpy.complex64), key[1]).compile(self.thr, fast_math=False)
+                logger.debug('compiled FFT: shape = %s, axes = %s', key[0], key[1])
+            return self.ffts[key]
+    
+    def reduce_sum(self, shape, axes = None):
+        """
+        Get the compiled sum of a complex64 array. The output is a device scalar, or the array of the remaining axes. 
+        
+        :param shape: The shape of the input array
+        :param axes: (Optional) The axes to be summed. The default None sums all the axes.
+        :type shape: tuple of int
+        :type axes: None or tuple of int
+        :return: reduce_sum: the compiled reikna Reduce computation
+        """
+        shape = tuple(int(n) for n in shape)
+        if axes is not None:
+            axes = tuple(int(ax) for ax in axes)
+        key = (shape, axes)
+        with self.ffts_lock:
+            if key not in self.reductions:
+                from reikna.algorithms import Reduce, predicate_sum
+                self.reductions[key] = Reduce(numpy.zeros(shape, dtype = numpy.complex64), predicate_sum(numpy.complex64), 
+                                              axes = axes).compile(self.thr)
+            return self.reductions[key]
+    
+    def release(self):
+        """
+        Release the thread of the context and remove it from the cache of get_context(). 
+        The NUFFT_hsa objects using this context must not be used afterwards. 
+        """
+        with _contexts_lock:
+            for key in [key for key, context in _contexts.items() if context is self]:
+                del _contexts[key]
+        self.thr.release()
+
+_contexts = {} # (API, platform_number, device_number): HSAContext. API = None is an alias of the detected API
+_contexts_lock = threading.Lock()
+
+def detect_api():
+    """
+    Find the first available API without printing the devices. 
+    
+    :return: API: 'cuda' or 'ocl'
+    :rtype: string
+    """
+    from reikna import cluda
+    for API, create_api in (('cuda', cluda.cuda_api), ('ocl', cluda.ocl_api)):
+        try:
+            if len(create_api().get_platforms()) > 0:
+                return API
+        except Exception: # the API is not installed or has no platform
+            logger.debug('%s interface is not available', API)
+    raise RuntimeError('No accelerator is available.')
+
+def prewarm(geometries, API = None, platform_number = None, device_number = None):
+    """
+    Compile the kernel sets and the FFTs of the common geometries in advance, e.g. at deployment. 
+    
+    The compiled objects are cached in the shared HSAContext, and the device binaries are stored in the on-disk compiler cache of the backend, 
+    so the later processes on the same node skip the device compiler.
+    
+    :param geometries: The list of (Kd, batch) or (Kd, batch, ft_axes). batch = None for a single coil. ft_axes = None for all axes.
+    :param API: The API for the heterogeneous system. API='cuda' or API='ocl'
+    :param platform_number: The number of the platform found by the API. 
+    :param device_number: The number of the device found on the platform. 
+    :type geometries: list of tuples
+    :return: context
+    :rtype: HSAContext
+    
+    :Example:
+
+    >>> from pynufft.linalg.nufft_hsa import prewarm
+    >>> prewarm([((512, 512), None), ((512, 512), 8), ((256, 256, 256), None)], API = 'ocl')
+    """
+    context = get_context(API, platform_number, device_number)
+    for geometry in geometries:
+        Kd, batch = geometry[0], geometry[1]
+        ft_axes = geometry[2] if len(geometry) > 2 else None
+        if ft_axes is None:
+            ft_axes = range(0, len(Kd))
+        if batch is not None and batch > 1:
+            context.fft(tuple(Kd) + (batch, ), ft_axes)
+        else:
+            context.fft(tuple(Kd), ft_axes)
+    return context
+
+def get_context(API = None, platform_number = None, device_number = None):
+    """
+    Get the shared HSAContext of the device. The context is created at the first call and reused afterwards. 
+    
+    :param API: The API for the heterogeneous system. API='cuda' or API='ocl'. If None, cuda is tried first, then ocl.
+    :param platform_number: The number of the platform found by the API. The default is 0.
+    :param device_number: The number of the device found on the platform. The default is 0.
+    :type API: string
+    :type platform_number: integer 
+    :type device_number: integer 
+    :return: context
+    :rtype: HSAContext
+    """
+    if platform_number is None:
+        platform_number = 0
+    if device_number is None:
+        device_number = 0
+    with _contexts_lock:
+        key = (API, platform_number, device_number)
+        if key not in _contexts:
+            if API is None: # probe the API once, and alias the default context to the context of the detected API
+                detected = (detect_api(), platform_number, device_number)
+                if detected not in _contexts:
+                    _contexts[detected] = HSAContext(detected[0], platform_number, device_number)
+                _contexts[key] = _contexts[detected]
+            else:
+                _contexts[key] = HSAContext(API, platform_number, device_number)
+        return _contexts[key]
+
 class NUFFT_hsa:
     """
     NUFFT_hsa class. 
     Multi-coil or single-coil memory reduced NUFFT. 
 
     """
-    def __init__(self, API = None, platform_number=None, device_number=None):
+    def __init__(self, API = None, platform_number=None, device_number=None, context = None):
         """
         Constructor.
         
+        The device, the thread and the compiled kernels are taken from the shared HSAContext of the device, 
+        so constructing many NUFFT_hsa objects does not probe the devices or compile the kernels again.
+        The messages are sent to the 'pynufft' logger (see helper.set_verbosity()). 
+        
         :param API: The API for the heterogeneous system. API='cuda' or API='ocl'
         :param platform_number: The number of the platform found by the API. 
         :param device_number: The number of the device found on the platform. 
+        :param context: (Optional) The HSAContext to be used. If None, get_context(API, platform_number, device_number) is used.
         :type API: string
         :type platform_number: integer 
         :type device_number: integer 
+        :type context: HSAContext
         :returns: 0
         :rtype: int, float
 
@@ -62,69 +256,16 @@ class NUFFT_hsa:
         """
         
         self.dtype = numpy.complex64
-   
-        import reikna.cluda as cluda
-        print('API = ', API)
-        self.cuda_flag, self.ocl_flag = helper.diagnose()
-        if None is API:
-            if self.cuda_flag is 1:
-                API = 'cuda'
-            elif self.ocl_flag is 1:
-                API = 'ocl'
-            else:
-                print('No accelerator is available.')
-        else:
-            api = API
-        print('now using API = ', API)
-        if platform_number is None:
-            platform_number = 0
-        if device_number is None:
-            device_number = 0
         
-        from reikna import cluda
-        import reikna.transformations
-        from reikna.cluda import functions, dtypes
-        try: # try to create api/platform/device using the given parameters
-            if 'cuda' == API:
-                api = cluda.cuda_api()
-            elif 'ocl' == API:
-                api = cluda.ocl_api()
-     
-            platform = api.get_platforms()[platform_number]
-            
-            device = platform.get_devices()[device_number]
-        except: # if failed, find out what's going wrong?
-            print('No accelerator is detected.')
-            
-#             return 1
-
-#         Create context from device
-        self.thr = api.Thread(device) #pyopencl.create_some_context()
-        self.device = device #: device name
-        print('Using opencl or cuda = ', self.thr.api)
-
-#         """
-#         Wavefront: as warp in cuda. Can control the width in a workgroup
-#         Wavefront is required in spmv_vector as it improves data coalescence.
-#         see cCSR_spmv and zSparseMatVec
-#         """
-        self.wavefront = api.DeviceParameters(device).warp_size
-
-        print('wavefront of OpenCL (as warp of CUDA) = ',self.wavefront)
-
-        from ..src import re_subroutine #import create_kernel_sets
-        kernel_sets = re_subroutine.create_kernel_sets(API)
-               
-        prg = self.thr.compile(kernel_sets, 
-                                render_kwds=dict(LL =  str(self.wavefront)), 
-                                fast_math=False)
-        self.prg = prg        
-        
-        print("Note: In the future the api will change!")
-        print("Note: NUFFT_hsa and NUFFT_cpu class will merge in the future!")
-        print("You have been warned!")
+        if context is None:
+            context = get_context(API, platform_number, device_number)
+        self.context = context
+        self.thr = context.thr 
+        self.device = context.device #: device name
+        self.wavefront = context.wavefront
+        self.prg = context.prg
     
-    def plan(self, om, Nd, Kd, Jd, ft_axes = None, batch = None, radix = None):
+    def plan(self, om, Nd, Kd, Jd, ft_axes = None, batch = None, radix = None, gather = False):
         """
         Design the multi-coil or single-coil memory reduced interpolator. 
         
@@ -135,12 +276,14 @@ class NUFFT_hsa:
         :param Jd: The interpolator size. Example: Jd=(6,6) for 2D image; Jd = (6,6,6) for a 3D image
         :param ft_axes: The dimensions to be transformed by FFT. Example: ft_axes = (0,1) for 2D, ft_axes = (0,1,2) for 3D; ft_axes = None for all dimensions.
         :param batch: Batch NUFFT. If provided, the shape is Nd + (batch, ). The last axes is the number of parallel coils. coil_sese = None for single coil. 
+        :param gather: (Optional) If True, y2k() gathers the samples by the precomputed conjugate transpose in CSR format, instead of the atomic scattering. The gridding is then deterministic, at the cost of M*prod(Jd) extra (index, weight) pairs on the device. The default is False.
         :type om: numpy.float array, matrix size = (M, ndims)
         :type Nd: tuple, ndims integer elements. 
         :type Kd: tuple, ndims integer elements. 
         :type Jd: tuple, ndims integer elements. 
         :type ft_axes: tuple, selected axes to be transformed.
         :type batch: int or None
+        :type gather: boolean
         :returns: 0
         :rtype: int, float
         :Example:
@@ -157,6 +300,7 @@ class NUFFT_hsa:
         self.ft_axes = ft_axes
 #     
         self.st = helper.plan(om, Nd, Kd, Jd, ft_axes = ft_axes, format = 'pELL', radix = radix)
+        self.gather = gather
         if batch is None:
             self.parallel_flag = 0
         else:
@@ -189,6 +333,8 @@ class NUFFT_hsa:
         self.Kd_elements = helper.strides_divide_itemsize( self.st['Kd'])[0] # only return the Kd_elements
         self.NdCPUorder, self.KdCPUorder, self.nelem =     helper.preindex_copy(self.st['Nd'], self.st['Kd'])
         
+        self.kernels = {} # the kernels of the solvers, computed once per plan. See solve_cpu._cached_kernel()
+        
         self.offload()
         
         return 0
@@ -219,6 +365,15 @@ class NUFFT_hsa:
         self.pELL['meshindex'] = self.thr.to_device(self.st['pELL'].meshindex.astype(numpy.uint32))
         self.pELL['kindx'] = self.thr.to_device(self.st['pELL'].kindx.astype(numpy.uint32))
         self.pELL['udata'] = self.thr.to_device(self.st['pELL'].udata.astype(self.dtype))
+        
+        if self.gather: # the conjugate transpose for the atomic-free gridding
+            csrH = helper.pELL_to_csrH(self.st['pELL'], numpy.prod(self.st['Kd']))
+            self.csrH = {}
+            self.csrH['numRow'] = numpy.uint32(csrH.shape[0])
+            self.csrH['data'] = self.thr.to_device(csrH.data.astype(self.dtype))
+            self.csrH['indices'] = self.thr.to_device(csrH.indices.astype(numpy.uint32))
+            self.csrH['indptr'] = self.thr.to_device(csrH.indptr.astype(numpy.uint32))
+            del csrH
     
         self.volume = {}
         
@@ -251,29 +406,46 @@ class NUFFT_hsa:
         self.M = numpy.int32(self.st['M'])
         
 
-        import reikna.fft
         if self.batch > 1: # batch mode
-            self.fft = reikna.fft.FFT(numpy.empty(self.st['Kd'] + (self.batch, ), dtype=self.dtype), self.ft_axes).compile(self.thr, fast_math=False)
+            self.fft = self.context.fft(self.st['Kd'] + (self.batch, ), self.ft_axes)
         else: # elf.Reps ==1 Batch mode is wrong for 
-            self.fft = reikna.fft.FFT(numpy.empty(self.st['Kd'], dtype=self.dtype), self.ft_axes).compile(self.thr, fast_math=False)
+            self.fft = self.context.fft(self.st['Kd'], self.ft_axes)
 
         self.zero_scalar=self.dtype(0.0+0.0j)
+        self.buffers = {} # the device buffer pool of the intermediate arrays, see _buffer()
         del self.st['pELL']
-        print('end of offload')
+        logger.debug('end of offload')
         
+    def _buffer(self, name, shape, dtype = None):
+        """
+        Private: the pooled device array of an intermediate stage, which is allocated at the first call and reused afterwards.
+        
+        :param name: the name of the buffer
+        :param shape: the shape of the buffer
+        :param dtype: the dtype of the buffer. The default is self.dtype
+        :type name: string
+        :type shape: tuple
+        :return: the pooled reikna array
+        """
+        if dtype is None:
+            dtype = self.dtype
+        if name not in self.buffers:
+            self.buffers[name] = self.thr.array(shape, dtype = dtype)
+        return self.buffers[name]
+    
     @push_cuda_context
     def reset_sense(self):
         self.volume['gpu_coil_profile'].fill(1.0)
+        self.kernels.pop('operator_norm_one2many2one', None)
          
     @push_cuda_context
     def set_sense(self, coil_profile):
         if coil_profile.shape != self.multi_Nd:
-            print('The shape of coil_profile is ', coil_profile.shape)
-            print('But it should be', self.Nd + (self.batch, ))
-            raise ValueError
+            raise ValueError('The shape of coil_profile is ' + str(coil_profile.shape) + ', but it should be ' + str(self.multi_Nd))
         else:
             self.volume['gpu_coil_profile'] = self.thr.to_device(coil_profile.astype(self.dtype))
-            print('Successfully loading coil sensitivities!')
+            self.kernels.pop('operator_norm_one2many2one', None) # depends on the coil sensitivities
+            logger.info('Successfully loading coil sensitivities!')
         
 #         if coil_profile.shape == self.Nd + (self.batch, ):        
         
@@ -292,22 +464,28 @@ class NUFFT_hsa:
     def s2x(self, s):
         x = self.thr.array(self.multi_Nd, dtype=self.dtype)
 #         print("Now populate the array to multi-coil")
-        self.prg.cPopulate(self.batch, self.Ndprod, s, x, local_size = None, global_size = int(self.batch * self.Ndprod) )
-#         x2 = x  *  self.volume['gpu_coil_profile']
-#         try:
-#             x2 = x  *  self.volume['gpu_coil_profile']
-#         except:
-#             x2 = x
-        self.prg.cMultiplyVecInplace(numpy.uint32(1), self.volume['gpu_coil_profile'], x, local_size = None, global_size = int(self.batch * self.Ndprod) )
-#         self.prg.cDistribute(self.batch, self.Ndprod, self.volume['gpu_coil_profile'], s, x,  local_size = None, global_size = int(self.batch * self.Ndprod) )
+#         self.prg.cPopulate(self.batch, self.Ndprod, s, x, local_size = None, global_size = int(self.batch * self.Ndprod) )
+#         self.prg.cMultiplyVecInplace(numpy.uint32(1), self.volume['gpu_coil_profile'], x, local_size = None, global_size = int(self.batch * self.Ndprod) )
+        # fused populating and coil multiplication
+        self.prg.cDistribute(self.batch, self.Ndprod, self.volume['gpu_coil_profile'], s, x,  local_size = None, global_size = int(self.batch * self.Ndprod) )
         return x
     
     @push_cuda_context                
-    def x2xx(self, x):
+    def x2xx(self, x, out = None):
+        """
+        Private: scaling by the scaling factors
+        
+        :param x: the input array
+        :param out: (Optional) the output array. out = x scales x in place. The default allocates a new array.
+        """
 #         xx = self.thr.array(xx.shape, dtype = self.dtype)
 #         self.thr.copy_array(z, dest=xx, )#size = int(xx.nbytes/xx.dtype.itemsize)) #size = int(xx.nbytes/8) is a hack of error in cuda backends; 8 is the byte of numpy.complex64 
-        xx = self.thr.array(x.shape, dtype = self.dtype)
-        self.thr.copy_array(x, dest=xx, )#size = int(xx.nbytes/xx.dtype.itemsize)) #size = int(xx.nbytes/8) is a hack of error in cuda backends; 8 is the byte of numpy.complex64 
+        if out is None:
+            xx = self.thr.array(x.shape, dtype = self.dtype)
+        else:
+            xx = out
+        if xx is not x:
+            self.thr.copy_array(x, dest=xx, )#size = int(xx.nbytes/xx.dtype.itemsize)) #size = int(xx.nbytes/8) is a hack of error in cuda backends; 8 is the byte of numpy.complex64 
                 
 #         self.prg.cMultiplyRealInplace(self.batch, self.volume['SnGPUArray'], xx, local_size=None, global_size=int(self.Ndprod * self.batch))
 #         self.prg.cTensorMultiply(numpy.uint32(self.batch), 
@@ -333,18 +511,25 @@ class NUFFT_hsa:
         return xx
     
     @push_cuda_context
-    def xx2k(self, xx):
+    def xx2k(self, xx, out = None):
         
         """
         Private: oversampled FFT on the heterogeneous device
         
-        Firstly, zeroing the self.k_Kd array
-        Second, copy self.x_Nd array to self.k_Kd array by cSelect
-        Third: inplace FFT
+        Firstly, copy the xx array to the pooled zero-padded array by cTensorCopy. 
+        The padded array is zeroed only once, because the copy always writes the same Nd elements. 
+        Second: out-of-place FFT to the output array
+        
+        :param xx: the input array, with size = multi_Nd
+        :param out: (Optional) the output array, with size = multi_Kd. The default allocates a new array.
         """
-        k = self.thr.array(self.multi_Kd, dtype = self.dtype)#.fill(0.0 + 0.0j)
-                    
-        k.fill(0)
+        if out is None:
+            k = self.thr.array(self.multi_Kd, dtype = self.dtype)
+        else:
+            k = out
+        if 'pad' not in self.buffers:
+            self._buffer('pad', self.multi_Kd).fill(0)
+        pad = self.buffers['pad']
 #         self.prg.cMultiplyScalar(self.zero_scalar, k, local_size=None, global_size=int(self.Kdprod))
 #         self.prg.cSelect(self.NdGPUorder,      self.KdGPUorder,  xx, k, local_size=None, global_size=int(self.Ndprod))
 #         self.prg.cSelect2(self.batch, self.volume['NdGPUorder'], self.volume['KdGPUorder'], xx, k, local_size = None, global_size = int(self.Ndprod * self.batch))
@@ -355,24 +540,102 @@ class NUFFT_hsa:
                              self.volume['Kd_elements'], 
                              self.volume['invNd_elements'], 
                              xx, 
-                             k, 
+                             pad, 
                              numpy.int32(1), # Directions: Nd -> Kd, 1; Kd -> Nd, -1
                              local_size = None, 
                              global_size = int(self.Ndprod))
-        self.fft( k, k,inverse=False)
+        self.fft( k, pad,inverse=False)
 #         self.thr.synchronize()
         return k    
     
     @push_cuda_context
-    def k2y(self, k):
+    def x2k(self, x, out = None):
+        """
+        Private: the fused x2xx() and xx2k()
+        
+        cTensorCopyMultiply scales x and copies it into the pooled zero-padded array in one kernel, 
+        followed by the out-of-place FFT. 
+        
+        :param x: the input array, with size = multi_Nd
+        :param out: (Optional) the output array, with size = multi_Kd. The default allocates a new array.
+        """
+        if out is None:
+            k = self.thr.array(self.multi_Kd, dtype = self.dtype)
+        else:
+            k = out
+        if 'pad' not in self.buffers:
+            self._buffer('pad', self.multi_Kd).fill(0)
+        pad = self.buffers['pad']
+        self.prg.cTensorCopyMultiply(
+                            self.batch, 
+                            numpy.uint32(self.ndims), 
+                            self.volume['Nd_elements'], 
+                            self.volume['Kd_elements'], 
+                            self.volume['invNd_elements'], 
+                            numpy.uint32(self.tSN['Tdims']),
+                            self.tSN['Td'],
+                            self.tSN['Td_elements'], 
+                            self.tSN['invTd_elements'], 
+                            self.tSN['tensor_sn'], 
+                            x, 
+                            pad, 
+                            numpy.int32(1), 
+                            local_size = None, 
+                            global_size = int(self.Ndprod))
+        self.fft( k, pad, inverse=False)
+        return k
+    
+    @push_cuda_context
+    def k2x(self, k, out = None):
+        """
+        Private: the fused k2xx() and xx2x()
+        
+        The inverse FFT overwrites k, then cTensorCopyMultiply crops and rescales the image in one kernel. 
+        
+        :param k: the input array, with size = multi_Kd
+        :param out: (Optional) the output array, with size = multi_Nd. The default allocates a new array.
+        """
+        self.fft( k, k, inverse=True)
+        if out is None:
+            x = self.thr.array(self.multi_Nd, dtype = self.dtype)
+        else:
+            x = out
+        self.prg.cTensorCopyMultiply(
+                            self.batch, 
+                            numpy.uint32(self.ndims), 
+                            self.volume['Nd_elements'], 
+                            self.volume['Kd_elements'], 
+                            self.volume['invNd_elements'], 
+                            numpy.uint32(self.tSN['Tdims']),
+                            self.tSN['Td'],
+                            self.tSN['Td_elements'], 
+                            self.tSN['invTd_elements'], 
+                            self.tSN['tensor_sn'], 
+                            k, 
+                            x, 
+                            numpy.int32(-1), 
+                            local_size = None, 
+                            global_size = int(self.Ndprod))
+        return x
+    
+    @push_cuda_context
+    def k2y(self, k, out = None):
         """
         Private: interpolation by the Sparse Matrix-Vector Multiplication
+        
+        pELL_spmv_mCoil writes every row of the output, so the output array is not zeroed. 
+        
+        :param k: the input array, with size = multi_Kd
+        :param out: (Optional) the output array, with size = multi_M. The default allocates a new array.
         """
 #         if self.parallel_flag is 1:
 #             y =self.thr.array( (self.st['M'], self.batch), dtype=self.dtype).fill(0)
 #         else:
 #             y =self.thr.array( (self.st['M'], ), dtype=self.dtype).fill(0)
-        y =self.thr.array( self.multi_M, dtype=self.dtype).fill(0)
+        if out is None:
+            y = self.thr.array( self.multi_M, dtype=self.dtype)
+        else:
+            y = out
         self.prg.pELL_spmv_mCoil(
                             self.batch, 
                             self.pELL['nRow'],
@@ -393,14 +656,36 @@ class NUFFT_hsa:
         return y
 
     @push_cuda_context
-    def y2k(self, y):
+    def y2k(self, y, out = None):
         """
         Private: gridding by the Sparse Matrix-Vector Multiplication
         However, serial atomic add is far too slow and inaccurate.
+        
+        The real and imaginary accumulators are pooled, and merged into the output by cMergeComplex. 
+        If the object is planned with gather = True, cCSR_spmvh_mCoil gathers the samples into the output directly.
+        
+        :param y: the input array, with size = multi_M
+        :param out: (Optional) the output array, with size = multi_Kd. The default allocates a new array.
         """
+        if self.gather:
+            if out is None:
+                k = self.thr.array(self.multi_Kd, dtype = self.dtype)
+            else:
+                k = out
+            self.prg.cCSR_spmvh_mCoil(
+                            self.batch, 
+                            self.csrH['numRow'], 
+                            self.csrH['indptr'], 
+                            self.csrH['indices'], 
+                            self.csrH['data'], 
+                            y, 
+                            k, 
+                            local_size = None, 
+                            global_size = int(self.Kdprod * self.batch))
+            return k
 
-        kx = self.thr.array(self.multi_Kd, dtype = numpy.float32).fill(0.0)
-        ky = self.thr.array(self.multi_Kd, dtype = numpy.float32).fill(0.0)
+        kx = self._buffer('kx', self.multi_Kd, numpy.float32).fill(0.0)
+        ky = self._buffer('ky', self.multi_Kd, numpy.float32).fill(0.0)
         
         self.prg.pELL_spmvh_mCoil(
                             self.batch, 
@@ -417,14 +702,23 @@ class NUFFT_hsa:
                             local_size=None,
                             global_size= int(self.pELL['nRow'] * self.pELL['prodJd']* self.batch)             
                             )         
-        k = kx+1.0j* ky
+        if out is None:
+            k = self.thr.array(self.multi_Kd, dtype = self.dtype)
+        else:
+            k = out
+        self.prg.cMergeComplex(kx, ky, k, local_size = None, global_size = int(self.Kdprod * self.batch))
         
         return k    
 
     @push_cuda_context
-    def k2xx(self, k):
+    def k2xx(self, k, out = None):
         """
         Private: the inverse FFT and image cropping (which is the reverse of _xx2k() method)
+        
+        The inverse FFT overwrites k. cTensorCopy writes every element of the output, so the output is not zeroed.
+        
+        :param k: the input array, with size = multi_Kd
+        :param out: (Optional) the output array, with size = multi_Nd. The default allocates a new array.
         """        
         
         self.fft( k, k, inverse=True)
@@ -435,8 +729,10 @@ class NUFFT_hsa:
 #             xx = self.thr.array(self.st['Nd'] + (self.batch, ), dtype = self.dtype)
 #         else:
 #             xx = self.thr.array(self.st['Nd'], dtype = self.dtype)
-        xx = self.thr.array(self.multi_Nd, dtype = self.dtype)
-        xx.fill(0)
+        if out is None:
+            xx = self.thr.array(self.multi_Nd, dtype = self.dtype)
+        else:
+            xx = out
 #         self.prg.cSelect(self.queue, (self.Ndprod,), None,   self.volume['KdGPUorder'].data,  self.NdGPUorder.data,     self.k_Kd2.data, self.x_Nd.data )
 #         self.prg.cSelect2(self.batch,  self.volume['KdGPUorder'],  self.volume['NdGPUorder'],     k, xx, local_size=None, global_size=int(self.Ndprod * self.batch))
         self.prg.cTensorCopy(
@@ -453,9 +749,19 @@ class NUFFT_hsa:
         return xx
     
     @push_cuda_context
-    def xx2x(self, xx):
-        x = self.thr.array(xx.shape, dtype = self.dtype)
-        self.thr.copy_array(xx, dest=x, )#size = int(xx.nbytes/xx.dtype.itemsize)) #size = int(xx.nbytes/8) is a hack of error in cuda backends; 8 is the byte of numpy.complex64 
+    def xx2x(self, xx, out = None):
+        """
+        Private: rescaling by the scaling factors (which is the reverse of x2xx() method)
+        
+        :param xx: the input array
+        :param out: (Optional) the output array. out = xx rescales xx in place. The default allocates a new array.
+        """
+        if out is None:
+            x = self.thr.array(xx.shape, dtype = self.dtype)
+        else:
+            x = out
+        if x is not xx:
+            self.thr.copy_array(xx, dest=x, )#size = int(xx.nbytes/xx.dtype.itemsize)) #size = int(xx.nbytes/8) is a hack of error in cuda backends; 8 is the byte of numpy.complex64 
         
 #         self.prg.cMultiplyRealInplace(self.batch, self.volume['SnGPUArray'], z, local_size=None, global_size =  int(self.batch * self.Ndprod))
 #         self.prg.cTensorMultiply(numpy.uint32(self.batch), 
@@ -482,13 +788,10 @@ class NUFFT_hsa:
     @push_cuda_context
     def x2s(self, x):
         s = self.thr.array(self.st['Nd'], dtype=self.dtype)
-#         try:
-        self.prg.cMultiplyConjVecInplace(numpy.uint32(1), self.volume['gpu_coil_profile'], x, local_size = None,  global_size = int(self.batch * self.Ndprod))
-#         x2 = x  *  self.volume['gpu_coil_profile'].conj()
-#         except:
-#             x2 = x
-        self.prg.cAggregate(self.batch, self.Ndprod, x, s, local_size = int(self.wavefront), global_size = int(self.batch * self.Ndprod * self.wavefront))
-#         self.prg.cMerge(self.batch, self.Ndprod, self.volume['gpu_coil_profile'], x, s, local_size = int(self.wavefront), global_size = int(self.batch * self.Ndprod * self.wavefront))
+#         self.prg.cMultiplyConjVecInplace(numpy.uint32(1), self.volume['gpu_coil_profile'], x, local_size = None,  global_size = int(self.batch * self.Ndprod))
+#         self.prg.cAggregate(self.batch, self.Ndprod, x, s, local_size = int(self.wavefront), global_size = int(self.batch * self.Ndprod * self.wavefront))
+        # fused conjugate coil multiplication and reduction, which leaves x unchanged
+        self.prg.cMerge(self.batch, self.Ndprod, self.volume['gpu_coil_profile'], x, s, local_size = int(self.wavefront), global_size = int(self.Ndprod * self.wavefront))
         return s
         
     @push_cuda_context
@@ -506,50 +809,87 @@ class NUFFT_hsa:
         gx2 = self.adjoint_many2one(gy)
         del gy
         return gx2    
-    def selfadjoint(self, gx):
+    def operator_norm(self, one2many2one = False, maxiter = 100, tol = 1e-4):
+        """
+        The largest eigenvalue ||A^H A|| of selfadjoint() (or selfadjoint_one2many2one()), estimated by the power iteration on the device. 
+        
+        The estimate is computed at the first call and cached in self.kernels. 
+        plan() clears the cache, and set_sense() and reset_sense() clear the estimate of selfadjoint_one2many2one(). 
+        The cached estimate is recomputed only if a smaller tol is requested. 
+        'fista' and 'admm' take their step size and penalty from the cached estimate. 
+        
+        :param one2many2one: if True, the operator is selfadjoint_one2many2one() of the batch plan, which includes the coil sensitivities
+        :param maxiter: the maximum number of the power iterations
+        :param tol: the relative change of the estimate to exit
+        :type one2many2one: boolean
+        :type maxiter: int
+        :type tol: float
+        :return: L: the estimate of ||A^H A||
+        :rtype: float
+        """
+        from ..linalg.solve_hsa import _power_iteration
+        if one2many2one and self.batch > 1:
+            name = 'operator_norm_one2many2one'
+            def AHA(gx, out):
+                gx2 = self.selfadjoint_one2many2one(gx)
+                self.prg.cCopy(gx2, out, local_size = None, global_size = int(self.Ndprod))
+                return out
+            shape = self.Nd
+        else: # the single-coil selfadjoint_one2many2one() is selfadjoint()
+            name = 'operator_norm'
+            def AHA(gx, out):
+                return self.selfadjoint(gx, out = out)
+            shape = self.multi_Nd
+        cache = self.kernels.get(name, None)
+        if cache is None or tol < cache['tol']:
+            cache = {'L': _power_iteration(self, AHA, shape, maxiter, tol), 'tol': tol}
+            self.kernels[name] = cache
+        return cache['L']
+    
+    def selfadjoint(self, gx, out = None):
         """
         selfadjoint NUFFT (Teplitz) on the heterogeneous device
         
         :param gx: The input gpu array, with size=Nd
+        :param out: (Optional) The output gpu array, with size=Nd. The default allocates a new array.
         :type: reikna gpu array with dtype =numpy.complex64
         :return: gx: The output gpu array, with size=Nd
         :rtype: reikna gpu array with dtype =numpy.complex64
         """      
 
-        gy = self.forward(gx)
-        gx2 = self.adjoint(gy)
-        del gy
+        gy = self.forward(gx, out = self._buffer('y', self.multi_M))
+        gx2 = self.adjoint(gy, out = out)
         return gx2
     
     @push_cuda_context
-    def forward(self, gx):
+    def forward(self, gx, out = None):
         """
         Forward NUFFT on the heterogeneous device
         
+        The intermediate arrays are taken from the buffer pool of the object, 
+        so the steady-state calls with out do not allocate device memory. 
+        
         :param gx: The input gpu array, with size=Nd
+        :param out: (Optional) The output gpu array, with size=(M,). The default allocates a new array.
         :type: reikna gpu array with dtype =numpy.complex64
         :return: gy: The output gpu array, with size=(M,)
         :rtype: reikna gpu array with dtype =numpy.complex64
         """        
+        k = self._buffer('k', self.multi_Kd)
         try:
-            xx = self.x2xx(gx)
+            self.x2k(gx, out = k)
         except: # gx is not a gpu array 
             try:
-                print('The input array may not be a GPUarray.')
-                print('Automatically moving the input array to gpu, which is throttled by PCIe.')
-                print('You have been warned!')
+                logger.warning('The input array may not be a GPUarray. Automatically moving the input array to gpu, which is throttled by PCIe.')
                 px = self.to_device(gx, )
 #                 pz = self.thr.to_device(numpy.asarray(gz.astype(self.dtype),  order = 'C' ))
-                xx = self.x2xx(px)
+                self.x2k(px, out = k)
             except:
                 if gxx.shape != self.Nd + (self.batch, ):
-                    print('shape of the input = ', gx.shape, ', but it should be ', self.Nd + (self.batch, ))
+                    logger.error('shape of the input = %s, but it should be %s', gx.shape, self.Nd + (self.batch, ))
                 raise
             
-        k = self.xx2k(xx)
-        del xx
-        gy = self.k2y(k)
-        del k
+        gy = self.k2y(k, out = out)
         return gy
     
     @push_cuda_context
@@ -558,15 +898,13 @@ class NUFFT_hsa:
             x = self.s2x(s)
         except: # gx is not a gpu array 
             try:
-                print('In s2x(): The input array may not be a GPUarray.')
-                print('Automatically moving the input array to gpu, which is throttled by PCIe.')
-                print('You have been warned!')
+                logger.warning('In s2x(): The input array may not be a GPUarray. Automatically moving the input array to gpu, which is throttled by PCIe.')
                 ps = self.to_device(s, )
 #                 px = self.thr.to_device(numpy.asarray(x.astype(self.dtype),  order = 'C' ))
                 x = self.s2x(ps)
             except:
                 if s.shape != self.Nd:
-                    print('shape of the input = ', x.shape, ', but it should be ', self.Nd)
+                    logger.error('shape of the input = %s, but it should be %s', s.shape, self.Nd)
                 raise
         
         y = self.forward(x)
@@ -578,57 +916,59 @@ class NUFFT_hsa:
             x = self.adjoint(y)
         except: # gx is not a gpu array 
             try:
-                print('y.shape = ', y.shape)
-                print('In adjoint(): The input array may not be a GPUarray.')
-                print('Automatically moving the input array to gpu, which is throttled by PCIe.')
-                print('You have been warned!')
+                logger.warning('In adjoint(): The input array may not be a GPUarray. Automatically moving the input array to gpu, which is throttled by PCIe.')
                 py = self.to_device(y, )
 #                 py = self.thr.to_device(numpy.asarray(y.astype(self.dtype),  order = 'C' ))
                 x = self.adjoint(py)
             except:
-                print('Failed at self.adjont! Please check the gy shape, type, stride.')
+                logger.error('Failed at self.adjont! Please check the gy shape, type, stride.')
                 raise        
 #         z = self.adjoint(y)
         s = self.x2s(x)
         return s
         
     @push_cuda_context
-    def adjoint(self, gy):
+    def adjoint(self, gy, out = None):
         """
         Adjoint NUFFT on the heterogeneous device
         
+        The intermediate arrays are taken from the buffer pool of the object, 
+        so the steady-state calls with out do not allocate device memory. 
+        
         :param gy: The input gpu array, with size=(M,)
+        :param out: (Optional) The output gpu array, with size=Nd. The default allocates a new array.
         :type: reikna gpu array with dtype =numpy.complex64
         :return: gx: The output gpu array, with size=Nd
         :rtype: reikna gpu array with dtype =numpy.complex64
         """              
+        k = self._buffer('k', self.multi_Kd)
         try:
-            k = self.y2k(gy)
+            self.y2k(gy, out = k)
         except: # gx is not a gpu array 
             try:
-                print('In adjoint(): The input array may not be a GPUarray.')
-                print('Automatically moving the input array to gpu, which is throttled by PCIe.')
-                print('You have been warned!')
+                logger.warning('In adjoint(): The input array may not be a GPUarray. Automatically moving the input array to gpu, which is throttled by PCIe.')
                 py = self.to_device(gy, )
 #                 py = self.thr.to_device(numpy.asarray(gy.astype(self.dtype),  order = 'C' ))
-                k = self.y2k(py)
+                self.y2k(py, out = k)
             except:
-                print('Failed at self.adjont! Please check the gy shape, type, stride.')
+                logger.error('Failed at self.adjont! Please check the gy shape, type, stride.')
                 raise
                         
 #             k = self.y2k(gy)
-        xx = self.k2xx(k)
-        del k
-        gx = self.xx2x(xx)
-        del xx
+        gx = self.k2x(k, out = out)
         return gx
     
     @push_cuda_context
     def release(self):
+        """
+        Release the device arrays of the object. The shared HSAContext is released by HSAContext.release().
+        """
         del self.volume
         del self.prg
         del self.pELL
-        self.thr.release()
+        del self.buffers
+        if self.gather:
+            del self.csrH
         del self.thr
         
     @push_cuda_context
@@ -637,7 +977,7 @@ class NUFFT_hsa:
         The solver of NUFFT_hsa
         
         :param gy: data, reikna array, (M,) size
-        :param solver: could be 'cg', 'L1TVOLS', 'L1TVLAD' 
+        :param solver: could be 'cg', 'L1TVOLS', 'L1TVLAD', 'fista', 'admm', 'dc' 
         :param maxiter: the number of iterations
         :type gy: reikna array, dtype = numpy.complex64
         :type solver: string
@@ -650,17 +990,15 @@ class NUFFT_hsa:
             return solve(self,  gy,  solver, *args, **kwargs)
         except:
             try:
-                    print('In solve(): The input array may not be a GPUarray.')
-                    print('Automatically moving the input array to gpu, which is throttled by PCIe.')
-                    print('You have been warned!')
+                    logger.warning('In solve(): The input array may not be a GPUarray. Automatically moving the input array to gpu, which is throttled by PCIe.')
                     py = self.to_device(gy, )
                     return solve(self,  py,  solver, *args, **kwargs)
             except:
                 if numpy.ndarray == type(gy):
-                    print("input gy must be a reikna array with dtype = numpy.complex64")
+                    logger.error("input gy must be a reikna array with dtype = numpy.complex64")
                     raise #TypeError
                 else:
-                    print("wrong")
+                    logger.error("solve() failed")
                     raise #TypeError
                 
 
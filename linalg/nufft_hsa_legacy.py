@@ -6,9 +6,6 @@ from __future__ import absolute_import
 import numpy
 import scipy.sparse
 import numpy.fft
-import scipy.signal
-import scipy.linalg
-import scipy.special
 from functools import wraps as _wraps
 
 from ..src._helper import helper, helper1
@@ -0,0 +1,193 @@
+"""
+Plan registry
+=======================================
+
+PlanRegistry keeps the planned NUFFT_cpu objects of a long-running process.
+
+The plans are looked up by (trajectory hash, Nd, Kd, Jd, ft_axes, batch) and the optional arguments of plan().
+The least-recently-used plans are evicted when the arrays of the resident plans exceed the byte budget.
+The arrays include the kernels which solve() caches in the plans, and they are measured again at every lookup.
+The plans are planned outside the lock of the registry, so a slow miss does not block the hits of other threads, 
+and the concurrent misses of the same key plan only once.
+
+:Example:
+
+>>> import pynufft
+>>> registry = pynufft.PlanRegistry(max_bytes = 8*2**30)
+>>> NufftObj = registry.get(om, Nd, Kd, Jd) # planned at the first call, reused afterwards
+>>> registry.stats()
+"""
+from __future__ import absolute_import
+import hashlib
+import threading
+import time
+import collections
+import concurrent.futures
+import numpy
+
+from .nufft_cpu import NUFFT_cpu
+
+def plan_nbytes(nufft):
+    """
+    The number of bytes of the arrays held by a planned object, including the CSR matrices and the arrays in st.
+
+    :param nufft: the planned object
+    :type nufft: NUFFT_cpu
+    :return: nbytes
+    :rtype: int
+    """
+    arrays, meta = nufft._export_arrays()
+    return int(sum(array.nbytes for array in arrays.values()))
+
+def trajectory_hash(om):
+    """
+    The SHA-1 digest of the trajectory, including its shape and dtype.
+
+    :param om: The M off-grid locations
+    :type om: numpy.float array
+    :return: digest
+    :rtype: string
+    """
+    om = numpy.ascontiguousarray(om)
+    digest = hashlib.sha1(str((om.shape, om.dtype.str)).encode())
+    digest.update(om.data)
+    return digest.hexdigest()
+
+class PlanRegistry:
+    """
+    In-process registry of planned objects with least-recently-used (LRU) eviction.
+    """
+    def __init__(self, max_bytes, nufft_class = NUFFT_cpu):
+        """
+        Constructor.
+
+        :param max_bytes: The byte budget of the resident plans
+        :param nufft_class: (Optional) The class to be planned. The default is NUFFT_cpu.
+        :type max_bytes: int
+        :type nufft_class: NUFFT_cpu or its subclass
+        """
+        self.max_bytes = max_bytes
+        self.nufft_class = nufft_class
+        self.plans = collections.OrderedDict() # key: (nufft, nbytes, plan time), from the least recently used
+        self.pending = {} # key: Future of the plan which is being planned by another thread
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.plan_time = 0.0 # seconds spent in plan()
+        self.plan_time_saved = 0.0 # seconds of plan() avoided by the hits
+        self.resident_bytes = 0
+
+    def key(self, om, Nd, Kd, Jd, ft_axes = None, batch = None, **kwargs):
+        """
+        The key of a plan.
+
+        :return: (trajectory hash, Nd, Kd, Jd, ft_axes, batch, sorted kwargs)
+        :rtype: tuple
+        """
+        if ft_axes is not None:
+            ft_axes = tuple(ft_axes)
+        return (trajectory_hash(om), tuple(Nd), tuple(Kd), tuple(Jd), ft_axes, batch, tuple(sorted(kwargs.items())))
+
+    def get(self, om, Nd, Kd, Jd, ft_axes = None, batch = None, **kwargs):
+        """
+        Look up the plan, or plan a new object and register it.
+
+        The arguments are the same as NUFFT_cpu.plan().
+        A plan which is larger than max_bytes is returned without being registered.
+        The callers which wait for the plan of another thread are counted as hits.
+
+        :return: nufft: the planned object, which is shared by all the callers with the same key
+        :rtype: NUFFT_cpu
+        """
+        key = self.key(om, Nd, Kd, Jd, ft_axes, batch, **kwargs)
+        with self.lock:
+            if key in self.plans:
+                self.plans.move_to_end(key)
+                nufft, nbytes, seconds = self.plans[key]
+                self.hits += 1
+                self.plan_time_saved += seconds
+                self._remeasure(key)
+                return nufft
+            future = self.pending.get(key, None)
+            owner = future is None
+            if owner: # plan it in this thread
+                future = concurrent.futures.Future()
+                self.pending[key] = future
+                self.misses += 1
+            else:
+                self.hits += 1
+        
+        if not owner: # wait for the other thread
+            return future.result()
+        
+        try:
+            t0 = time.time()
+            nufft = self.nufft_class()
+            nufft.plan(om, Nd, Kd, Jd, ft_axes = ft_axes, batch = batch, **kwargs)
+            seconds = time.time() - t0
+            nbytes = plan_nbytes(nufft)
+        except BaseException as e:
+            with self.lock:
+                del self.pending[key]
+            future.set_exception(e)
+            raise
+        
+        with self.lock:
+            del self.pending[key]
+            self.plan_time += seconds
+            if nbytes <= self.max_bytes:
+                while self.resident_bytes + nbytes > self.max_bytes:
+                    self._evict()
+                self.plans[key] = (nufft, nbytes, seconds)
+                self.resident_bytes += nbytes
+        future.set_result(nufft)
+        return nufft
+
+    def _remeasure(self, key):
+        """
+        Private: update the bytes of a resident plan, which grow with the kernels cached by solve(). 
+        The least recently used plans are evicted if the budget is exceeded, but not the plan of the key. 
+        """
+        nufft, nbytes, seconds = self.plans[key]
+        nbytes_now = plan_nbytes(nufft)
+        if nbytes_now != nbytes:
+            self.plans[key] = (nufft, nbytes_now, seconds)
+            self.resident_bytes += nbytes_now - nbytes
+            while self.resident_bytes > self.max_bytes and next(iter(self.plans)) != key:
+                self._evict()
+
+    def _evict(self):
+        """
+        Private: remove the least recently used plan
+        """
+        key, (nufft, nbytes, seconds) = self.plans.popitem(last = False)
+        self.resident_bytes -= nbytes
+        self.evictions += 1
+
+    def clear(self):
+        """
+        Remove all the plans. The statistics are kept.
+        """
+        with self.lock:
+            self.plans.clear()
+            self.resident_bytes = 0
+
+    def stats(self):
+        """
+        The statistics of the registry.
+
+        :return: hits, misses, hit_rate, evictions, plans, resident_bytes, max_bytes, plan_time and plan_time_saved (seconds)
+        :rtype: dict
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': self.hits*1.0/lookups if lookups > 0 else 0.0,
+                    'evictions': self.evictions,
+                    'plans': len(self.plans),
+                    'resident_bytes': self.resident_bytes,
+                    'max_bytes': self.max_bytes,
+                    'plan_time': self.plan_time,
+                    'plan_time_saved': self.plan_time_saved}
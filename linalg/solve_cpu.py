@@ -3,10 +3,101 @@ CPU solvers
 ======================================
 """
 
+import time
 import scipy
+import scipy.sparse.linalg
 import numpy
 from ..src._helper import helper
 
+class SolveResult:
+    """
+    The result of solve(..., full_output = True). 
+    
+    :ivar x: the solution
+    :ivar solver: the name of the solver
+    :ivar niter: the number of iterations
+    :ivar residuals: the relative residual norm after each iteration (nan if the solver does not provide it)
+    :ivar times: the wall time of each iteration (seconds)
+    :ivar time: the total wall time (seconds)
+    :ivar info: the solver-specific outputs, e.g. istop of lsqr
+    """
+    def __init__(self, x, solver, niter, residuals, times, time, info = None):
+        self.x = x
+        self.solver = solver
+        self.niter = niter
+        self.residuals = numpy.asarray(residuals, dtype = numpy.float64)
+        self.times = numpy.asarray(times, dtype = numpy.float64)
+        self.time = time
+        if info is None:
+            info = {}
+        self.info = info
+        
+    def __repr__(self):
+        if len(self.residuals) > 0:
+            residual = self.residuals[-1]
+        else:
+            residual = numpy.nan
+        return 'SolveResult(solver=%r, niter=%d, residual=%.3g, time=%.3f s)' % (self.solver, self.niter, residual, self.time)
+
+class _StopSolver(Exception):
+    """
+    Private: raised in the callbacks of the scipy solvers to exit early with the current iterate
+    """
+    def __init__(self, x):
+        Exception.__init__(self)
+        self.x = x
+
+class _Monitor:
+    """
+    Private: record the iterations of a solver, and decide the early exit by tol or by the callback. 
+    
+    The residual is computed only if monitor.active, so the solvers do not pay for it otherwise. 
+    """
+    def __init__(self, tol = None, callback = None, full_output = False):
+        self.tol = tol
+        self.callback = callback
+        self.track = full_output or callback is not None # record the residuals
+        self.active = self.track or tol is not None
+        self.niter = 0
+        self.residuals = []
+        self.times = []
+        self.t0 = time.time()
+        self.t = self.t0
+    
+    def update(self, x, residual = None):
+        """
+        Record one iteration.
+        
+        :param x: the current iterate, passed to the callback
+        :param residual: the relative residual norm, or None if unknown
+        :return: stop: True if the solver should exit
+        """
+        now = time.time()
+        self.times += [now - self.t, ]
+        self.t = now
+        self.niter += 1
+        if residual is None:
+            self.residuals += [numpy.nan, ]
+        else:
+            self.residuals += [float(residual), ]
+        stop = self.tol is not None and residual is not None and residual < self.tol
+        if self.callback is not None:
+            if self.callback(self.niter, x, residual):
+                stop = True
+        return stop
+    
+    def result(self, x, solver, info = None):
+        return SolveResult(x, solver, self.niter, self.residuals, self.times, time.time() - self.t0, info)
+
+def _scipy_tol_name(method):
+    """
+    Private: the keyword of the relative tolerance of the scipy solver, 'rtol' (scipy >= 1.12) or 'tol'
+    """
+    import inspect
+    if 'rtol' in inspect.signature(method).parameters:
+        return 'rtol'
+    return 'tol'
+
 def cDiff(x, d_indx):
         """
         Compute image gradient. Needing the results of indxmap_diff(Nd)
@@ -38,9 +129,174 @@ def _create_kspace_sampling_density(nufft):
         return RTR
    
     
-def L1TVOLS(nufft, y, maxiter, rho ): # main function of solver
+def _cached_kernel(nufft, name, create):
+    """
+    Private: the kernel of a solver, which is computed once per plan and cached in nufft.kernels. 
+    
+    plan() clears nufft.kernels. The objects without nufft.kernels compute the kernel at every call. 
+    The cached kernels must not be modified in place. 
+    
+    :param nufft: NUFFT_cpu or NUFFT_hsa object
+    :param name: the key of the kernel, e.g. 'density', 'laplacian' or 'toeplitz'
+    :param create: the function create(nufft) which computes the kernel
+    :return: kernel: numpy array
+    """
+    kernels = getattr(nufft, 'kernels', None)
+    if kernels is None:
+        return create(nufft)
+    if name not in kernels:
+        kernels[name] = create(nufft)
+    return kernels[name]
+
+class _TVEngine:
+    """
+    Private: the finite differences and the shrinkage of L1TVOLS on preallocated buffers. 
+    
+    The periodic differences are computed by slices, without the index maps of helper.indxmap_diff(). 
+    Diff(x)[i] = x[i - 1] - x[i] and Diff_t(x)[i] = x[i + 1] - x[i] along each axis, the same as cDiff(). 
+    With threads > 1, each step is split into slabs which are processed by a thread pool 
+    (numpy releases the GIL in the ufuncs). The differences along an axis are split along another axis. 
+    """
+    def __init__(self, Nd, dtype, threads = None):
+        """
+        :param Nd: the image size
+        :param dtype: the complex dtype of the image
+        :param threads: (Optional) the number of threads. The default None runs in the calling thread.
+        """
+        self.Nd = tuple(Nd)
+        self.ndims = len(self.Nd)
+        self.zz = numpy.zeros((self.ndims, ) + self.Nd, dtype = dtype)
+        self.tmp = numpy.empty(self.Nd, dtype = dtype)
+        self.s = numpy.empty(self.Nd, dtype = numpy.empty((0, ), dtype = dtype).real.dtype)
+        self.r = numpy.empty_like(self.s)
+        self.executor = None
+        if threads is not None and threads > 1:
+            import concurrent.futures
+            self.executor = concurrent.futures.ThreadPoolExecutor(threads)
+            self.threads = threads
+    
+    def close(self):
+        """
+        Shut down the thread pool
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+    
+    def _slabs(self, exclude = None):
+        """
+        Private: the index tuples of the slabs, split along the first axis which is not exclude
+        """
+        if self.executor is None:
+            return [(Ellipsis, ), ]
+        axes = [ax for ax in range(0, self.ndims) if ax != exclude and self.Nd[ax] > 1]
+        if len(axes) == 0:
+            return [(Ellipsis, ), ]
+        ax = axes[0]
+        bounds = numpy.linspace(0, self.Nd[ax], min(self.threads, self.Nd[ax]) + 1).astype(int)
+        slabs = []
+        for pp in range(0, len(bounds) - 1):
+            index = [slice(None), ]*self.ndims
+            index[ax] = slice(bounds[pp], bounds[pp + 1])
+            slabs += [tuple(index), ]
+        return slabs
+    
+    def _map(self, func, exclude = None):
+        """
+        Private: run func(index) on the slabs and wait for the results
+        """
+        slabs = self._slabs(exclude)
+        if self.executor is None or len(slabs) == 1:
+            for index in slabs:
+                func(index)
+        else:
+            for future in [self.executor.submit(func, index) for index in slabs]:
+                future.result()
+    
+    @staticmethod
+    def diff(x, axis, out, transpose = False):
+        """
+        The periodic difference of x along axis, written to out. 
+        
+        :param transpose: False for Diff(x)[i] = x[i - 1] - x[i], True for Diff_t(x)[i] = x[i + 1] - x[i]
+        """
+        n = x.shape[axis]
+        def index(start, stop):
+            ind = [slice(None), ]*x.ndim
+            ind[axis] = slice(start, stop)
+            return tuple(ind)
+        if transpose:
+            numpy.subtract(x[index(1, n)], x[index(0, n - 1)], out = out[index(0, n - 1)])
+            numpy.subtract(x[index(0, 1)], x[index(n - 1, n)], out = out[index(n - 1, n)])
+        else:
+            numpy.subtract(x[index(0, n - 1)], x[index(1, n)], out = out[index(1, n)])
+            numpy.subtract(x[index(n - 1, n)], x[index(0, 1)], out = out[index(0, 1)])
+    
+    def rhs(self, AHyk, dd, bb, mu, LMBD, out):
+        """
+        out = mu*AHyk + LMBD*sum(Diff_t(dd[pp] - bb[pp]))
+        """
+        zz, tmp = self.zz, self.tmp
+        def init(index):
+            numpy.multiply(AHyk[index], mu, out = out[index])
+            numpy.subtract(dd[(slice(None), ) + index], bb[(slice(None), ) + index], out = zz[(slice(None), ) + index])
+        self._map(init)
+        for pp in range(0, self.ndims):
+            def add(index):
+                self.diff(zz[pp][index], pp, tmp[index], transpose = True)
+                tmp[index] *= LMBD
+                out[index] += tmp[index]
+            self._map(add, exclude = pp)
+        return out
+    
+    def shrink(self, x, bb, dd, threshold):
+        """
+        The isotropic shrinkage of the edges and the Bregman update, in place: 
+        
+        zz = Diff(x) + bb, s = sqrt(sum(|zz[pp]|^2)) + 1e-5, dd = zz*max(s - threshold, 0)/s, bb = zz - dd
+        """
+        zz, s, r = self.zz, self.s, self.r
+        for pp in range(0, self.ndims):
+            def edge(index):
+                self.diff(x[index], pp, zz[pp][index])
+            self._map(edge, exclude = pp)
+        def update(index):
+            zi = zz[(slice(None), ) + index]
+            bi = bb[(slice(None), ) + index]
+            di = dd[(slice(None), ) + index]
+            si = s[index]
+            ri = r[index]
+            zi += bi
+            si.fill(0)
+            for pp in range(0, self.ndims):
+                numpy.abs(zi[pp], out = ri)
+                numpy.multiply(ri, ri, out = ri)
+                si += ri
+            numpy.sqrt(si, out = si)
+            si += 1e-5
+            numpy.subtract(si, threshold, out = ri)
+            numpy.maximum(ri, 0, out = ri)
+            ri /= si
+            numpy.multiply(zi, ri, out = di)
+            numpy.subtract(zi, di, out = bi)
+        self._map(update)
+
+def L1TVOLS(nufft, y, maxiter, rho, x0 = None, state = None, threads = None, monitor = None): # main function of solver
     """
     L1-total variation regularized ordinary least square 
+    
+    The finite differences and the shrinkage are computed in place by _TVEngine. 
+    The residual of the monitor is the relative change of the image norm(x_k+1 - x_k)/norm(x_k+1). 
+    
+    :param x0: (Optional) the initial image. Without state, x0 seeds the split-Bregman iterations with 
+               dd = Diff(x0), bb = 0 and AHyk = the density-weighted x0, so the first x-update returns x0 (up to the cropping of Kd). 
+               The Bregman variable AHyk cannot be recovered from an image, so state is the exact warm start. 
+    :param state: (Optional) a dictionary of the split-Bregman state ('AHyk', 'bb', 'dd'), 
+                  which initializes the iterations if it is not empty (x0 is then only the reference of the first relative change), 
+                  and is updated in place at the exit. 
+                  Passing the same dictionary for consecutive frames continues the iterations of the previous frame. 
+                  bb and dd are stacked along the first axis, with the shape (ndims, ) + Nd. 
+    :param threads: (Optional) the number of threads of the finite differences and the shrinkage
     """
     mu = 1.0
     LMBD = rho*mu
@@ -53,143 +309,681 @@ def L1TVOLS(nufft, y, maxiter, rho ): # main function of solver
         x2 = nufft.adjoint_many2one(y.reshape(nufft.multi_M, order='C'))
         return x2
     
-        
-    
-    uker = mu*_create_kspace_sampling_density(nufft)
-#     print('uker.shape', uker.shape) 
-    uker = uker - LMBD* helper.create_laplacian_kernel(nufft)
-#     print('uker.shape', uker.shape)
-#     import matplotlib.pyplot
-#     matplotlib.pyplot.imshow(abs(uker))
-#     matplotlib.pyplot.show()
-#     print('y.shape=', y.shape)
+    uker = mu*_cached_kernel(nufft, 'density', _create_kspace_sampling_density)
+    uker = uker - LMBD* _cached_kernel(nufft, 'laplacian', helper.create_laplacian_kernel)
+    uker += 1e-7
     AHy = AH(y)
-#     print('AHy.shape = ', AHy.shape)
     
     xkp1 = numpy.zeros_like(AHy)
     AHyk = numpy.zeros_like(AHy)
-           
-#         self._allo_split_variables()        
-    zz= []
-    bb = []
-    dd = []
-    d_indx, dt_indx = helper.indxmap_diff(nufft.st['Nd'])
-    z=numpy.zeros(nufft.st['Nd'], dtype = nufft.dtype, order='C')
     
-    ndims = len(nufft.st['Nd'])
-    s_tmp = []
-    for pp in range(0,ndims):
-            s_tmp += [0, ]
-            
-            
-    for jj in range(    0,  ndims): # n_dims + 1 for wavelets
-        
-        zz += [z.copy(),]
-        bb += [z.copy(),]
-        dd +=  [z.copy(),]
-#     zf = z.copy()
-#     bf = z.copy()
-#     df = z.copy()
-
-    n_dims = len(nufft.st['Nd'])#numpy.size(uf.shape)
+    Nd = tuple(nufft.st['Nd'])
+    ndims = len(Nd)
+    engine = _TVEngine(Nd, AHy.dtype, threads)
+    bb = numpy.zeros((ndims, ) + Nd, dtype = AHy.dtype) # split variables of all the dimensions
+    dd = numpy.zeros((ndims, ) + Nd, dtype = AHy.dtype)
+    rhs = numpy.empty_like(AHy)
+    if x0 is not None:
+        xkp1 = numpy.asarray(x0, dtype = AHy.dtype)
+    if state: # continue from the previous state
+        AHyk = numpy.array(state['AHyk'], dtype = AHy.dtype)
+        bb[...] = state['bb']
+        dd[...] = state['dd']
+    elif x0 is not None: # seed the split variables with x0, so that rhs = K x0
+        AHyk[...] = nufft.k2xx_one2one(nufft.xx2k_one2one(xkp1)*_cached_kernel(nufft, 'density', _create_kspace_sampling_density))
+        for pp in range(0, ndims):
+            engine.diff(xkp1, pp, dd[pp])
     
-    for outer in numpy.arange(0, maxiter):
-#             for inner in numpy.arange(0,nInner):
+    threshold_value = 1/LMBD
+    try:
+        for outer in numpy.arange(0, maxiter):
+            xk = xkp1
             
-        # solve Ku = rhs
+            # solve Ku = rhs, rhs = mu*AHyk + LMBD*sum(Diff_t(dd[pp] - bb[pp]))
+            engine.rhs(AHyk, dd, bb, mu, LMBD, rhs)
+            # Note K = F' uker F
+            # so K-1 ~ F
+            xkp1 = nufft.k2xx_one2one( (nufft.xx2k_one2one(rhs)+1e-7) / uker) 
             
-        rhs = mu*AHyk# + df - bf)   # right hand side
-        for pp in range(0,ndims):
-#             diff1 =  dd[pp] - bb[pp]
-#             diff1 = numpy.roll( diff1, 1, axis = pp) - diff1
-            rhs += LMBD*(cDiff(dd[pp] - bb[pp], dt_indx[pp]))
-#             del diff1
-#                 LMBD*(cDiff(dd[1] - bb[1],  dt_indx[1]))  )          
-        # Note K = F' uker F
-        # so K-1 ~ F
-        xkp1 = nufft.k2xx_one2one( (nufft.xx2k_one2one(rhs)+1e-7) / (uker+1e-7)) 
-#                 self._update_d(xkp1)
-        for pp in range(0,ndims):
+            zf = AHA(xkp1)  
+            zf -= AHy
             
-#             zz[pp] = numpy.roll( xkp1, -1, axis = pp) - xkp1            
-            zz[pp] = cDiff(xkp1, d_indx[pp])
-#         zz[0] = cDiff(xkp1,  d_indx[0])
-#         zz[1] = cDiff(xkp1,  d_indx[1])
-        zf = AHA(xkp1)  -AHy 
+            # soft-thresholding the edges Diff(xkp1) + bb, and the Bregman update of bb
+            engine.shrink(xkp1, bb, dd, threshold_value)
+            
+            AHyk -= zf # Linearized Bregman iteration f^k+1 = f^k + f - Au
+            if monitor is not None and monitor.active:
+                xnorm = numpy.linalg.norm(xkp1)
+                if monitor.update(xkp1, numpy.linalg.norm(xkp1 - xk)/xnorm if xnorm > 0 else 1.0):
+                    break
+    finally:
+        engine.close()
+    
+    if state is not None:
+        state.update({'AHyk': AHyk, 'bb': bb, 'dd': dd})
 
-        '''
-        soft-thresholding the edges
-        '''
-        s = numpy.zeros_like(zz[pp]) # complex
-        for pp in range(0,ndims):
-            s_tmp[pp] = zz[pp] + bb[pp]
+    return xkp1 #(u,u_stack)
 
-            s_r = numpy.hypot(s_tmp[pp].real, s_tmp[pp].imag)
-            s = numpy.hypot(s_r, s.real)
-#             s = numpy.sqrt(s**2 + s_tmp[pp]**2)
-#             else:
-#                 s =  s_tmp[pp]
-#         s1 = zz[0] + bb[0]
-#         s2 = zz[1] + bb[1]
-#         s = sum((s_tmp[pp])**2 for pp in range(0,n_dims))
-#         s = s1**2 + s2**2
-        s += 1e-5
+def _pipe_density(nufft, maxiter, tol = None, monitor = None):
+    """
+    Private: the density compensation weights W by the iterations of Pipe and Menon (1999), W = W / (P P^H W). 
+    
+    P is the interpolator alone (k2y() and y2k(), the convolution with the gridding kernel), so the iterations do not compute the FFTs. 
+    The iterations exit when the rms of |P P^H W - 1| is below tol. 
+    W is finally scaled so that mean(A A^H W) = 1, with one forward(adjoint(W)). 
+    
+    The weights are cached in nufft.kernels['pipe_density'] = {'W', 'niter', 'residual'}, 
+    so they are saved, loaded and shared with the plan. 
+    The cached weights are returned if they have already run maxiter iterations or reached tol, 
+    otherwise the iterations continue from the cached weights (the iterations do not depend on the scale of W). 
+    
+    :param nufft: NUFFT_cpu object
+    :param maxiter: the maximum number of iterations since the plan
+    :param tol: (Optional) the rms of |P P^H W - 1| to exit
+    :param monitor: (Optional) _Monitor, which records the iterations run by this call
+    :return: W: the weights, shape = multi_M
+    :rtype: numpy array
+    """
+    kernels = getattr(nufft, 'kernels', None)
+    if kernels is None:
+        kernels = {}
+    cache = kernels.get('pipe_density', None)
+    if cache is not None:
+        if cache['niter'] >= maxiter or (tol is not None and cache['residual'] < tol):
+            return cache['W']
+        W = cache['W']
+        niter = cache['niter']
+    else:
+        W = numpy.ones(nufft.multi_M, dtype = nufft.dtype)
+        niter = 0
+    
+    residual = numpy.inf
+    for pp in range(niter, maxiter):
+        E = nufft.k2y(nufft.y2k(W)) # P P^H W
+        residual = numpy.sqrt(numpy.mean(abs(E - 1)**2))
+        if tol is not None and residual < tol:
+            break
+        W = W/E
+        niter += 1
+        if monitor is not None and monitor.active:
+            if monitor.update(W, residual):
+                break
+    
+    W = W/numpy.mean(numpy.real(nufft.forward(nufft.adjoint(W))))
+    kernels['pipe_density'] = {'W': W, 'niter': niter, 'residual': float(residual)}
+    return W
+ 
+def _toeplitz_kernel(nufft):
+    """
+    Private: the circulant embedding (size 2*Nd) of the Toeplitz normal operator A^H A. 
+    
+    (A^H A x)[n] = sum_n' h[n - n'] x[n'], where the point spread function h[d] = sum_m exp(i om_m d) 
+    is computed by the adjoint of an NUFFT with the doubled image and grid sizes. 
+    
+    :param nufft: NUFFT_cpu object
+    :return: c: the first column of the circulant matrix, shape = 2*Nd
+    :rtype: numpy.complex array
+    """
+    from .nufft_cpu import NUFFT_cpu
+    om = nufft.st['om']
+    if numpy.ndim(om) != 2:
+        raise ValueError('The Toeplitz normal operator requires a single trajectory')
+    Nd2 = tuple(2*N for N in nufft.st['Nd'])
+    Kd2 = tuple(2*K for K in nufft.st['Kd'])
+    psf = NUFFT_cpu()
+    psf.plan(om, Nd2, Kd2, nufft.st['Jd'])
+    h = psf.adjoint(numpy.ones((om.shape[0], ), dtype = nufft.dtype))*numpy.prod(Kd2) # h[n - Nd]
+    c = numpy.fft.ifftshift(h) # c[n] = h[n] for n < Nd, and h[n - 2*Nd] for n >= Nd
+    return c
 
-        threshold_value = 1/LMBD
-        r =(s > threshold_value)*(s-threshold_value)/s#numpy.maximum(s - threshold_value ,  0.0)/s
-        for pp in range(0,ndims):
-            dd[pp] = s_tmp[pp]*r
-#         dd[0] = s1*r
-#         dd[1] = s2*r
-#         df = zf+bf
-#         
-#         threshold_value=1.0/mu
-#     
-#         df.real =0.0+ (df.real>threshold_value)*(df.real - threshold_value) +(df.real<= - threshold_value)*(df.real+threshold_value)
-#         df.imag = 0.0+(df.imag>threshold_value)*(df.imag - threshold_value) +(df.imag<= - threshold_value)*(df.imag+threshold_value) 
-#                 df =     sy
-        # end of shrinkage
-        for pp in range(0,ndims):
-            bb[pp] += zz[pp] - dd[pp]
-#         bb[0] += zz[0] - dd[0] 
-#         bb[1] += zz[1] - dd[1] 
-#         bf += zf - df 
-#                 self._update_b() # update b based on the current u
+def _circulant_preconditioner(c, Nd):
+    """
+    Private: T. Chan's optimal circulant approximation of the Toeplitz matrix, given its circulant embedding c. 
+    
+    c_opt[j] = ((N - j) h[j] + j h[j - N])/N along each axis. 
+    
+    :param c: the circulant embedding from _toeplitz_kernel()
+    :param Nd: the image size
+    :return: c_opt: the first column of the circulant preconditioner, shape = Nd
+    """
+    for dimid in range(0, len(Nd)):
+        N = Nd[dimid]
+        shape = [1, ]*len(Nd)
+        shape[dimid] = N
+        j = numpy.reshape(numpy.arange(0, N), shape)
+        lo = numpy.take(c, numpy.arange(0, N), axis = dimid)
+        hi = numpy.take(c, numpy.arange(N, 2*N), axis = dimid)
+        c = ((N - j)*lo + j*hi)/N
+    return c
 
-        AHyk = AHyk - zf # Linearized Bregman iteration f^k+1 = f^k + f - Au
-#             print(outer)
+def _normal_operator(nufft, toeplitz = False):
+    """
+    Private: the normal operator A^H A in the image domain, which maps Nd (or Nd + (batch, )) images. 
+    
+    :param nufft: NUFFT_cpu object
+    :param toeplitz: if True, A^H A is computed by the FFTs of the doubled image size (see _toeplitz_kernel()), 
+                     instead of forward() and adjoint()
+    :return: AHA: the function AHA(x)
+    """
+    if not toeplitz:
+        def AHA(x):
+            return nufft.adjoint(nufft.forward(x))
+        return AHA
+    
+    Nd = tuple(nufft.st['Nd'])
+    ndims = len(Nd)
+    axes = tuple(range(0, ndims))
+    c = _cached_kernel(nufft, 'toeplitz', _toeplitz_kernel)
+    T = numpy.fft.fftn(c)/nufft.Kdprod
+    crop = tuple(slice(0, N) for N in Nd)
+    def AHA(x):
+        xx = numpy.zeros(c.shape + x.shape[ndims:], dtype = x.dtype)
+        xx[crop] = x
+        TT = numpy.reshape(T, c.shape + (1, )*(x.ndim - ndims)) # broadcast over the batch
+        return numpy.fft.ifftn(TT*numpy.fft.fftn(xx, axes = axes), axes = axes)[crop].astype(x.dtype)
+    return AHA
 
-    return xkp1 #(u,u_stack)
+def _power_iteration(AHA, shape, dtype, maxiter = 50, tol = 1e-3):
+    """
+    Private: the largest eigenvalue of the Hermitian positive semi-definite operator A^H A by the power iteration. 
+    
+    The iterations start from a fixed random image, so the estimates are reproducible, 
+    and exit when the relative change of the estimate is below tol. 
+    
+    :param AHA: the function AHA(x)
+    :param shape: the shape of the image
+    :param dtype: the dtype of the image
+    :return: L: the estimate of ||A^H A||
+    :rtype: float
+    """
+    rng = numpy.random.RandomState(0)
+    x = (rng.randn(*shape) + 1.0j*rng.randn(*shape)).astype(dtype)
+    x /= numpy.linalg.norm(x)
+    L = 0.0
+    for pp in range(0, maxiter):
+        x = AHA(x)
+        L_new = numpy.linalg.norm(x)
+        if L_new == 0:
+            return 0.0
+        x /= L_new
+        if abs(L_new - L) < tol*L_new:
+            return float(L_new)
+        L = L_new
+    return float(L)
 
-def _pipe_density(nufft, maxiter):
-    '''
-    Create the density function by iterative solution
-    Generate pHp matrix
-    '''
-#         W = pipe_density(self.st['p'])
-    # sampling density function
-              
-    W = numpy.ones(nufft.multi_M,dtype=nufft.dtype)
-#         V1= self.st['p'].getH()
-    #     VVH = V.dot(V.getH()) 
-         
-    for pp in range(0,maxiter):
-#             E = self.st['p'].dot(V1.dot(W))
+def prox_l1(x, threshold):
+    """
+    The proximal operator of threshold*||x||_1, i.e. the complex soft-thresholding x*max(|x| - threshold, 0)/|x|, in place. 
+    
+    :param x: the image, which is overwritten
+    :param threshold: the threshold
+    :return: x
+    """
+    if threshold <= 0:
+        return x
+    s = numpy.abs(x)
+    numpy.maximum(s, threshold, out = s) # |x| <= threshold is set to 0 below
+    numpy.subtract(1, threshold/s, out = s)
+    x *= s
+    return x
+
+def prox_l2(x, threshold):
+    """
+    The proximal operator of threshold*||x||_2^2/2, i.e. x/(1 + threshold), in place (Tikhonov regularization). 
+    
+    :param x: the image, which is overwritten
+    :param threshold: the weight
+    :return: x
+    """
+    x /= 1.0 + threshold
+    return x
+
+def prox_tv(x, threshold, ndims = None, maxiter = 100, tol = 1e-3, p = None):
+    """
+    The proximal operator of threshold*TV(x), the isotropic total variation along the first ndims axes, in place. 
+    
+    The dual problem is solved by the fast gradient projection of Beck and Teboulle (2009): 
+    x = v - threshold*Diff_t(q), p = P(q + Diff(x)/(4*ndims*threshold)), where P projects |p| onto the unit ball, 
+    and q is the Nesterov extrapolation of p. 
+    The dual iterations exit when the relative change of x is below tol, so that the outer solver sees an accurate proximal operator 
+    (fista() is not stable with an inexact TV proximal operator and a large threshold). 
+    The differences are periodic, the same as _TVEngine.diff(). 
+    
+    :param x: the image, which is overwritten. The axes after ndims (e.g. the batch) are independent images.
+    :param threshold: the weight of TV
+    :param ndims: (Optional) the number of the image axes. The default is x.ndim.
+    :param maxiter: the maximum number of the dual iterations
+    :param tol: the relative change of x to exit the dual iterations
+    :param p: (Optional) the dual variable with the shape (ndims, ) + x.shape, 
+              which warm starts the dual iterations and is updated in place. 
+              Passing the same p at each outer iteration (e.g. of fista()) needs fewer dual iterations.
+    :return: x
+    """
+    if threshold <= 0:
+        return x
+    if ndims is None:
+        ndims = x.ndim
+    if p is None:
+        p = numpy.zeros((ndims, ) + x.shape, dtype = x.dtype)
+    v = x.copy()
+    q = p.copy()
+    p_old = numpy.empty_like(p)
+    tmp = numpy.empty_like(x)
+    s = numpy.empty(x.shape, dtype = numpy.abs(x[:0]).dtype)
+    r = numpy.empty_like(s)
+    step = 1.0/(4*ndims*threshold)
+    def primal(q): # x = v - threshold*sum(Diff_t(q[pp]))
+        x[...] = v
+        for pp in range(0, ndims):
+            _TVEngine.diff(q[pp], pp, tmp, transpose = True)
+            numpy.multiply(tmp, threshold, out = tmp)
+            numpy.subtract(x, tmp, out = x)
+    x_old = numpy.empty_like(x)
+    t = 1.0
+    for outer in range(0, maxiter):
+        x_old[...] = x
+        primal(q)
+        if outer > 0:
+            x_old -= x
+            if numpy.linalg.norm(x_old) <= tol*numpy.linalg.norm(x):
+                break
+        p_old[...] = p
+        s.fill(0)
+        for pp in range(0, ndims):
+            _TVEngine.diff(x, pp, tmp)
+            tmp *= step
+            numpy.add(q[pp], tmp, out = p[pp])
+            numpy.abs(p[pp], out = r)
+            r *= r
+            s += r
+        numpy.sqrt(s, out = s)
+        numpy.maximum(s, 1, out = s)
+        p /= s
+        
+        # q = p + (t - 1)/t_new*(p - p_old)
+        t_new = (1 + numpy.sqrt(1 + 4*t*t))/2
+        numpy.subtract(p, p_old, out = q)
+        q *= (t - 1)/t_new
+        q += p
+        t = t_new
+    primal(p)
+    return x
+
+def _prox_operator(prox, shape, ndims, dtype):
+    """
+    Private: the proximal operator prox(x, threshold) of fista() and admm()
+    
+    :param prox: 'l1', 'l2', 'tv', None (no regularization) or a function prox(x, threshold), 
+                 which returns the proximal operator of threshold*g at x (and may overwrite x)
+    :param shape: the shape of the image
+    :param ndims: the number of the image axes
+    :param dtype: the dtype of the image
+    """
+    if prox is None:
+        return lambda x, threshold: x
+    if callable(prox):
+        return prox
+    if 'l1' == prox:
+        return prox_l1
+    if 'l2' == prox:
+        return prox_l2
+    if 'tv' == prox:
+        p = numpy.zeros((ndims, ) + tuple(shape), dtype = dtype) # the dual variable, warm started between the iterations
+        return lambda x, threshold: prox_tv(x, threshold, ndims, p = p)
+    raise ValueError('prox must be \'l1\', \'l2\', \'tv\', None or a function prox(x, threshold)')
+
+def fista(nufft, y, maxiter = 100, lamb = 0.0, prox = 'l1', L = None, toeplitz = False, x0 = None, monitor = None):
+    """
+    Fast iterative shrinkage-thresholding algorithm (Beck and Teboulle 2009), 
+    minimizing ||A x - y||_2^2/2 + lamb*g(x), where g is given by its proximal operator. 
+    
+    Each iteration computes one A^H A (by forward() and adjoint(), or by the Toeplitz FFTs) and one proximal operator. 
+    The step size is 1/L, where L = ||A^H A|| is estimated by the power iteration of nufft.operator_norm(). 
+    The residual of the monitor is the relative change of the image norm(x_k+1 - x_k)/norm(x_k+1). 
+    
+    :param nufft: NUFFT_cpu object
+    :param y: (M,) or (M, batch) array, non-uniform data
+    :param maxiter: the maximum number of iterations
+    :param lamb: the weight of the regularization
+    :param prox: 'l1', 'l2', 'tv' (along the Nd axes), None or a function prox(x, threshold), see _prox_operator()
+    :param L: (Optional) the Lipschitz constant ||A^H A||. The default is nufft.operator_norm(), which is cached per plan.
+    :param toeplitz: if True, A^H A is computed by the FFTs of the doubled image size, see pcg()
+    :param x0: (Optional) the initial image
+    :param monitor: (Private) the iteration monitor of solve()
+    :return: x, L
+    """
+    AHA = _normal_operator(nufft, toeplitz)
+    b = nufft.adjoint(y)
+    ndims = len(nufft.st['Nd'])
+    if L is None:
+        L = nufft.operator_norm()
+    prox = _prox_operator(prox, b.shape, ndims, b.dtype)
+    step = 1.0/L
+    
+    if x0 is None:
+        x = numpy.zeros_like(b)
+    else:
+        x = numpy.array(x0, dtype = b.dtype).reshape(b.shape)
+    z = x.copy()
+    v = numpy.empty_like(b)
+    x_old = numpy.empty_like(b)
+    t = 1.0
+    for pp in range(0, maxiter):
+        # v = z - step*(A^H A z - b)
+        g = AHA(z)
+        g -= b
+        g *= step
+        numpy.subtract(z, g, out = v)
+        del g
+        
+        x_new = prox(v, step*lamb)
+        if x_new is v: # the buffer of the previous x_old is free
+            v = x_old
+        x_old, x = x, x_new
+        
+        # z = x + (t - 1)/t_new*(x - x_old)
+        t_new = (1 + numpy.sqrt(1 + 4*t*t))/2
+        numpy.subtract(x, x_old, out = z)
+        z *= (t - 1)/t_new
+        z += x
+        t = t_new
+        if monitor is not None and monitor.active:
+            xnorm = numpy.linalg.norm(x)
+            if monitor.update(x, numpy.linalg.norm(x - x_old)/xnorm if xnorm > 0 else 1.0):
+                break
+    return x, L
+
+def _cg_shifted(AHA, rho, b, x, maxiter):
+    """
+    Private: a few conjugate gradient iterations of (A^H A + rho I) x = b, starting from x, which is updated in place. 
+    """
+    r = b - AHA(x)
+    r -= rho*x
+    p = r.copy()
+    rr = numpy.real(numpy.vdot(r, r))
+    for pp in range(0, maxiter):
+        if rr == 0:
+            break
+        Ap = AHA(p)
+        Ap += rho*p
+        alpha = rr/numpy.real(numpy.vdot(p, Ap))
+        x += alpha*p
+        r -= alpha*Ap
+        rr_new = numpy.real(numpy.vdot(r, r))
+        p *= rr_new/rr
+        p += r
+        rr = rr_new
+    return x
+
+def admm(nufft, y, maxiter = 30, lamb = 0.0, prox = 'l1', rho = None, cg_maxiter = 3, L = None, toeplitz = False, x0 = None, monitor = None):
+    """
+    Alternating direction method of multipliers, 
+    minimizing ||A x - y||_2^2/2 + lamb*g(z) subject to x = z, where g is given by its proximal operator: 
+    
+    x = (A^H A + rho I)^-1 (A^H y + rho*(z - u)), z = prox(x + u, lamb/rho), u = u + x - z
+    
+    The x-update runs cg_maxiter conjugate gradient iterations, which are warm started by the previous x. 
+    The residual of the monitor is the relative change of z. 
+    
+    :param nufft: NUFFT_cpu object
+    :param y: (M,) or (M, batch) array, non-uniform data
+    :param maxiter: the maximum number of iterations
+    :param lamb: the weight of the regularization
+    :param prox: 'l1', 'l2', 'tv' (along the Nd axes), None or a function prox(x, threshold), see _prox_operator()
+    :param rho: (Optional) the penalty parameter. The default is L/10, where L = ||A^H A||.
+    :param cg_maxiter: the number of the conjugate gradient iterations of the x-update
+    :param L: (Optional) ||A^H A||, which sets the default rho. The default is nufft.operator_norm(), which is cached per plan.
+    :param toeplitz: if True, A^H A is computed by the FFTs of the doubled image size, see pcg()
+    :param x0: (Optional) the initial image
+    :param monitor: (Private) the iteration monitor of solve()
+    :return: z, L
+    """
+    AHA = _normal_operator(nufft, toeplitz)
+    b = nufft.adjoint(y)
+    ndims = len(nufft.st['Nd'])
+    if rho is None:
+        if L is None:
+            L = nufft.operator_norm()
+        rho = 0.1*L
+    prox = _prox_operator(prox, b.shape, ndims, b.dtype)
+    
+    if x0 is None:
+        x = numpy.zeros_like(b)
+    else:
+        x = numpy.array(x0, dtype = b.dtype).reshape(b.shape)
+    z = x.copy()
+    u = numpy.zeros_like(b)
+    rhs = numpy.empty_like(b)
+    w = numpy.empty_like(b)
+    for pp in range(0, maxiter):
+        # rhs = b + rho*(z - u)
+        numpy.subtract(z, u, out = rhs)
+        rhs *= rho
+        rhs += b
+        x = _cg_shifted(AHA, rho, rhs, x, cg_maxiter)
+        
+        z_old = z
+        numpy.add(x, u, out = w)
+        z = prox(w, lamb/rho)
+        w = z_old if z is w else w # reuse the buffer of the previous z
+        
+        u += x
+        u -= z
+        if monitor is not None and monitor.active:
+            znorm = numpy.linalg.norm(z)
+            if monitor.update(z, numpy.linalg.norm(z - z_old)/znorm if znorm > 0 else 1.0):
+                break
+    return z, L
+
+def pcg(nufft, y, maxiter = 100, toeplitz = False, precond = None, x0 = None, monitor = None):
+    """
+    (Preconditioned) conjugate gradient method in the image domain, solving A^H A x = A^H y. 
+    
+    The unknowns are the Nd (or Nd + (batch, )) image, instead of the Kd grid of the 'cg' solver. 
+    In batch mode, the channels are independent systems which share the batched forward() and adjoint() (or the Toeplitz FFTs), 
+    and alpha and beta are vectors of length batch. With tol, each channel is frozen once its own residual is below tol. 
+    
+    :param nufft: NUFFT_cpu object
+    :param y: (M,) or (M, batch) array, non-uniform data
+    :param maxiter: the maximum number of iterations
+    :param toeplitz: if True, A^H A is computed by the FFTs of the doubled image size, instead of forward() and adjoint()
+    :param precond: None or 'circulant' (T. Chan's optimal circulant preconditioner of A^H A)
+    :param x0: (Optional) the initial image
+    :param monitor: (Private) the iteration monitor of solve(), whose residual is norm(A^H A x - A^H y)/norm(A^H y) 
+                    (the maximum of the active channels)
+    :type maxiter: int
+    :type toeplitz: boolean
+    :type precond: None or string
+    :return: x: image
+    """
+    if monitor is None:
+        monitor = _Monitor()
+    Nd = tuple(nufft.st['Nd'])
+    ndims = len(Nd)
+    axes = tuple(range(0, ndims))
+    
+    if precond not in (None, 'circulant'):
+        raise ValueError('precond must be None or \'circulant\'')
+    if precond is not None:
+        c = _cached_kernel(nufft, 'toeplitz', _toeplitz_kernel)
+    
+    b = nufft.adjoint(y)
+    tail = (1, )*(numpy.ndim(b) - ndims) # broadcast over the batch
+    AHA = _normal_operator(nufft, toeplitz)
+    
+    if precond == 'circulant':
+        lam = numpy.real(numpy.fft.fftn(_circulant_preconditioner(c, Nd)))/nufft.Kdprod
+        lam = numpy.reshape(numpy.maximum(lam, 1e-6*numpy.max(lam)), Nd + tail)
+        def M(r):
+            return numpy.fft.ifftn(numpy.fft.fftn(r, axes = axes)/lam, axes = axes).astype(r.dtype)
+    else:
+        def M(r):
+            return r
+    
+    if x0 is None:
+        x = numpy.zeros_like(b)
+        r = b.copy()
+    else:
+        x = numpy.array(x0, dtype = b.dtype).reshape(b.shape)
+        r = b - AHA(x)
+    def dot(u, v): # per channel
+        return numpy.sum(numpy.conj(u)*v, axis = axes)
+    def divide(u, v): # u/v, and 0 where v = 0
+        return numpy.where(v != 0, u/numpy.where(v != 0, v, 1), 0)
+    
+    bnorm = numpy.sqrt(numpy.real(dot(b, b)))
+    active = bnorm > 0
+    if numpy.any(active):
+        z = M(r)
+        p = z.copy()
+        rz = dot(r, z)
+        for pp in range(0, maxiter):
+            Ap = AHA(p)
+            alpha = numpy.where(active, divide(rz, dot(p, Ap)), 0)
+            x += alpha*p
+            r -= alpha*Ap
+            residuals = divide(numpy.sqrt(numpy.real(dot(r, r))), bnorm)
+            if monitor.update(x, numpy.max(numpy.where(active, residuals, 0))):
+                break
+            if monitor.tol is not None: # freeze the converged channels
+                active = active & (residuals >= monitor.tol)
+            z = M(r)
+            rz_new = dot(r, z)
+            p = z + divide(rz_new, rz)*p
+            rz = rz_new
+    return x
 
-        E = nufft.forward(nufft.adjoint(W))
-        W = (W/E)
-   
-    return W
- 
 def solve(nufft,   y,  solver=None, *args, **kwargs):
         """
         Solve NUFFT.
-        The current version supports solvers = 'cg' or 'L1TVOLS' or 'L1TVLAD'.
+        The current version supports solvers = 'cg' or 'L1TVOLS' or 'L1TVLAD' or 'pcg' (image domain), 
+        and the proximal solvers 'fista' and 'admm', see fista() and admm().
         
+        All the solvers accept the following keywords: 
+        
+        :param tol: (Optional) the relative residual to exit. The default None runs maxiter iterations. 
+                    The residual is norm(b - Ax)/norm(b) for the Krylov solvers, 
+                    the relative change of the image for 'L1TVOLS', 'fista' and 'admm', and the rms of |P P^H W - 1| for 'dc'. 
+        :param callback: (Optional) callback(niter, x, residual), called after each iteration. 
+                    Returning True exits the solver. x is the current image (Nd or Nd + (batch, )) for every solver except 'dc', 
+                    whose x is the current density compensation weights. The solvers on the Kd grid convert the iterate to the image 
+                    only if a callback is set. lsqr and lsmr do not expose the iterates, 
+                    so their callback receives x = None and residual = None, and cannot exit early. 
+        :param full_output: (Optional) if True, return a SolveResult instead of the image. 
+                    For the scipy solvers (cg, bicg, bicgstab, gmres, lgmres), recording the residuals costs one extra A^H A per iteration. 
+        :param x0: (Optional) the initial image, e.g. the solution of the previous frame. 
+                    The solvers on the Kd grid start from xx2k(x2xx(x0)). 'dc' is not iterative in the image and ignores x0. 
+        :param state: (Optional, 'L1TVOLS') the dictionary of the split-Bregman state, which warm starts L1TVOLS, see L1TVOLS()
+        :param per_channel: (Optional) if True, solve the channels of a batch plan as independent single-coil problems 
+                    in a pool of workers, instead of one stacked system of size Kdprod*batch. 
+                    Each channel exits on its own tol. See _solve_channels(). 
+                    Alternatively, 'pcg' solves the channels with one batched operator and per-channel alpha and beta. 
+        :param workers: (Optional, per_channel) the number of workers. The default is chosen by concurrent.futures.
+        :param pool: (Optional, per_channel) 'thread' (default) or 'process'
         :param nufft: NUFFT_cpu object
         :param y: (M,) array, non-uniform data
-        :return: x: image
+        :return: x: image, or SolveResult if full_output is True
             
+        """
+        if kwargs.pop('per_channel', False):
+            workers = kwargs.pop('workers', None)
+            pool = kwargs.pop('pool', 'thread')
+            return _solve_channels(nufft, y, solver, args, kwargs, workers, pool)
+        full_output = kwargs.pop('full_output', False)
+        monitor = _Monitor(kwargs.pop('tol', None), kwargs.pop('callback', None), full_output)
+        x0 = kwargs.pop('x0', None)
+        x, info = _solve(nufft, y, solver, monitor, x0, *args, **kwargs)
+        if full_output:
+            return monitor.result(x, solver, info)
+        return x
+
+def _solve_channels(nufft, y, solver, args, kwargs, workers = None, pool = 'thread'):
+    """
+    Private: the independent per-channel solves of solve(..., per_channel = True)
+    
+    Each channel of the (M, batch) data is solved by solve() with the single-coil view of the plan (NUFFT_cpu._single_channel()), 
+    so a slowly converging channel does not hold back the others. 
+    The threads share the plan in memory. 
+    The processes attach the plan exported by nufft.share(), which is released when the solves are finished, 
+    and the keywords (including callback) must be picklable. 
+    
+    :param nufft: NUFFT_cpu object planned with batch
+    :param y: (M, batch) array, non-uniform data
+    :param solver: the solver of each channel
+    :param args: the positional arguments of the solver
+    :param kwargs: the keywords of solve(). x0 is split along the batch axis. 
+    :param workers: the number of workers
+    :param pool: 'thread' or 'process'
+    :return: x: Nd + (batch, ) image, or SolveResult if full_output is True, 
+             whose niter, residuals and times are those of the slowest channel, 
+             and info['channels'] is the list of the SolveResults of the channels
+    """
+    import concurrent.futures
+    if nufft.parallel_flag != 1:
+        raise ValueError('per_channel = True requires a plan with batch')
+    if 'state' in kwargs:
+        raise ValueError('per_channel = True does not support state')
+    channel_nufft = nufft._single_channel() # one view, so the channels share the kernels of the solver
+    full_output = kwargs.get('full_output', False)
+    y = numpy.reshape(y, nufft.multi_M)
+    x0 = kwargs.pop('x0', None)
+    if x0 is not None:
+        x0 = numpy.reshape(x0, nufft.multi_Nd)
+    tasks = []
+    for bat in range(0, nufft.batch):
+        channel_kwargs = dict(kwargs)
+        if x0 is not None:
+            channel_kwargs['x0'] = x0[..., bat]
+        tasks += [(y[:, bat], channel_kwargs), ]
+    
+    t0 = time.time()
+    if 'thread' == pool:
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            futures = [executor.submit(solve, channel_nufft, y_bat, solver, *args, **channel_kwargs) 
+                       for y_bat, channel_kwargs in tasks]
+            results = [future.result() for future in futures]
+    elif 'process' == pool:
+        handle = nufft.share()
+        try:
+            with concurrent.futures.ProcessPoolExecutor(workers, initializer = _attach_channel_worker, 
+                                                        initargs = (type(nufft), handle)) as executor:
+                futures = [executor.submit(_solve_channel_worker, y_bat, solver, args, channel_kwargs) 
+                           for y_bat, channel_kwargs in tasks]
+                results = [future.result() for future in futures]
+        finally:
+            nufft.unshare()
+    else:
+        raise ValueError("pool must be 'thread' or 'process'")
+    
+    if full_output:
+        x = numpy.stack([result.x for result in results], axis = -1)
+        slowest = max(results, key = lambda result: result.niter)
+        return SolveResult(x, solver, slowest.niter, slowest.residuals, slowest.times, time.time() - t0, 
+                           {'channels': results})
+    return numpy.stack(results, axis = -1)
+
+_channel_nufft = None # the single-coil plan of a worker process
+
+def _attach_channel_worker(nufft_class, handle):
+    """
+    Private: the initializer of the worker processes of _solve_channels()
+    """
+    global _channel_nufft
+    nufft = nufft_class()
+    nufft.attach(handle)
+    _channel_nufft = nufft._single_channel()
+
+def _solve_channel_worker(y, solver, args, kwargs):
+    """
+    Private: solve one channel in a worker process of _solve_channels()
+    """
+    return solve(_channel_nufft, y, solver, *args, **kwargs)
+
+def _solve(nufft,   y,  solver, monitor, x0, *args, **kwargs):
+        """
+        Private: the solvers of solve()
+        
+        :return: x, info
         """
         if ('cgs' == solver) or ('qmr' ==solver) or ('minres'==solver):
             raise TypeError(solver +' requires real symmetric matrix')
@@ -203,25 +997,18 @@ def solve(nufft,   y,  solver=None, *args, **kwargs):
         if 'dc'   ==  solver:
             """
             Density compensation method
-            nufft.st['W'] will be computed if doesn't exist
-            If nufft.st['W'] exist then x2 = nufft.adjoint(nufft.st['W']*y)
+            The weights W are computed at the first call and cached in nufft.kernels, see _pipe_density()
+            x2 = nufft.adjoint(W*y)
             input: 
                 y: (M,) array
             output:
                 x2: Nd array
             """
-            print(solver)
-    #             try:
-    # 
-    #                 x = nufft.adjoint(nufft.st['W']*y)
-    # 
-    #             except: 
-    
-            W = _pipe_density( nufft, *args, **kwargs)
+            W = _pipe_density( nufft, *args, tol = monitor.tol, monitor = monitor, **kwargs)
     
             x = nufft.adjoint(W*y)
     
-            return x
+            return x, {}
         elif ('lsmr'==solver) or ('lsqr'==solver):
             """
             Assymetric matrix A
@@ -234,7 +1021,12 @@ def solve(nufft,   y,  solver=None, *args, **kwargs):
                 return nufft.k2y(k2).ravel()
             def spH(y):
                 y2 = y.reshape(nufft.multi_M, order='C')
+                if monitor.active:
+                    spH.ncalls += 1
+                    if spH.ncalls > 1: # one rmatvec per iteration, after the initial one
+                        monitor.update(None, None)
                 return nufft.y2k(y2).ravel()                
+            spH.ncalls = 0
 #                 return nufft.spH.dot(nufft.sp.dot(x))
 #                 print('shape', (nufft.st['M']*nufft.batch, nufft.Kdprod*nufft.batch))
 #                 print('spH ')
@@ -242,14 +1034,34 @@ def solve(nufft,   y,  solver=None, *args, **kwargs):
             
             methods={'lsqr':scipy.sparse.linalg.lsqr,
                                 'lsmr':scipy.sparse.linalg.lsmr,}
+            if monitor.tol is not None:
+                kwargs.setdefault('atol', monitor.tol)
+                kwargs.setdefault('btol', monitor.tol)
+            if x0 is not None:
+                kwargs['x0'] = nufft.xx2k(nufft.x2xx(x0)).ravel()
             k2 = methods[solver](A,  y.flatten(), *args, **kwargs)#,show=True)
-
+            
+            if 'lsqr' == solver:
+                names = ('istop', 'itn', 'r1norm', 'r2norm', 'anorm', 'acond', 'arnorm', 'xnorm')
+            else:
+                names = ('istop', 'itn', 'normr', 'normar', 'norma', 'conda', 'normx')
+            info = dict(zip(names, k2[1:]))
+            if monitor.active and len(monitor.residuals) > 0: # the final relative residual
+                monitor.residuals[-1] = k2[3]/numpy.linalg.norm(y) # r1norm or normr
  
             xx = nufft.k2xx(nufft.vec2k(k2[0]))
             x= xx/nufft.sn
-            return x#, k2[1:]        
+            return x, info
         elif 'L1TVOLS' == solver:
-            return  L1TVOLS(nufft, y, *args, **kwargs)
+            return  L1TVOLS(nufft, y, *args, x0 = x0, monitor = monitor, **kwargs), {}
+        elif 'pcg' == solver:
+            return pcg(nufft, y, *args, x0 = x0, monitor = monitor, **kwargs), {}
+        elif 'fista' == solver:
+            x, L = fista(nufft, y, *args, x0 = x0, monitor = monitor, **kwargs)
+            return x, {'L': L}
+        elif 'admm' == solver:
+            x, L = admm(nufft, y, *args, x0 = x0, monitor = monitor, **kwargs)
+            return x, {'L': L}
 #         elif 'L1TVLAD' == solver:
 #             return  L1TVLAD(nufft, y, *args, **kwargs)
         else:
@@ -279,9 +1091,34 @@ def solve(nufft,   y,  solver=None, *args, **kwargs):
     #                                  'minres':scipy.sparse.linalg.minres, 
     #                                  'qmr':scipy.sparse.linalg.qmr, 
                                  }
-            k2 = methods[solver](A,  nufft.y2k(y).ravel(), *args, **kwargs)#,show=True)
-    
+            b = nufft.y2k(y).ravel()
+            if monitor.tol is not None:
+                kwargs.setdefault(_scipy_tol_name(methods[solver]), monitor.tol)
+            if x0 is not None:
+                kwargs['x0'] = nufft.xx2k(nufft.x2xx(x0)).ravel()
+            if monitor.active:
+                bnorm = numpy.linalg.norm(b)
+                def callback(xk):
+                    if monitor.track and bnorm > 0:
+                        residual = numpy.linalg.norm(b - spHsp(xk))/bnorm
+                    else:
+                        residual = None
+                    if monitor.callback is not None: # the callback receives the image, not the Kd grid
+                        image = nufft.k2xx(xk.reshape(nufft.multi_Kd))/nufft.sn
+                    else:
+                        image = xk
+                    if monitor.update(image, residual):
+                        raise _StopSolver(xk.copy())
+                kwargs['callback'] = callback
+                if 'gmres' == solver:
+                    kwargs.setdefault('callback_type', 'x')
+            try:
+                k2 = methods[solver](A,  b, *args, **kwargs)#,show=True)
+                info = {'info': k2[1]}
+            except _StopSolver as e:
+                k2 = (e.x, )
+                info = {'info': 0}
     
             xx = nufft.k2xx(k2[0].reshape(nufft.multi_Kd))
             x= xx/nufft.sn
-            return x#     , k2[1:]       
+            return x, info
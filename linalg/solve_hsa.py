@@ -12,6 +12,7 @@ dtype = numpy.complex64
 import scipy
 import numpy
 from ..src._helper import helper
+from .solve_cpu import SolveResult, _Monitor, _cached_kernel
 
 def cDiff(x, d_indx):
         """
@@ -71,9 +72,14 @@ def _create_kspace_sampling_density(nufft):
 #         x2 = nufft.adjoint(gy)
 #         return x2
     
-def L1TVLAD(nufft, gy, maxiter, rho): # main function of solver
+def L1TVLAD(nufft, gy, maxiter, rho, x0 = None, state = None, monitor = None): # main function of solver
     """
     (testing) L1-total variation regularized least absolute deviation 
+    
+    The residual of the monitor is the relative change of the image. 
+    
+    :param x0: (Optional) the initial image, see L1TVOLS()
+    :param state: (Optional) the dictionary of the split-Bregman state ('AHyk', 'bb', 'dd', 'bf', 'df'), see L1TVOLS()
     """
     mu = 1.0
     LMBD = rho*mu
@@ -85,13 +91,15 @@ def L1TVLAD(nufft, gy, maxiter, rho): # main function of solver
         x2 = nufft.adjoint(gy)
         return x2
     
-    uker_cpu = mu*_create_kspace_sampling_density(nufft)   - LMBD* helper.create_laplacian_kernel(nufft) # on cpu
+    uker_cpu = mu*_cached_kernel(nufft, 'density', _create_kspace_sampling_density) - LMBD*_cached_kernel(nufft, 'laplacian', helper.create_laplacian_kernel) # on cpu
     uker = nufft.thr.to_device(uker_cpu.astype(numpy.complex64))
     AHy = AH(gy) # on  device?
     z = numpy.zeros(nufft.st['Nd'],dtype = numpy.complex64,order='C')
     z_gpu = nufft.thr.to_device(z)
     xkp1 = nufft.thr.copy_array(z_gpu)
     AHyk = nufft.thr.copy_array(z_gpu)
+    if x0 is not None:
+        xkp1 = _to_device(nufft, x0)
            
 #         self._allo_split_variables()        
     zz= []
@@ -117,6 +125,12 @@ def L1TVLAD(nufft, gy, maxiter, rho): # main function of solver
     zf = nufft.thr.copy_array(z_gpu)
     bf = nufft.thr.copy_array(z_gpu)
     df = nufft.thr.copy_array(z_gpu)
+    if state: # continue from the previous state
+        AHyk = nufft.thr.copy_array(state['AHyk'])
+        bb = [nufft.thr.copy_array(b) for b in state['bb']]
+        dd = [nufft.thr.copy_array(d) for d in state['dd']]
+        bf = nufft.thr.copy_array(state['bf'])
+        df = nufft.thr.copy_array(state['df'])
 
     n_dims = len(nufft.st['Nd'])#numpy.size(uf.shape)
     
@@ -125,6 +139,7 @@ def L1TVLAD(nufft, gy, maxiter, rho): # main function of solver
     
     for outer in numpy.arange(0, maxiter):
 #             for inner in numpy.arange(0,nInner):
+        xk = xkp1
             
         # solve Ku = rhs
 #                 rhs = (mu*(AHyk + df - bf) +  # right hand side
@@ -266,418 +281,634 @@ def L1TVLAD(nufft, gy, maxiter, rho): # main function of solver
 #         print(outer)
         
         AHyk -= zf # Linearized Bregman iteration f^k+1 = f^k + f - Au
+        if monitor is not None and monitor.active:
+            if monitor.update(xkp1, _relative_change(xkp1, xk)):
+                break
         
+    if state is not None:
+        state.update({'AHyk': AHyk, 'bb': bb, 'dd': dd, 'bf': bf, 'df': df})
 #     print(xkp1.get())
 #             print(outer)
 #     print('here')
 #     nufft.x_Nd = nufft.thr.copy_array(xkp1)
     return xkp1
-def L1TVOLS(nufft, gy, maxiter, rho  ): # main function of solver
+def L1TVOLS(nufft, gy, maxiter, rho, x0 = None, state = None, monitor = None): # main function of solver
     """
     L1-total variation regularized ordinary least square 
+    
+    The split variables dd and bb of all the dimensions are stacked along the first axis, 
+    so that each iteration launches the fused kernels cTVRhs and cTVShrink 
+    instead of a chain of small elementwise kernels. 
+    The residual of the monitor is the relative change of the image, which is fetched from the device only if the monitor is active. 
+    The intermediate arrays of the iterations are allocated once per solve and passed through out. 
+    
+    :param x0: (Optional) the initial image (numpy or device array). Without state, x0 seeds the split-Bregman iterations 
+               with dd = Diff(x0), bb = 0 and AHyk = the density-weighted x0, the same as solve_cpu.L1TVOLS(). 
+    :param state: (Optional) a dictionary of the split-Bregman state ('AHyk', 'bb', 'dd') on the device, 
+                  which initializes the iterations if it is not empty (x0 is then only the reference of the first relative change), 
+                  and is updated in place at the exit. 
+                  Passing the same dictionary for consecutive frames continues the iterations of the previous frame. 
     """
     mu = 1.0
     LMBD = rho*mu
 
-    def AHA(x):
-        x2 = nufft.selfadjoint(x)
+    def AHA(x, out):
+        x2 = nufft.selfadjoint(x, out = out)
         return x2
     def AH(gy):
         x2 = nufft.adjoint(gy)
         return x2
     
-    uker_cpu = mu*_create_kspace_sampling_density(nufft)   - LMBD* helper.create_laplacian_kernel(nufft) # on cpu
+    density = _cached_kernel(nufft, 'density', _create_kspace_sampling_density)
+    uker_cpu = mu*density - LMBD*_cached_kernel(nufft, 'laplacian', helper.create_laplacian_kernel) # on cpu
     uker = nufft.thr.to_device(uker_cpu.astype(numpy.complex64))
     AHy = AH(gy) # on  device?
-    z = numpy.zeros(nufft.st['Nd'],dtype = numpy.complex64,order='C')
-    z_gpu = nufft.thr.to_device(z)
-    xkp1 = nufft.thr.copy_array(z_gpu)
-    AHyk = nufft.thr.copy_array(z_gpu)
-           
-#         self._allo_split_variables()        
-    zz= []
-    bb = []
-    dd = []
+    AHyk = nufft.thr.array(nufft.st['Nd'], dtype = numpy.complex64).fill(0)
+    rhs = nufft.thr.array(nufft.st['Nd'], dtype = numpy.complex64)
+    
     d_indx, dt_indx = helper.indxmap_diff(nufft.st['Nd'])
     ndims = len(nufft.st['Nd'])
-    s_tmp = []
-    for pp in range(0, ndims):
-        s_tmp += [0, ]
-    for jj in range(    0,  ndims): # n_dims + 1 for wavelets
-        d_indx[jj] = nufft.thr.to_device(d_indx[jj])
-        dt_indx[jj] = nufft.thr.to_device(dt_indx[jj])
-#     z=numpy.zeros(nufft.st['Nd'], dtype = nufft.dtype, order='C')
-    
-#     ndims = len(nufft.st['Nd'])
+    d_indx = nufft.thr.to_device(numpy.stack(d_indx)) # (ndims, Ndprod)
+    dt_indx = nufft.thr.to_device(numpy.stack(dt_indx))
     
-    for jj in range(    0,  ndims): # n_dims + 1 for wavelets
-        
-        zz += [nufft.thr.copy_array(z_gpu),]
-        bb += [nufft.thr.copy_array(z_gpu),]
-        dd +=  [nufft.thr.copy_array(z_gpu),]
-#     zf = nufft.thr.copy_array(z_gpu)
-#     bf = nufft.thr.copy_array(z_gpu)
-#     df = nufft.thr.copy_array(z_gpu)
-
-    n_dims = len(nufft.st['Nd'])#numpy.size(uf.shape)
-    
-    tmp_gpu = nufft.thr.copy_array(z_gpu) 
+    bb = nufft.thr.array((ndims, ) + nufft.st['Nd'], dtype = numpy.complex64).fill(0)
+    dd = nufft.thr.array((ndims, ) + nufft.st['Nd'], dtype = numpy.complex64).fill(0)
     
+    threshold_value = numpy.float32(1/LMBD)
     
+    # the work arrays of the iterations; xk and xkp1 are swapped in each iteration
+    k = nufft.thr.array(nufft.multi_Kd, dtype = numpy.complex64)
+    zf = nufft.thr.array(nufft.st['Nd'], dtype = numpy.complex64)
+    xk = nufft.thr.array(nufft.st['Nd'], dtype = numpy.complex64)
+    xkp1 = nufft.thr.array(nufft.st['Nd'], dtype = numpy.complex64).fill(0)
+    if x0 is not None:
+        xkp1 = _to_device(nufft, x0)
+    if state: # continue from the previous state
+        AHyk = nufft.thr.copy_array(state['AHyk'])
+        bb = nufft.thr.copy_array(state['bb'])
+        dd = nufft.thr.copy_array(state['dd'])
+    elif x0 is not None: # seed the split variables with x0, so that rhs = K x0
+        nufft.xx2k(xkp1, out = k)
+        k *= nufft.thr.to_device(density.astype(numpy.complex64))
+        nufft.k2xx(k, out = AHyk)
+        x0_cpu = xkp1.get()
+        dd.set(numpy.stack([numpy.roll(x0_cpu, 1, axis = pp) - x0_cpu for pp in range(0, ndims)]).astype(numpy.complex64)) # Diff(x0)[i] = x0[i - 1] - x0[i]
     for outer in numpy.arange(0, maxiter):
-#             for inner in numpy.arange(0,nInner):
+        xk, xkp1 = xkp1, xk
             
         # solve Ku = rhs
-#                 rhs = (mu*(AHyk + df - bf) +  # right hand side
-#                 LMBD*(cDiff(dd[0] - bb[0],  dt_indx[0])) + 
-#                 LMBD*(cDiff(dd[1] - bb[1],  dt_indx[1]))  )      
-        rhs = nufft.thr.copy_array(AHyk)
-        
-#         rhs += df
-#         
-#         rhs -= bf
-        
-#         rhs *= mu
-        nufft.prg.cMultiplyScalar( dtype(mu), rhs, local_size=None, global_size=int(nufft.Ndprod))
-        
-#         print(rhs.get())
-        for pp in range(0, ndims): 
-            in_cDiff = nufft.thr.copy_array(dd[pp])
-            
-            in_cDiff -= bb[pp]
-            
-    #         out_cDiff = nufft.thr.empty_like(in_cDiff) 
-            nufft.prg.cDiff(dt_indx[pp], in_cDiff, tmp_gpu, local_size=None, global_size=int(nufft.Ndprod))
-            
-    #         tmp_gpu *= LMBD
-            nufft.prg.cMultiplyScalar( dtype(LMBD), tmp_gpu, local_size=None, global_size=int(nufft.Ndprod))
-            
-            rhs += tmp_gpu
-        
-#         print(rhs.get())
-#         in_cDiff = nufft.thr.copy_array(dd[1])
-#         
-#         in_cDiff -= bb[1]
-#         
-# #         out_cDiff = nufft.thr.empty_like(in_cDiff) 
-#         nufft.prg.cDiff(dt_indx[1], in_cDiff, tmp_gpu, local_size=None, global_size=int(nufft.Ndprod))
-#         
-# #         tmp_gpu *= LMBD
-#         nufft.prg.cMultiplyScalar( dtype(LMBD), tmp_gpu, local_size=None, global_size=int(nufft.Ndprod))
-#         
-#         rhs += tmp_gpu
-        
-#         print(rhs.get())
+        # rhs = mu*AHyk + LMBD*sum(Diff_t(dd[pp] - bb[pp]))
+        nufft.prg.cTVRhs(numpy.uint32(ndims), numpy.uint32(nufft.Ndprod), numpy.float32(mu), numpy.float32(LMBD), 
+                         dt_indx, AHyk, dd, bb, rhs, local_size=None, global_size=int(nufft.Ndprod))
     
         # Note K = F' uker F
         # so K-1 ~ F
-#         xkp1 = nufft.k2xx(nufft.xx2k(rhs) / uker) 
-        xx = nufft.thr.copy_array(rhs)
-        
-        k = nufft.xx2k(xx)
+        nufft.xx2k(rhs, out = k)
         
         k /= uker
         
-#         nufft.k_Kd2 = nufft.thr.copy_array(nufft.k_Kd)
-        xkp1 = nufft.k2xx(k)
-#         xkp1 = nufft.thr.copy_array(nufft.x_Nd)
-#         print(xkp1.get())
-#                 self._update_d(xkp1)
-
+        nufft.k2xx(k, out = xkp1)
 
-#         zz[0] = cDiff(xkp1,  d_indx[0])
-#         zz[1] = cDiff(xkp1,  d_indx[1])
-        for pp in range(0, ndims):
-            nufft.prg.cDiff(d_indx[pp],  xkp1, zz[pp],  local_size=None, global_size=int(nufft.Ndprod)) 
-#         nufft.prg.cDiff(d_indx[0],  xkp1, zz[0],  local_size=None, global_size=int(nufft.Ndprod))
-#         nufft.prg.cDiff(d_indx[1],  xkp1, zz[1],  local_size=None, global_size=int(nufft.Ndprod))
-        
-
-#         zf = AHA(xkp1)  -AHy
-        zf = AHA(xkp1)
+        AHA(xkp1, zf)
         
         zf -= AHy 
-        
 
-        '''
-        soft-thresholding the edges
-        '''
-        for pp in range(0, ndims):
-            s_tmp[pp] = zz[pp] + bb[pp]
-#         s1 = zz[0] + bb[0]
-#         
-#         s2 = zz[1] + bb[1]
-        
-#         s = s1**2 + s2**2
-#         s1 *= s1
-#             nufft.prg.cMultiplyConjVec(s_tmp[pp], s_tmp[pp], tmp_gpu, local_size=None, global_size=int(nufft.Ndprod))
-        for pp in range(0, ndims):
-            if pp > 0:
-#                 s += tmp_gpu
-                nufft.prg.cHypot(s, s_tmp[pp], local_size=None, global_size=int(nufft.Ndprod))
-#                 nufft.thr.synchronize()
-            else: # pp == 0
-                s = nufft.thr.copy_array(s_tmp[pp])
-#         nufft.prg.cMultiplyConjVec(s1, s1, tmp_gpu, local_size=None, global_size=int(nufft.Ndprod))
-#         s = nufft.thr.copy_array(tmp_gpu)
-# #         s2 *= s2
-#         nufft.prg.cMultiplyConjVec(s2, s2, tmp_gpu, local_size=None, global_size=int(nufft.Ndprod))
-#         s += tmp_gpu
-        
-#         s = s1 + s2
-        
-        
-#         nufft.prg.cSqrt(s, local_size=None, global_size=int(nufft.Ndprod))
-        
-        s += 1e-6
-        
-        threshold_value = dtype(1/LMBD)
-#         r =(s > threshold_value)*(s-threshold_value)/s#numpy.maximum(s - threshold_value ,  0.0)/s
-        nufft.prg.cAnisoShrink(threshold_value, s, tmp_gpu, local_size=None, global_size=int(nufft.Ndprod))
-        tmp_gpu /=s
-        
-#         dd[0] = s1*r
-#         dd[1] = s2*r
-#         dd[0] = s1*tmp_gpu
-        for pp in range(0, ndims):
-            nufft.prg.cMultiplyVec(s_tmp[pp], tmp_gpu, dd[pp], local_size=None, global_size=int(nufft.Ndprod)) 
-#         nufft.prg.cMultiplyVec(s1, tmp_gpu, dd[0], local_size=None, global_size=int(nufft.Ndprod)) 
-        
-#         dd[1] = s2*tmp_gpu
-        
-#         nufft.prg.cMultiplyVec(s2, tmp_gpu, dd[1], local_size=None, global_size=int(nufft.Ndprod))
-        
-#         tmp_gpu = zf+bf
-        
-#         threshold_value=dtype(1.0/mu)
-        
-#         df.real =0.0+ (df.real>threshold_value)*(df.real - threshold_value) +(df.real<= - threshold_value)*(df.real+threshold_value)
-#         df.imag = 0.0+(df.imag>threshold_value)*(df.imag - threshold_value) +(df.imag<= - threshold_value)*(df.imag+threshold_value)
-    
-#         nufft.prg.cAnisoShrink(threshold_value,  tmp_gpu, df, local_size=None, global_size=int(nufft.Ndprod))
-        
-         
-#                 df =     sy
-        # end of shrinkage
-        for pp in range(0, ndims):
-            bb[pp] += zz[pp] - dd[pp]
-#         bb[0] += zz[0] - dd[0] 
-#         bb[1] += zz[1] - dd[1] 
-#         bf += zf - df 
-#                 self._update_b() # update b based on the current u
-#         print(outer)
+        # soft-thresholding the edges Diff(xkp1) + bb, and the Bregman update of bb
+        nufft.prg.cTVShrink(numpy.uint32(ndims), numpy.uint32(nufft.Ndprod), threshold_value, 
+                            d_indx, xkp1, bb, dd, local_size=None, global_size=int(nufft.Ndprod))
         
         AHyk -= zf # Linearized Bregman iteration f^k+1 = f^k + f - Au
+        if monitor is not None and monitor.active:
+            if monitor.update(xkp1, _relative_change(xkp1, xk)):
+                break
+    
+    if state is not None:
+        state.update({'AHyk': AHyk, 'bb': bb, 'dd': dd})
         
-#     print(xkp1.get())
-#             print(outer)
-#     print('here')
-#     nufft.x_Nd = nufft.thr.copy_array(xkp1)
     return xkp1
 
-def _pipe_density(nufft,maxiter):
+def _to_device(nufft, x):
     """
-    Private: create the density function in the data space by a iterative solution
-    James Pipe et al. 1999
+    Private: a copy of the numpy or device array on the device
     """
+    if isinstance(x, numpy.ndarray):
+        return nufft.thr.to_device(numpy.ascontiguousarray(x, dtype = numpy.complex64))
+    return nufft.thr.copy_array(x)
 
+def _relative_change(x, xk):
+    """
+    Private: norm(x - xk)/norm(x) of two device arrays
+    
+    The zero image of the first iteration (AHyk = 0) returns 1.0, so that the solver is not stopped by tol. 
+    """
+    x = x.get()
+    xnorm = numpy.linalg.norm(x)
+    if xnorm > 0:
+        return numpy.linalg.norm(x - xk.get())/xnorm
+    return 1.0
 
-    try:
-        if maxiter < nufft.last_iter:
-         
-            W = nufft.st['W']
-        else: #maxiter > nufft.last_iter
-            W = nufft.st['W']
-            for pp in range(0,maxiter - nufft.last_iter):
+def _pipe_density(nufft, maxiter, tol = None, monitor = None):
+    """
+    Private: the density compensation weights W by the iterations of Pipe and Menon (1999), W = W / (P P^H W). 
+    
+    The same as solve_cpu._pipe_density(), on the device: P is the interpolator alone (k2y() and y2k()), without the FFTs. 
+    The rms of |P P^H W - 1| is fetched from the device only if tol is given or the monitor is active. 
+    The weights are cached on the device in nufft.kernels['pipe_density'] = {'W', 'niter', 'residual'}. 
+    The iterations update a copy of the cached weights in place, with the work arrays allocated once per call. 
+    
+    :param nufft: NUFFT_hsa object
+    :param maxiter: the maximum number of iterations since the plan
+    :param tol: (Optional) the rms of |P P^H W - 1| to exit
+    :param monitor: (Optional) _Monitor, which records the iterations run by this call
+    :return: W: the weights, shape = multi_M
+    :rtype: reikna array
+    """
+    kernels = getattr(nufft, 'kernels', None)
+    if kernels is None:
+        kernels = {}
+    cache = kernels.get('pipe_density', None)
+    if cache is not None:
+        if cache['niter'] >= maxiter or (tol is not None and cache['residual'] < tol):
+            return cache['W']
+        W = nufft.thr.copy_array(cache['W']) # the returned weights are not modified
+        niter = cache['niter']
+    else:
+        W = nufft.thr.to_device(numpy.ones(nufft.multi_M, dtype = nufft.dtype))
+        niter = 0
+    
+    track = tol is not None or (monitor is not None and monitor.active)
+    residual = numpy.inf
+    k = nufft.thr.array(nufft.multi_Kd, dtype = nufft.dtype)
+    E = nufft.thr.array(nufft.multi_M, dtype = nufft.dtype)
+    for pp in range(niter, maxiter):
+        nufft.y2k(W, out = k)
+        nufft.k2y(k, out = E) # P P^H W
+        if track:
+            residual = numpy.sqrt(numpy.mean(abs(E.get() - 1)**2))
+            if tol is not None and residual < tol:
+                break
+        W /= E
+        niter += 1
+        if monitor is not None and monitor.active:
+            if monitor.update(W, residual):
+                break
+    
+    scale = numpy.mean(numpy.real(nufft.forward(nufft.adjoint(W)).get()))
+    W *= nufft.dtype(1.0/scale)
+    kernels['pipe_density'] = {'W': W, 'niter': niter, 'residual': float(residual)}
+    return W  
 
-#             E = nufft.st['p'].dot(V1.dot(W))
-                E = nufft.forward(nufft.adjoint(W))
-                W = (W/E)             
-            nufft.last_iter = maxiter   
+def _k2image(nufft, k):
+    """
+    Private: the image of the Kd grid k, by the inverse FFT, the cropping and the division by the scaling factor. 
+    The inverse FFT overwrites k. 
+    """
+    # inverse FFT: k_Kd2 -> x_Nd
+    x2 = nufft.k2xx(k)
+    
+    # rescale the SnGPUArray
+    # x2 /= nufft.volume['gpu_sense2']
+#         x3 = nufft.x2s(x2) # combine multi-coil to single-coil
+    try:
+        x2 /= nufft.volume['SnGPUArray']
     except:
-        W = nufft.thr.copy_array(nufft.y)
-#         nufft.prg.cMultiplyScalar(nufft.zero_scalar, W, local_size=None, global_size=int(nufft.M))
-        W.fill(0.0 + 0.0j)
-#         V1= nufft.st['p'].getH()
-    #     VVH = V.dot(V.getH()) 
-         
-        for pp in range(0,1):
-#             E = nufft.st['p'].dot(V1.dot(W))
+        
+        nufft.prg.cTensorMultiply(numpy.uint32(nufft.batch), 
+                                numpy.uint32(nufft.tSN['Tdims']),
+                                nufft.tSN['Td'],
+                                nufft.tSN['Td_elements'],
+                                nufft.tSN['invTd_elements'],
+                                nufft.tSN['tensor_sn'], 
+                                x2, 
+                                numpy.uint32(1), # division, 1 is true
+                                local_size = None, global_size = int(nufft.batch*nufft.Ndprod))
+    return x2
 
-            E = nufft.forward(nufft.adjoint(W))
-            W /= E
-#                 nufft.prg.cMultiplyVecInplace(self.SnGPUArray, self.x_Nd, local_size=None, global_size=int(self.Ndprod))
+def _cg(nufft, gy, maxiter, x0 = None, monitor = None):
+    """
+    Private: conjugate gradient method on the Kd grid, solving (spH sp) k = spH gy. 
     
-    return W  
+    The scalars stay on the device: the reductions write rs = r'*r and p'*Ap to device scalars, 
+    which are read by the fused update kernels cCGUpdateXR and cCGUpdateP. 
+    The work vectors are allocated once, so the loop does not wait for the device.
+    
+    In batch mode, the channels are independent systems which share the batched k2y() and y2k(). 
+    The reductions sum over the Kd axes only, so alpha and beta are vectors of length batch. 
+    With tol, each channel is masked (alpha = 0) once its own residual is below tol.
+    
+    :param nufft: NUFFT_hsa object
+    :param gy: (M,) or (M, batch) reikna array
+    :param maxiter: the number of iterations
+    :param x0: (Optional) the initial Nd or Nd + (batch, ) image, which starts the iterations from x2k(x0). 
+               The default starts from spH gy. 
+    :param monitor: (Optional) the iteration monitor of solve(). If active, r'*r is fetched in every iteration 
+                    for the residual norm(r)/norm(b) (the maximum of the active channels), which synchronizes the host and the device. 
+    :return: k: the solved Kd or Kd + (batch, ) reikna array
+    """
+    size = int(nufft.batch * nufft.Kdprod)
+    reduce_sum = nufft.context.reduce_sum(nufft.multi_Kd, axes = range(0, len(nufft.st['Kd']))) # per channel
+    batch = numpy.uint32(nufft.batch)
+    mask = nufft.thr.to_device(numpy.ones((nufft.batch, ), dtype = numpy.float32)) # 0 for the converged channels
+    
+    # b = spH * gy, x = b or x2k(x0)
+    b = nufft.y2k(gy)
+    if x0 is None:
+        x = nufft.thr.copy_array(b)
+    else:
+        x = nufft.x2k(_to_device(nufft, x0))
+    
+    # r = b - A * x, p = r
+    y_tmp = nufft.thr.array(nufft.multi_M, dtype = nufft.dtype)
+    Ap = nufft.thr.empty_like(b)
+    nufft.k2y(x, out = y_tmp)
+    nufft.y2k(y_tmp, out = Ap)
+    r = _axpbypcz(nufft, 1.0, b, -1.0, Ap, 0.0, Ap, nufft.thr.empty_like(b))
+    p = nufft.thr.copy_array(r)
+    
+    tmp_array = nufft.thr.empty_like(b)
+    rsold = nufft.thr.empty_like(reduce_sum.parameter.output)
+    rsnew = nufft.thr.empty_like(reduce_sum.parameter.output)
+    pAp = nufft.thr.empty_like(reduce_sum.parameter.output)
+    
+    # rsold = r' * r
+    nufft.prg.cMultiplyConjVec(r, r, tmp_array, local_size=None, global_size=size)
+    reduce_sum(rsold, tmp_array)
+    
+    if monitor is not None and monitor.active: # bb = b'*b
+        nufft.prg.cMultiplyConjVec(b, b, tmp_array, local_size=None, global_size=size)
+        reduce_sum(pAp, tmp_array)
+        bb = numpy.abs(numpy.ravel(pAp.get()))
+        active = bb > 0
+    
+    for pp in range(0, maxiter):
+        nufft.k2y(p, out = y_tmp)
+        nufft.y2k(y_tmp, out = Ap)
+        
+        # alpha = rsold/(p'*Ap), x = x + alpha*p, r = r - alpha*Ap
+        nufft.prg.cMultiplyConjVec(p, Ap, tmp_array, local_size=None, global_size=size)
+        reduce_sum(pAp, tmp_array)
+        nufft.prg.cCGUpdateXR(batch, rsold, pAp, mask, p, Ap, x, r, local_size=None, global_size=size)
+        
+        # rsnew = r'*r, p = r + (rsnew/rsold)*p
+        nufft.prg.cMultiplyConjVec(r, r, tmp_array, local_size=None, global_size=size)
+        reduce_sum(rsnew, tmp_array)
+        nufft.prg.cCGUpdateP(batch, rsnew, rsold, r, p, local_size=None, global_size=size)
+        
+        rsold, rsnew = rsnew, rsold
+        if monitor is not None and monitor.active:
+            residuals = numpy.zeros_like(bb)
+            residuals[active] = numpy.sqrt(numpy.abs(numpy.ravel(rsold.get()))[active]/bb[active])
+            if monitor.callback is not None: # the callback receives the image, not the Kd grid
+                xk = _k2image(nufft, nufft.thr.copy_array(x))
+            else:
+                xk = x
+            if monitor.update(xk, numpy.max(residuals)):
+                break
+            if monitor.tol is not None and numpy.any(active & (residuals < monitor.tol)):
+                active &= residuals >= monitor.tol
+                mask.set(active.astype(numpy.float32)) # freeze the converged channels
+    
+    return x
+
+def _axpbypcz(nufft, a, x, b, y, c, z, out):
+    """
+    Private: out = a*x + b*y + c*z on the device (real a, b and c)
+    """
+    nufft.prg.cAXPBYPCZ(numpy.float32(a), x, numpy.float32(b), y, numpy.float32(c), z, out, 
+                        local_size=None, global_size=int(numpy.prod(out.shape)))
+    return out
+
+def _norm(nufft, x):
+    """
+    Private: norm(x) of a device array, which is fetched from the device
+    """
+    reduce_sum = nufft.context.reduce_sum(x.shape)
+    tmp = nufft.thr.empty_like(x)
+    nufft.prg.cMultiplyConjVec(x, x, tmp, local_size=None, global_size=int(numpy.prod(x.shape)))
+    xx = nufft.thr.empty_like(reduce_sum.parameter.output)
+    reduce_sum(xx, tmp)
+    return float(numpy.sqrt(numpy.abs(numpy.ravel(xx.get())[0])))
+
+def _power_iteration(nufft, AHA, shape, maxiter = 50, tol = 1e-3):
+    """
+    Private: the largest eigenvalue of A^H A by the power iteration on the device, see solve_cpu._power_iteration(). 
+    
+    :param AHA: the function AHA(x, out)
+    :param shape: the shape of the image
+    :return: L: the estimate of ||A^H A||
+    :rtype: float
+    """
+    rng = numpy.random.RandomState(0)
+    x = nufft.thr.to_device((rng.randn(*shape) + 1.0j*rng.randn(*shape)).astype(numpy.complex64))
+    y = nufft.thr.empty_like(x)
+    size = int(numpy.prod(shape))
+    nufft.prg.cMultiplyScalar(numpy.complex64(1.0/_norm(nufft, x)), x, local_size=None, global_size=size)
+    L = 0.0
+    for pp in range(0, maxiter):
+        AHA(x, y)
+        L_new = _norm(nufft, y)
+        if L_new == 0:
+            return 0.0
+        nufft.prg.cMultiplyScalar(numpy.complex64(1.0/L_new), y, local_size=None, global_size=size)
+        x, y = y, x
+        if abs(L_new - L) < tol*L_new:
+            return L_new
+        L = L_new
+    return L
+
+def prox_l1(nufft, x, threshold):
+    """
+    The proximal operator of threshold*||x||_1 (the complex soft-thresholding) in place, see solve_cpu.prox_l1()
+    """
+    if threshold > 0:
+        nufft.prg.cSoftThreshold(numpy.float32(threshold), x, local_size=None, global_size=int(numpy.prod(x.shape)))
+    return x
+
+def prox_l2(nufft, x, threshold):
+    """
+    The proximal operator of threshold*||x||_2^2/2, i.e. x/(1 + threshold), in place
+    """
+    nufft.prg.cMultiplyScalar(numpy.complex64(1.0/(1.0 + threshold)), x, local_size=None, global_size=int(numpy.prod(x.shape)))
+    return x
+
+def _tv_index(nufft):
+    """
+    Private: the index maps of Diff and Diff_t on the device, stacked along the first axis (ndims, Ndprod)
+    """
+    d_indx, dt_indx = helper.indxmap_diff(nufft.st['Nd'])
+    return (nufft.thr.to_device(numpy.stack(d_indx)), nufft.thr.to_device(numpy.stack(dt_indx)))
+
+def prox_tv(nufft, x, threshold, maxiter = 100, tol = 1e-3, p = None):
+    """
+    The proximal operator of threshold*TV(x), the isotropic total variation of the Nd (or Nd + (batch, )) image, in place. 
+    
+    The same fast gradient projection as solve_cpu.prox_tv(), by the kernels cTVProxPrimal and cTVProxDual. 
+    The relative change of x is fetched from the device every 10 dual iterations. 
+    
+    :param nufft: NUFFT_hsa object
+    :param x: the image on the device, which is overwritten
+    :param threshold: the weight of TV
+    :param maxiter: the maximum number of the dual iterations
+    :param tol: the relative change of x to exit the dual iterations
+    :param p: (Optional) the dual variable on the device with the shape (ndims, ) + x.shape, 
+              which warm starts the dual iterations and is updated in place
+    :return: x
+    """
+    if threshold <= 0:
+        return x
+    ndims = len(nufft.st['Nd'])
+    size = int(numpy.prod(x.shape))
+    batch = numpy.uint32(size // nufft.Ndprod)
+    d_indx, dt_indx = _cached_kernel(nufft, 'tv_index', _tv_index)
+    if p is None:
+        p = nufft.thr.array((ndims, ) + tuple(x.shape), dtype = numpy.complex64).fill(0)
+    v = nufft.thr.copy_array(x)
+    q = nufft.thr.copy_array(p)
+    p_old = nufft.thr.empty_like(p)
+    x_old = nufft.thr.empty_like(x)
+    args = (batch, numpy.uint32(ndims), numpy.uint32(nufft.Ndprod))
+    step = numpy.float32(1.0/(4*ndims*threshold))
+    t = 1.0
+    for outer in range(0, maxiter):
+        check = outer > 0 and outer % 10 == 0
+        if check:
+            nufft.prg.cCopy(x, x_old, local_size=None, global_size=size)
+        nufft.prg.cTVProxPrimal(*(args + (numpy.float32(threshold), dt_indx, v, q, x)), local_size=None, global_size=size)
+        if check:
+            _axpbypcz(nufft, 1.0, x_old, -1.0, x, 0.0, x, x_old)
+            if _norm(nufft, x_old) <= tol*_norm(nufft, x):
+                break
+        nufft.prg.cCopy(p, p_old, local_size=None, global_size=size*ndims)
+        nufft.prg.cTVProxDual(*(args + (step, d_indx, x, q, p)), local_size=None, global_size=size)
+        
+        # q = p + (t - 1)/t_new*(p - p_old)
+        t_new = (1 + numpy.sqrt(1 + 4*t*t))/2
+        beta = (t - 1)/t_new
+        _axpbypcz(nufft, 1.0 + beta, p, -beta, p_old, 0.0, p, q)
+        t = t_new
+    nufft.prg.cTVProxPrimal(*(args + (numpy.float32(threshold), dt_indx, v, p, x)), local_size=None, global_size=size)
+    return x
+
+def _prox_operator(nufft, prox, shape):
+    """
+    Private: the proximal operator prox(x, threshold) of fista() and admm() on the device
+    
+    :param prox: 'l1', 'l2', 'tv', None (no regularization) or a function prox(x, threshold) of device arrays
+    :param shape: the shape of the image
+    """
+    if prox is None:
+        return lambda x, threshold: x
+    if callable(prox):
+        return prox
+    if 'l1' == prox:
+        return lambda x, threshold: prox_l1(nufft, x, threshold)
+    if 'l2' == prox:
+        return lambda x, threshold: prox_l2(nufft, x, threshold)
+    if 'tv' == prox:
+        ndims = len(nufft.st['Nd'])
+        p = nufft.thr.array((ndims, ) + tuple(shape), dtype = numpy.complex64).fill(0) # warm started between the iterations
+        return lambda x, threshold: prox_tv(nufft, x, threshold, p = p)
+    raise ValueError('prox must be \'l1\', \'l2\', \'tv\', None or a function prox(x, threshold)')
+
+def fista(nufft, gy, maxiter, lamb = 0.0, prox = 'l1', L = None, x0 = None, monitor = None):
+    """
+    Fast iterative shrinkage-thresholding algorithm on the device, see solve_cpu.fista(). 
+    
+    A^H A is computed by selfadjoint(), and the updates are fused in cAXPBYPCZ on preallocated buffers. 
+    The residual of the monitor is the relative change of the image, which is fetched from the device only if the monitor is active. 
+    
+    :param nufft: NUFFT_hsa object
+    :param gy: (M,) or (M, batch) reikna array
+    :param maxiter: the maximum number of iterations
+    :param lamb: the weight of the regularization
+    :param prox: 'l1', 'l2', 'tv', None or a function prox(x, threshold) of device arrays
+    :param L: (Optional) the Lipschitz constant ||A^H A||. The default is nufft.operator_norm(), which is cached per plan.
+    :param x0: (Optional) the initial image (numpy or device array)
+    :return: x, L
+    """
+    def AHA(x, out):
+        return nufft.selfadjoint(x, out = out)
+    b = nufft.adjoint(gy)
+    if L is None:
+        L = nufft.operator_norm()
+    prox = _prox_operator(nufft, prox, b.shape)
+    step = 1.0/L
+    
+    if x0 is None:
+        x = nufft.thr.array(b.shape, dtype = numpy.complex64).fill(0)
+    else:
+        x = _to_device(nufft, x0)
+    z = nufft.thr.copy_array(x)
+    g = nufft.thr.empty_like(b)
+    v = nufft.thr.empty_like(b)
+    x_old = nufft.thr.empty_like(b)
+    t = 1.0
+    for pp in range(0, maxiter):
+        # v = z - step*(A^H A z - b)
+        AHA(z, g)
+        _axpbypcz(nufft, 1.0, z, -step, g, step, b, v)
+        
+        x_new = prox(v, step*lamb)
+        if x_new is v: # the buffer of the previous x_old is free
+            v = x_old
+        x_old, x = x, x_new
+        
+        # z = x + (t - 1)/t_new*(x - x_old)
+        t_new = (1 + numpy.sqrt(1 + 4*t*t))/2
+        beta = (t - 1)/t_new
+        _axpbypcz(nufft, 1.0 + beta, x, -beta, x_old, 0.0, x, z)
+        t = t_new
+        if monitor is not None and monitor.active:
+            if monitor.update(x, _relative_change(x, x_old)):
+                break
+    return x, L
+
+def _cg_shifted(nufft, AHA, rho, b, x, maxiter):
+    """
+    Private: a few conjugate gradient iterations of (A^H A + rho I) x = b on the device, starting from x, which is updated in place. 
+    The scalars stay on the device, see _cg(). 
+    """
+    size = int(numpy.prod(b.shape))
+    reduce_sum = nufft.context.reduce_sum(b.shape)
+    batch = numpy.uint32(1)
+    mask = nufft.thr.to_device(numpy.ones((1, ), dtype = numpy.float32))
+    r = nufft.thr.empty_like(b)
+    Ap = nufft.thr.empty_like(b)
+    tmp = nufft.thr.empty_like(b)
+    rsold = nufft.thr.empty_like(reduce_sum.parameter.output)
+    rsnew = nufft.thr.empty_like(reduce_sum.parameter.output)
+    pAp = nufft.thr.empty_like(reduce_sum.parameter.output)
+    
+    # r = b - (A^H A + rho I) x, p = r
+    AHA(x, Ap)
+    _axpbypcz(nufft, 1.0, b, -1.0, Ap, -rho, x, r)
+    p = nufft.thr.copy_array(r)
+    nufft.prg.cMultiplyConjVec(r, r, tmp, local_size=None, global_size=size)
+    reduce_sum(rsold, tmp)
+    for pp in range(0, maxiter):
+        AHA(p, Ap)
+        _axpbypcz(nufft, 1.0, Ap, rho, p, 0.0, p, Ap)
+        nufft.prg.cMultiplyConjVec(p, Ap, tmp, local_size=None, global_size=size)
+        reduce_sum(pAp, tmp)
+        nufft.prg.cCGUpdateXR(batch, rsold, pAp, mask, p, Ap, x, r, local_size=None, global_size=size)
+        nufft.prg.cMultiplyConjVec(r, r, tmp, local_size=None, global_size=size)
+        reduce_sum(rsnew, tmp)
+        nufft.prg.cCGUpdateP(batch, rsnew, rsold, r, p, local_size=None, global_size=size)
+        rsold, rsnew = rsnew, rsold
+    return x
+
+def admm(nufft, gy, maxiter, lamb = 0.0, prox = 'l1', rho = None, cg_maxiter = 3, L = None, x0 = None, monitor = None):
+    """
+    Alternating direction method of multipliers on the device, see solve_cpu.admm(). 
+    
+    A^H A is computed by selfadjoint(). The residual of the monitor is the relative change of z, 
+    which is fetched from the device only if the monitor is active. 
+    
+    :param nufft: NUFFT_hsa object
+    :param gy: (M,) or (M, batch) reikna array
+    :param maxiter: the maximum number of iterations
+    :param lamb: the weight of the regularization
+    :param prox: 'l1', 'l2', 'tv', None or a function prox(x, threshold) of device arrays
+    :param rho: (Optional) the penalty parameter. The default is L/10, where L = ||A^H A||.
+    :param cg_maxiter: the number of the conjugate gradient iterations of the x-update
+    :param L: (Optional) ||A^H A||, which sets the default rho. The default is nufft.operator_norm(), which is cached per plan.
+    :param x0: (Optional) the initial image (numpy or device array)
+    :return: z, L
+    """
+    def AHA(x, out):
+        return nufft.selfadjoint(x, out = out)
+    b = nufft.adjoint(gy)
+    if rho is None:
+        if L is None:
+            L = nufft.operator_norm()
+        rho = 0.1*L
+    prox = _prox_operator(nufft, prox, b.shape)
+    
+    if x0 is None:
+        x = nufft.thr.array(b.shape, dtype = numpy.complex64).fill(0)
+    else:
+        x = _to_device(nufft, x0)
+    z = nufft.thr.copy_array(x)
+    u = nufft.thr.array(b.shape, dtype = numpy.complex64).fill(0)
+    rhs = nufft.thr.empty_like(b)
+    w = nufft.thr.empty_like(b)
+    for pp in range(0, maxiter):
+        # rhs = b + rho*(z - u)
+        _axpbypcz(nufft, rho, z, -rho, u, 1.0, b, rhs)
+        _cg_shifted(nufft, AHA, rho, rhs, x, cg_maxiter)
+        
+        z_old = z
+        _axpbypcz(nufft, 1.0, x, 1.0, u, 0.0, u, w)
+        z = prox(w, lamb/rho)
+        w = z_old if z is w else w # reuse the buffer of the previous z
+        
+        _axpbypcz(nufft, 1.0, u, 1.0, x, -1.0, z, u)
+        if monitor is not None and monitor.active:
+            if monitor.update(z, _relative_change(z, z_old)):
+                break
+    return z, L
 
 def solve(nufft,gy, solver=None,  maxiter=30, *args, **kwargs):
     """
     The solve function of NUFFT_hsa.
-    The current version supports solvers = 'cg' or 'L1TVOLS'. 
+    The current version supports solvers = 'cg', 'L1TVOLS', 'L1TVLAD', 'fista', 'admm' and 'dc'. 
+    
+    The keywords tol, callback, full_output and x0 are the same as solve_cpu.solve(). 
+    'L1TVOLS' and 'L1TVLAD' also accept state, the dictionary of the split-Bregman state, see L1TVOLS(). 
+    The residual is norm(b - Ax)/norm(b) for 'cg', the relative change of the image for 'L1TVOLS' and 'L1TVLAD', 
+    and the rms of |P P^H W - 1| for 'dc'. 
+    Without tol, callback and full_output, the iterations do not fetch any scalar from the device. 
     
     :param nufft: NUFFT_hsa object
     :param y: (M,) or (M, batch) array, non-uniform data. If batch is provide, 'cg' and 'L1TVOLS' returns different image shape.
     :type y: numpy.complex64 reikna array
     :return: x: Nd or Nd + (batch, ) image. L1TVOLS always returns Nd. 'cg' returns Nd + (batch, ) in batch mode. 
+             SolveResult if full_output is True, whose info['L'] is ||A^H A|| of 'fista' and 'admm'. 
     :rtype: x: reikna array, complex64. 
     """
+    full_output = kwargs.pop('full_output', False)
+    monitor = _Monitor(kwargs.pop('tol', None), kwargs.pop('callback', None), full_output)
+    x0 = kwargs.pop('x0', None)
+    x2, info = _solve(nufft, gy, solver, maxiter, monitor, x0, *args, **kwargs)
+    if full_output:
+        return monitor.result(x2, solver, info)
+    return x2
+
+def _solve(nufft, gy, solver, maxiter, monitor, x0, *args, **kwargs):
+    """
+    Private: the solvers of solve()
+    
+    :return: x, info
+    """
     # define the reduction kernel on the device
 #     if None ==  solver:
 #         solver  =   'cg'
     if 'L1TVLAD' == solver:
-        x2=L1TVLAD(nufft, gy, maxiter=maxiter, *args, **kwargs  )
+        x2=L1TVLAD(nufft, gy, maxiter, *args, x0 = x0, monitor = monitor, **kwargs  )
 #         x2 = nufft.thr.copy_array(nufft.x_Nd)
-        return x2
+        return x2, {}
     elif 'L1TVOLS' == solver:
-        x2=L1TVOLS(nufft, gy, maxiter=maxiter, *args, **kwargs  )
+        x2=L1TVOLS(nufft, gy, maxiter, *args, x0 = x0, monitor = monitor, **kwargs  )
 #         x2 = nufft.thr.copy_array(nufft.x_Nd)
-        return x2
+        return x2, {}
+    elif 'fista' == solver:
+        x2, L = fista(nufft, gy, maxiter, *args, x0 = x0, monitor = monitor, **kwargs)
+        return x2, {'L': L}
+    elif 'admm' == solver:
+        x2, L = admm(nufft, gy, maxiter, *args, x0 = x0, monitor = monitor, **kwargs)
+        return x2, {'L': L}
     elif 'dc'   ==  solver:
-         """
-         Density compensation method
-         nufft.st['W'] will be computed if doesn't exist
-         If nufft.st['W'] exist then x2 = nufft.adjoint(nufft.st['W']*y)
-         input: 
-             y: (M,) array
-         output:
-             x2: Nd array
-         """
-         print(solver, ":density compensation method. I won't recommend it as the GPU version is not needed! Try the CPU version")
-
-#          nufft.st['W'] = nufft._pipe_density(maxiter=maxiter,*args, **kwargs)
-#  
-#          x2 = nufft.adjoint(nufft.st['W']*gy)
-         return x2
-#             return gx        
+        """
+        Density compensation method
+        The weights W are computed at the first call and cached in nufft.kernels, see _pipe_density()
+        x2 = nufft.adjoint(W*gy)
+        """
+        W = _pipe_density(nufft, maxiter, tol = monitor.tol, monitor = monitor)
+        x2 = nufft.adjoint(W*gy)
+        return x2, {}
     elif 'cg' == solver:
- 
-        from reikna.algorithms import Reduce, Predicate, predicate_sum
-         
-        nufft.reduce_sum = Reduce(numpy.zeros(nufft.multi_Kd, dtype = nufft.dtype), predicate_sum(dtype)).compile(nufft.thr)      
-#         nufft.reduce_sum  = nufft.reduce_sum.compile(nufft.thr)        
-         
-        
-        # update: b = spH * gy         
-        b = nufft.y2k(gy)
-        
-        # Initialize x = b
-        x   =   nufft.thr.copy_array( b)
-        rsold = nufft.thr.empty_like(nufft.reduce_sum.parameter.output)
-#         rsold.fill(0.0+0.0j)
-        nufft.reduce_sum(rsold, x)
-#         print('x',rsold) 
-         
-        # initialize r = b - A * x
-        r   =   nufft.thr.empty_like( b)
-        
-#         r.fill(0.0 + 0.0j) 
-        y_tmp = nufft.k2y(x)
-        
-        Ax = nufft.y2k(y_tmp)
-        
-        del y_tmp
-        rsold = nufft.thr.empty_like(nufft.reduce_sum.parameter.output)
-#         rsold.fill(0.0 + 0.0j)
-        nufft.reduce_sum(rsold, Ax)
-#         print('Ax',rsold) 
-        nufft.prg.cAddVec(b, - Ax, r , local_size=None, global_size = int(nufft.batch * nufft.Kdprod))
-        
-#         nufft.thr.synchronize()
-        # p = r
-        p   =   nufft.thr.copy_array(r)
-        
-        # rsold = r' * r
-        tmp_array = nufft.thr.empty_like( r)
-#         tmp_array.fill(0.0 + 0.0j)
-        nufft.prg.cMultiplyConjVec(r, r, tmp_array, local_size=None, global_size=int(nufft.batch * nufft.Kdprod))
-#         nufft.thr.synchronize()
-        rsold = nufft.thr.empty_like(nufft.reduce_sum.parameter.output)
-#         rsold.fill(0.0 + 0.0j)
-        nufft.reduce_sum(rsold, tmp_array)
- 
-        # allocate Ap
-#         Ap  =   nufft.thr.empty_like( b)     
- 
-        rsnew = nufft.thr.empty_like(nufft.reduce_sum.parameter.output)
-#         rsnew.fill(0.0 + 0.0j)
-        tmp_sum = nufft.thr.empty_like(nufft.reduce_sum.parameter.output)
-#         tmp_sum.fill(0.0 + 0.0j)
-        for pp in range(0, maxiter):
-            
-            tmp_p = nufft.k2y(p)
-            Ap = nufft.y2k(tmp_p)
-            del tmp_p
-#             alpha = rs_old/(p'*Ap)
-            nufft.prg.cMultiplyConjVec(p, Ap, tmp_array, local_size=None, global_size=int(nufft.batch * nufft.Kdprod))
-#             nufft.thr.synchronize()
-            nufft.reduce_sum(tmp_sum, tmp_array)
-            
-            alpha = rsold / tmp_sum
-#             alpha_cpu = alpha.get()
-#             if numpy.isnan(alpha_cpu):
-#                 alpha_cpu = 0 # avoid singularity
-                
-#             print(tmp_sum, alpha, rsold)
-#             print(pp,rsold , alpha, numpy.sum(tmp_array.get()) )
-            # x = x + alpha*p
-            p2 = nufft.thr.copy_array(p)
-            
-            nufft.prg.cMultiplyScalar(alpha.get(), p2,  local_size=None, global_size=int(nufft.batch * nufft.Kdprod))
-#             nufft.thr.synchronize()
-#             nufft.prg.cAddVec(x, alpha, local_size=None, global_size=int(nufft.Kdprod))
-            x += p2
- 
-            # r = r - alpha * Ap
-            p2= nufft.thr.copy_array(Ap)
-#             nufft.thr.synchronize()
-            nufft.prg.cMultiplyScalar(alpha.get(), p2,  local_size=None, global_size=int(nufft.batch * nufft.Kdprod))
-#             nufft.thr.synchronize()
-            r -= p2
-#             print(pp, numpy.sum(x.get()), numpy.sum(r.get()))
-            # rs_new = r'*r
-             
-            nufft.prg.cMultiplyConjVec(r,    r,  tmp_array, local_size=None, global_size=int(nufft.batch * nufft.Kdprod))
-#             nufft.thr.synchronize()
-            nufft.reduce_sum(rsnew, tmp_array)        
-             
-            # tmp_sum = p = r + (rs_new/rs_old)*p
-            beta = rsnew/rsold
-#             beta_cpu = beta.get()
-#             if numpy.isnan(beta_cpu):
-#                 beta_cpu = 0
-#             print(beta, rsnew, rsold)
-            p2= nufft.thr.copy_array(p)
-            nufft.prg.cMultiplyScalar(beta.get(),   p2,  local_size=None, global_size=int(nufft.batch * nufft.Kdprod))
-#             nufft.thr.synchronize()
-            nufft.prg.cAddVec(r, p2, p, local_size=None, global_size=int(nufft.batch * nufft.Kdprod))
-#             nufft.thr.synchronize()
-            p = r + p2
-             
-            rsold =nufft.thr.copy_array( rsnew)
-#             nufft.thr.synchronize()
-        # end of iteration    
-         
-        # copy result to k_Kd2
-#         nufft.k_Kd2 = nufft.thr.copy_array(x)
-         
-        # inverse FFT: k_Kd2 -> x_Nd
-        x2 = nufft.k2xx(x) # x is the solved k space
-        
-        # rescale the SnGPUArray
-        # x2 /= nufft.volume['gpu_sense2']
-#         x3 = nufft.x2s(x2) # combine multi-coil to single-coil
-        try:
-            x2 /= nufft.volume['SnGPUArray']
-        except:
-            
-            nufft.prg.cTensorMultiply(numpy.uint32(nufft.batch), 
-                                    numpy.uint32(nufft.tSN['Tdims']),
-                                    nufft.tSN['Td'],
-                                    nufft.tSN['Td_elements'],
-                                    nufft.tSN['invTd_elements'],
-                                    nufft.tSN['tensor_sn'], 
-                                    x2, 
-                                    numpy.uint32(1), # division, 1 is true
-                                    local_size = None, global_size = int(nufft.batch*nufft.Ndprod))
-         
-        return x2
\ No newline at end of file
+        x = _cg(nufft, gy, maxiter, x0, monitor)
+        x2 = _k2image(nufft, x) # x is the solved k space
+        return x2, {}
+    else:
+        raise ValueError('Unknown solver: ' + str(solver))
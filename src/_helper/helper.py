@@ -7,6 +7,22 @@ Helper functions
 import numpy
 dtype = numpy.complex64
 import scipy
+import scipy.sparse
+import logging
+
+logger = logging.getLogger('pynufft') #: the logger of pynufft, which is silent unless the application configures logging
+logger.addHandler(logging.NullHandler())
+
+def set_verbosity(level):
+    """
+    Set the verbosity of pynufft. The messages are printed to stderr by a logging.StreamHandler.
+    
+    :param level: The logging level, e.g. logging.INFO or 'DEBUG'. logging.WARNING is the default of Python logging.
+    :type level: int or string
+    """
+    if not any(isinstance(handler, logging.StreamHandler) for handler in logger.handlers):
+        logger.addHandler(logging.StreamHandler())
+    logger.setLevel(level)
 
 def create_laplacian_kernel(nufft):
     """
@@ -391,6 +407,39 @@ def create_partialELL(ud, kd, Jd, M):
     partialELL = pELL(M, Jd, curr_sumJd, meshindex, kindx, udata.astype(dtype))
     return partialELL
 
+def pELL_to_csrH(partialELL, Kdprod):
+    """
+    The conjugate transpose of the interpolator in a partial ELL format, as a CSR matrix. 
+    
+    Each row of the CSR matrix is a grid point of Kd, which lists the contributing samples and the conjugate weights. 
+    The gridding can then gather the samples without atomic operations. 
+    The column indices follow the pELL_spmv_mCoil kernel. 
+    
+    :param partialELL: the partial ELL interpolator
+    :param Kdprod: the number of the grid points
+    :type partialELL: pELL instance
+    :type Kdprod: int
+    :return: csrH: the CSR matrix, shape = (Kdprod, M)
+    :rtype: scipy.sparse.csr_matrix, dtype = numpy.complex64
+    """
+    M = partialELL.nRow
+    index_shift = 0
+    col = 0
+    spdata = 1
+    for dimid in range(0, partialELL.dim):
+        J = int(partialELL.Jd[dimid])
+        index = index_shift + partialELL.meshindex[:, dimid].astype(numpy.int64) # prodJd
+        col = col + partialELL.kindx[:, index].astype(numpy.int64) 
+        if dimid > 0:
+            col = col + 1
+        spdata = spdata * partialELL.udata[:, index]
+        index_shift += J
+    col = col % 2**32 # the unsigned arithmetic of the kernel
+    row = numpy.repeat(numpy.arange(0, M), partialELL.prodJd)
+    csrH = scipy.sparse.csr_matrix((spdata.conj().ravel(), (col.ravel(), row)), shape = (int(Kdprod), int(M)), dtype = numpy.complex64)
+    csrH.sum_duplicates()
+    return csrH
+
 # def partial_combination(ud, kd, Jd):
 #     """
 #     Input:
@@ -800,6 +849,69 @@ def plan(om, Nd, Kd, Jd, ft_axes = None, format='CSR', radix = None):
 
     return st #new
 
+def detect_ongrid(om, Nd, Kd, tol = 1e-6):
+    """
+    Find the samples which lie exactly on the grid points of Kd.
+    
+    The on-grid samples can be computed by a direct gather from an unscaled FFT, 
+    instead of the Jd-point min-max interpolator. 
+    The FFT size Gd[d] is the smallest divisor of Kd[d] (Gd[d] >= Nd[d]) which contains all the on-grid samples.
+    
+    :param om: Coordinate
+    :param Nd: Image shape
+    :param Kd: Oversampled grid shape
+    :param tol: Tolerance of the distance to the grid points, in the unit of the Kd grid
+    :type om: numpy.float, shape = (M, ndims)
+    :type Nd: tuple of int
+    :type Kd: tuple of int
+    :type tol: float
+    :return: mask: True for the on-grid samples
+    :return: Gd: the grid size of the gather
+    :rtype: mask: numpy.bool array, shape = (M, )
+    :rtype: Gd: tuple of int
+    """
+    dd = len(Nd)
+    kk = om * (numpy.array(Kd).reshape((1, dd)) / (2.0 * numpy.pi)) # the coordinates in the unit of the Kd grid
+    mask = numpy.all(numpy.abs(kk - numpy.round(kk)) < tol, axis = 1)
+    
+    Gd = ()
+    for dimid in range(0, dd):
+        K = Kd[dimid]
+        tt = numpy.round(kk[mask, dimid]).astype(numpy.int64)
+        for G in range(Nd[dimid], K + 1): # the first candidate is the smallest grid
+            if K % G == 0:
+                if numpy.all(tt % (K // G) == 0):
+                    break
+        Gd += (G, )
+    return mask, Gd
+
+def ongrid_gather(om, Nd, Gd):
+    """
+    Create the J=1 gather matrix of the on-grid samples, including the phase of the image center.
+    
+    y = gather.dot(fftn(x, s = Gd).ravel()) is the NUFFT of the on-grid samples.
+    
+    :param om: Coordinate of the on-grid samples
+    :param Nd: Image shape
+    :param Gd: The grid size of the gather, returned by detect_ongrid()
+    :type om: numpy.float, shape = (M, ndims)
+    :type Nd: tuple of int
+    :type Gd: tuple of int
+    :return: gather: CSR matrix with one non-zero element in each row
+    :rtype: gather: scipy.sparse.csr_matrix, shape = (M, numpy.prod(Gd))
+    """
+    M = om.shape[0]
+    dd = len(Nd)
+    gindx = numpy.zeros((M, ), dtype = numpy.int64)
+    phase = numpy.zeros((M, ), dtype = numpy.float64)
+    for dimid in range(0, dd):
+        tt = numpy.round(om[:, dimid] * Gd[dimid] / (2.0 * numpy.pi)).astype(numpy.int64)
+        gindx = gindx * Gd[dimid] + numpy.mod(tt, Gd[dimid]) # C-order (row-major) index
+        phase += om[:, dimid] * Nd[dimid] / 2.0 # the image center is Nd/2
+    gather = scipy.sparse.csr_matrix((numpy.exp(1.0j*phase).astype(dtype), gindx, numpy.arange(0, M + 1)), 
+                                     shape = (M, numpy.prod(Gd)))
+    return gather
+
 def plan1(om, Nd, Kd, Jd, ft_axes = None):
     """
     Compute the coil sensitivity aware interpolator
@@ -1374,6 +1486,7 @@ def nufft_scale(Nd, Kd, alpha, beta):
 
 def mat_inv(A):
 #     I = numpy.eye(A.shape[0], A.shape[1])
+    import scipy.linalg
     B = scipy.linalg.pinv2(A)
     return B
 
@@ -1494,33 +1607,34 @@ def diagnose():
     """
     Diagnosis function
     Find available device when NUFFT.offload() failed
+    The devices are reported to the 'pynufft' logger, see set_verbosity().
     """
     from reikna import cluda
     import reikna.transformations
     from reikna.cluda import functions, dtypes    
     try:
         api = cluda.cuda_api()
-        print('cuda interface is available')
+        logger.info('cuda interface is available')
         available_cuda_device = cluda.find_devices(api)
-        print(api, available_cuda_device)
+        logger.info('%s %s', api, available_cuda_device)
         cuda_flag = 1
-        print("try to load cuda interface:")
+        logger.info("try to load cuda interface:")
         for api_n in available_cuda_device.keys():
-            print("API='cuda',  ", "platform_number=", api_n, ", device_number=", available_cuda_device[api_n][0])     
+            logger.info("API='cuda', platform_number=%s, device_number=%s", api_n, available_cuda_device[api_n][0])     
     except:
         cuda_flag = 0
-        print('cuda interface is not available') 
+        logger.info('cuda interface is not available') 
     try:
         api = cluda.ocl_api()
-        print('ocl interface is available')
+        logger.info('ocl interface is available')
         available_ocl_device = cluda.find_devices(api)
-        print(api, available_ocl_device)
+        logger.info('%s %s', api, available_ocl_device)
         ocl_flag = 1
-        print("try to load ocl interface with:")
+        logger.info("try to load ocl interface with:")
         for api_n in available_ocl_device.keys():
-            print("API='ocl',  ", "platform_number=", api_n, ", device_number=", available_ocl_device[api_n][0])        
+            logger.info("API='ocl', platform_number=%s, device_number=%s", api_n, available_ocl_device[api_n][0])        
     except:
-        print('ocl interface is not available')
+        logger.info('ocl interface is not available')
         ocl_flag = 0
     return cuda_flag, ocl_flag
         
@@ -1,8 +1,5 @@
 # import phantom
 import numpy
-import matplotlib.pyplot
-matplotlib.pyplot.gray()
-import scipy.misc
 
 # import shrinkage_operator
 # S = shrinkage_operator.Shrinkage_L1()
@@ -74,6 +71,9 @@ def Nd_sense(image_stack, maxiter = 20):
     return H, mu0, mu
 
 if __name__ == "__main__":
+    import matplotlib.pyplot
+    matplotlib.pyplot.gray()
+    import scipy.misc
 
     N= 256
     n_coil = 16
@@ -31,7 +31,16 @@ def create_kernel_sets(API):
                         cAnisoShrink() +  
                         cSpmv() + 
                         cSpmvh() + 
-                        cHadamard())
+                        cHadamard() + 
+                        cCGUpdateXR() + 
+                        cCGUpdateP() + 
+                        cTensorCopyMultiply() + 
+                        cTVRhs() + 
+                        cTVShrink() + 
+                        cAXPBYPCZ() + 
+                        cSoftThreshold() + 
+                        cTVProxDual() + 
+                        cTVProxPrimal())
 #     if 'cuda' is API:
 #         print('Select cuda interface')
 #         kernel_sets =  atomic_add.cuda_add + kernel_sets
@@ -60,6 +69,351 @@ def cMultiplyScalar():
         """
     return code_text
 
+def cCGUpdateXR():
+    """
+    Return the kernel source of cCGUpdateXR, the fused x and r updates of the conjugate gradient method. 
+    The step sizes are read from the device, so the host does not wait for the reductions. 
+    Each channel of the batch (the last axis) has its own step size, and the masked channels are not updated. 
+    """
+    code_text ="""
+        KERNEL void cCGUpdateXR(
+                const unsigned int batch,
+                GLOBAL_MEM const float2 *num,
+                GLOBAL_MEM const float2 *den,
+                GLOBAL_MEM const float *mask,
+                GLOBAL_MEM const float2 *p,
+                GLOBAL_MEM const float2 *Ap,
+                GLOBAL_MEM float2 *x,
+                GLOBAL_MEM float2 *r)
+        { 
+        // alpha = mask[c]*num[c]/den[c]; x = x + alpha*p; r = r - alpha*Ap
+        // c = gid % batch is the channel; alpha = 0 if den[c] = 0 (converged)
+        const unsigned int gid = get_global_id(0);
+        const unsigned int c = gid % batch;
+        const float2 a = num[c];
+        const float2 d = den[c];
+        const float dd = d.x*d.x + d.y*d.y;
+        float2 alpha;
+        alpha.x = (dd > 0.0f) ? mask[c]*(a.x*d.x + a.y*d.y)/dd : 0.0f;
+        alpha.y = (dd > 0.0f) ? mask[c]*(a.y*d.x - a.x*d.y)/dd : 0.0f;
+        const float2 pg = p[gid];
+        const float2 Apg = Ap[gid];
+        float2 xg = x[gid];
+        float2 rg = r[gid];
+        xg.x += alpha.x*pg.x - alpha.y*pg.y;
+        xg.y += alpha.x*pg.y + alpha.y*pg.x;
+        rg.x -= alpha.x*Apg.x - alpha.y*Apg.y;
+        rg.y -= alpha.x*Apg.y + alpha.y*Apg.x;
+        x[gid] = xg;
+        r[gid] = rg;
+        };
+        """
+    return code_text
+
+def cCGUpdateP():
+    """
+    Return the kernel source of cCGUpdateP, the search direction update of the conjugate gradient method. 
+    Each channel of the batch (the last axis) has its own beta. 
+    """
+    code_text ="""
+        KERNEL void cCGUpdateP(
+                const unsigned int batch,
+                GLOBAL_MEM const float2 *num,
+                GLOBAL_MEM const float2 *den,
+                GLOBAL_MEM const float2 *r,
+                GLOBAL_MEM float2 *p)
+        { 
+        // beta = num[c]/den[c]; p = r + beta*p
+        // c = gid % batch is the channel; beta = 0 if den[c] = 0
+        const unsigned int gid = get_global_id(0);
+        const unsigned int c = gid % batch;
+        const float2 a = num[c];
+        const float2 d = den[c];
+        const float dd = d.x*d.x + d.y*d.y;
+        float2 beta;
+        beta.x = (dd > 0.0f) ? (a.x*d.x + a.y*d.y)/dd : 0.0f;
+        beta.y = (dd > 0.0f) ? (a.y*d.x - a.x*d.y)/dd : 0.0f;
+        const float2 pg = p[gid];
+        float2 rg = r[gid];
+        rg.x += beta.x*pg.x - beta.y*pg.y;
+        rg.y += beta.x*pg.y + beta.y*pg.x;
+        p[gid] = rg;
+        };
+        """
+    return code_text
+
+def cTensorCopyMultiply():
+    """
+    Return the kernel source for cTensorCopyMultiply, the fused cTensorMultiply and cTensorCopy. 
+    direction = 1: scaling and zero-padding (Nd -> Kd); direction = -1: cropping and rescaling (Kd -> Nd).
+    Each work-item computes the scaling factor of one pixel once for the whole batch. 
+    """
+    code_text = """
+    KERNEL void cTensorCopyMultiply(
+        const unsigned int batch, 
+        const unsigned int dim,
+        GLOBAL_MEM const  unsigned int *Nd_elements,
+        GLOBAL_MEM const  unsigned int *Kd_elements,
+        GLOBAL_MEM const  float *invNd,
+        const unsigned int Tdims, // dimensions of the tensor scaling factors
+        GLOBAL_MEM const  unsigned int *Td, 
+        GLOBAL_MEM const  unsigned int *Td_elements,
+        GLOBAL_MEM const  float *invTd_elements,
+        GLOBAL_MEM const float *vec, // Real, vector, length sum Td[dimid]
+        GLOBAL_MEM const float2 *indata,
+        GLOBAL_MEM       float2 *outdata,
+        const int direction)
+    {
+    const unsigned int gid=get_global_id(0); 
+    
+    // the index on the Kd grid, see cTensorCopy
+    unsigned int curr_res = gid;
+    unsigned int new_idx = 0;
+    unsigned int group;
+    for (unsigned int dimid =0; dimid < dim; dimid ++){
+        group = (float)curr_res*invNd[dimid];
+        new_idx += group * Kd_elements[dimid];
+        curr_res = curr_res - group * Nd_elements[dimid];
+    };
+    
+    // the scaling factor, see cTensorMultiply
+    unsigned int Td_indx_shift = 0;
+    float mul = 1.0; 
+    unsigned int res = gid; 
+    for (unsigned int dimid = 0; dimid < Tdims; dimid ++){
+        group = (float)res * invTd_elements[dimid]; 
+        res = res - group * Td_elements[dimid];
+        mul = mul * vec[group + Td_indx_shift];
+        Td_indx_shift = Td_indx_shift + Td[dimid];
+    };
+    
+    if (direction == 1) {
+        for (unsigned int bat=0; bat < batch; bat ++ )
+        {
+            float2 tmp = indata[gid*batch+bat];
+            tmp.x = tmp.x * mul;
+            tmp.y = tmp.y * mul;
+            outdata[new_idx*batch+bat] = tmp;
+        };   
+    };
+    
+    if (direction == -1) {
+        for (unsigned int bat=0; bat < batch; bat ++ )
+        {
+            float2 tmp = indata[new_idx*batch+bat];
+            tmp.x = tmp.x * mul;
+            tmp.y = tmp.y * mul;
+            outdata[gid*batch+bat] = tmp;
+        };   
+    };
+    };
+    """
+    return code_text  
+
+def cTVRhs():
+    """
+    Return the kernel source of cTVRhs, the right hand side of the split-Bregman L1TVOLS. 
+    rhs = mu*AHyk + LMBD*sum_pp Diff_t(dd[pp] - bb[pp]), where dd, bb and dt_indx are stacked along the first axis. 
+    """
+    code_text ="""
+        KERNEL void cTVRhs(
+                const unsigned int dim, 
+                const unsigned int prodNd, 
+                const float mu, 
+                const float LMBD, 
+                GLOBAL_MEM const int *dt_indx, // dim * prodNd
+                GLOBAL_MEM const float2 *AHyk, 
+                GLOBAL_MEM const float2 *dd, // dim * prodNd
+                GLOBAL_MEM const float2 *bb, // dim * prodNd
+                GLOBAL_MEM float2 *rhs)
+        { 
+        const unsigned int gid = get_global_id(0);
+        float2 u = AHyk[gid];
+        u.x = mu*u.x;
+        u.y = mu*u.y;
+        for (unsigned int pp = 0; pp < dim; pp ++)
+        {
+        const unsigned int shift = pp*prodNd;
+        const unsigned int ind = shift + dt_indx[shift + gid];
+        u.x += LMBD*((dd[ind].x - bb[ind].x) - (dd[shift + gid].x - bb[shift + gid].x));
+        u.y += LMBD*((dd[ind].y - bb[ind].y) - (dd[shift + gid].y - bb[shift + gid].y));
+        };
+        rhs[gid] = u;
+        };
+        """
+    return code_text
+
+def cTVShrink():
+    """
+    Return the kernel source of cTVShrink, the isotropic shrinkage and Bregman updates of L1TVOLS. 
+    The image gradient zz = Diff(x) is computed on the fly, and dd and bb are updated in place. 
+    """
+    code_text ="""
+        KERNEL void cTVShrink(
+                const unsigned int dim, 
+                const unsigned int prodNd, 
+                const float threshold, 
+                GLOBAL_MEM const int *d_indx, // dim * prodNd
+                GLOBAL_MEM const float2 *x, 
+                GLOBAL_MEM float2 *bb, // dim * prodNd
+                GLOBAL_MEM float2 *dd) // dim * prodNd
+        { 
+        // s = |Diff(x) + bb|; r = max(s - threshold, 0)/s; dd = (Diff(x) + bb)*r; bb = Diff(x) + bb - dd
+        const unsigned int gid = get_global_id(0);
+        const float2 xg = x[gid];
+        float s = 0.0f;
+        for (unsigned int pp = 0; pp < dim; pp ++)
+        {
+        const unsigned int shift = pp*prodNd;
+        float2 st = x[d_indx[shift + gid]];
+        st.x += bb[shift + gid].x - xg.x;
+        st.y += bb[shift + gid].y - xg.y;
+        s += st.x*st.x + st.y*st.y;
+        };
+        s = sqrt(s) + 1e-6f;
+        const float r = (s > threshold)*(s - threshold)/s;
+        for (unsigned int pp = 0; pp < dim; pp ++)
+        {
+        const unsigned int shift = pp*prodNd;
+        float2 st = x[d_indx[shift + gid]];
+        st.x += bb[shift + gid].x - xg.x;
+        st.y += bb[shift + gid].y - xg.y;
+        float2 d;
+        d.x = st.x*r;
+        d.y = st.y*r;
+        dd[shift + gid] = d;
+        st.x -= d.x;
+        st.y -= d.y;
+        bb[shift + gid] = st;
+        };
+        };
+        """
+    return code_text
+
+def cAXPBYPCZ():
+    """
+    Return the kernel source of cAXPBYPCZ, the linear combination out = a*x + b*y + c*z of the first-order solvers. 
+    out may be one of the inputs. 
+    """
+    code_text ="""
+        KERNEL void cAXPBYPCZ(
+                const float a, 
+                GLOBAL_MEM const float2 *x, 
+                const float b, 
+                GLOBAL_MEM const float2 *y, 
+                const float c, 
+                GLOBAL_MEM const float2 *z, 
+                GLOBAL_MEM float2 *out)
+        { 
+        const unsigned int gid = get_global_id(0);
+        const float2 xg = x[gid];
+        const float2 yg = y[gid];
+        const float2 zg = z[gid];
+        float2 u;
+        u.x = a*xg.x + b*yg.x + c*zg.x;
+        u.y = a*xg.y + b*yg.y + c*zg.y;
+        out[gid] = u;
+        };
+        """
+    return code_text
+
+def cSoftThreshold():
+    """
+    Return the kernel source of cSoftThreshold, the complex soft-thresholding x = x*max(|x| - threshold, 0)/|x| in place. 
+    """
+    code_text ="""
+        KERNEL void cSoftThreshold(
+                const float threshold, 
+                GLOBAL_MEM float2 *x)
+        { 
+        const unsigned int gid = get_global_id(0);
+        float2 xg = x[gid];
+        const float s = sqrt(xg.x*xg.x + xg.y*xg.y);
+        const float r = (s > threshold) ? (s - threshold)/s : 0.0f;
+        xg.x *= r;
+        xg.y *= r;
+        x[gid] = xg;
+        };
+        """
+    return code_text
+
+def cTVProxDual():
+    """
+    Return the kernel source of cTVProxDual, the projected gradient step of the dual problem of the TV proximal operator. 
+    p = P(q + step*Diff(x)), where P projects the isotropic |p| of each pixel onto the unit ball. 
+    x is an Nd + (batch, ) image, and p and q are stacked along the first axis (dim * prodNd * batch). 
+    """
+    code_text ="""
+        KERNEL void cTVProxDual(
+                const unsigned int batch, 
+                const unsigned int dim, 
+                const unsigned int prodNd, 
+                const float step, 
+                GLOBAL_MEM const int *d_indx, // dim * prodNd
+                GLOBAL_MEM const float2 *x, 
+                GLOBAL_MEM const float2 *q, 
+                GLOBAL_MEM float2 *p)
+        { 
+        const unsigned int gid = get_global_id(0);
+        const unsigned int pixel = gid / batch;
+        const unsigned int c = gid % batch;
+        const unsigned int size = prodNd*batch;
+        const float2 xg = x[gid];
+        float s = 0.0f;
+        for (unsigned int pp = 0; pp < dim; pp ++)
+        {
+        const float2 xn = x[d_indx[pp*prodNd + pixel]*batch + c];
+        float2 u = q[pp*size + gid];
+        u.x += step*(xn.x - xg.x);
+        u.y += step*(xn.y - xg.y);
+        p[pp*size + gid] = u;
+        s += u.x*u.x + u.y*u.y;
+        };
+        const float r = 1.0f/fmax(sqrt(s), 1.0f);
+        for (unsigned int pp = 0; pp < dim; pp ++)
+        {
+        float2 u = p[pp*size + gid];
+        u.x *= r;
+        u.y *= r;
+        p[pp*size + gid] = u;
+        };
+        };
+        """
+    return code_text
+
+def cTVProxPrimal():
+    """
+    Return the kernel source of cTVProxPrimal, the primal image of the TV proximal operator. 
+    x = v - threshold*sum_pp Diff_t(p[pp]), where x and v are Nd + (batch, ) images and p is stacked along the first axis. 
+    """
+    code_text ="""
+        KERNEL void cTVProxPrimal(
+                const unsigned int batch, 
+                const unsigned int dim, 
+                const unsigned int prodNd, 
+                const float threshold, 
+                GLOBAL_MEM const int *dt_indx, // dim * prodNd
+                GLOBAL_MEM const float2 *v, 
+                GLOBAL_MEM const float2 *p, 
+                GLOBAL_MEM float2 *x)
+        { 
+        const unsigned int gid = get_global_id(0);
+        const unsigned int pixel = gid / batch;
+        const unsigned int c = gid % batch;
+        const unsigned int size = prodNd*batch;
+        float2 u = v[gid];
+        for (unsigned int pp = 0; pp < dim; pp ++)
+        {
+        const float2 pn = p[pp*size + dt_indx[pp*prodNd + pixel]*batch + c];
+        const float2 pg = p[pp*size + gid];
+        u.x -= threshold*(pn.x - pg.x);
+        u.y -= threshold*(pn.y - pg.y);
+        };
+        x[gid] = u;
+        };
+        """
+    return code_text
+
 def cCopy():
     """
     Return the kernel source for cCopy
@@ -379,7 +733,7 @@ def cHadamard():
               w.y = u.x * v.y - u.y * v.x; 
               w.x = w.x/(float)Reps;
               w.y = w.y/(float)Reps;
-            partialSums[t] = w;        //partialSums[t] + y;
+            partialSums[t] = partialSums[t] + w;
         }
         
         LOCAL_BARRIER; 
@@ -485,7 +839,9 @@ def cHadamard():
 def cSpmvh():
     """
     Return the cSpmvh related kernel source. 
-    Only pELL_spmvh_mCoil is provided for Spmvh.
+    Only pELL_spmvh_mCoil is provided for Spmvh. 
+    cMergeComplex merges the real and imaginary arrays of pELL_spmvh_mCoil. 
+    cCSR_spmvh_mCoil is the atomic-free gridding, which gathers the samples by the conjugate transpose in CSR format.
     NUFFT_hsa_legacy reuse the cCSR_spmv() function, which double the storage. 
     """
     
@@ -560,6 +916,49 @@ def cSpmvh():
         
         };    // End of pELL_spmv_mCoil  
         
+        KERNEL void cCSR_spmvh_mCoil(
+        const    unsigned int    Reps,             // number of coils
+        const    unsigned int    numRow,        // number of grid points (rows of the conjugate transpose)
+        GLOBAL_MEM const unsigned int *rowDelimiters, 
+        GLOBAL_MEM const unsigned int *cols,    // the contributing samples
+        GLOBAL_MEM const float2 *val,    // the conjugate interpolation weights
+        GLOBAL_MEM const float2 *input,    // y
+        GLOBAL_MEM float2 *out)    // k
+        {
+        // Gridding by gathering: one work-item per grid point and coil, without atomic operations
+        const unsigned int gid = get_global_id(0); 
+        const unsigned int myRow = gid / Reps;
+        const unsigned int nc = gid - myRow * Reps;
+        if (myRow < numRow)
+        {
+        float2 u;
+        u.x = 0.0;
+        u.y = 0.0;
+        const unsigned int vecStart = rowDelimiters[myRow];
+        const unsigned int vecEnd = rowDelimiters[myRow+1];
+        for (unsigned int j = vecStart; j < vecEnd; j ++)
+        {
+        const float2 spdata = val[j];
+        const float2 ydata = input[cols[j]*Reps + nc];
+        u.x +=  spdata.x*ydata.x - spdata.y*ydata.y;
+        u.y +=  spdata.y*ydata.x + spdata.x*ydata.y;
+        };
+        out[gid] = u;
+        };
+        };    // End of cCSR_spmvh_mCoil
+        
+        KERNEL void cMergeComplex(
+        GLOBAL_MEM const float *kx, 
+        GLOBAL_MEM const float *ky,
+        GLOBAL_MEM float2 *k)
+        {
+        // Merge the real and imaginary parts accumulated by pELL_spmvh_mCoil: k = kx + 1j*ky
+        const unsigned int gid = get_global_id(0); 
+        float2 tmp;
+        tmp.x = kx[gid];
+        tmp.y = ky[gid];
+        k[gid] = tmp;
+        };
         """
     return R
 
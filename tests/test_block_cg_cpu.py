@@ -0,0 +1,38 @@
+"""
+Test the batched conjugate gradient ('pcg') of NUFFT_cpu with per-channel scalars
+"""
+import numpy
+
+def test_block_cg():
+    from pynufft import NUFFT_cpu
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    batch = 3
+    rng = numpy.random.RandomState(0)
+    om = numpy.concatenate((rng.uniform(-numpy.pi, numpy.pi, (600, 2)), rng.uniform(-numpy.pi/4, numpy.pi/4, (1400, 2))))
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd, batch = batch)
+    x = rng.randn(*(Nd + (batch, ))) + 1.0j*rng.randn(*(Nd + (batch, )))
+    x[..., 1] = 1.0 # a smooth channel converges earlier
+    x[..., 2] *= 1e3 # a channel with a different scale
+    y = NufftObj.forward(x)
+    
+    for kwargs in ({}, {'toeplitz': True}, {'precond': 'circulant'}):
+        # the channels are independent systems
+        x1 = NufftObj.solve(y, 'pcg', maxiter = 10, **kwargs)
+        x2 = NufftObj.solve(y, 'pcg', maxiter = 10, per_channel = True, **kwargs)
+        for bat in range(0, batch):
+            assert numpy.linalg.norm(x1[..., bat] - x2[..., bat])/numpy.linalg.norm(x2[..., bat]) < 1e-4
+    
+    # the converged channels are frozen
+    result = NufftObj.solve(y, 'pcg', maxiter = 100, tol = 1e-3, full_output = True)
+    channels = NufftObj.solve(y, 'pcg', maxiter = 100, tol = 1e-3, per_channel = True, full_output = True)
+    assert result.niter == channels.niter
+    assert result.residuals[-1] < 1e-3
+    for bat in range(0, batch):
+        assert numpy.linalg.norm(result.x[..., bat] - channels.x[..., bat])/numpy.linalg.norm(channels.x[..., bat]) < 1e-4
+    assert channels.info['channels'][1].niter < channels.niter
+
+if __name__ == '__main__':
+    test_block_cg()
@@ -0,0 +1,42 @@
+"""
+Test the batched conjugate gradient of NUFFT_hsa with per-channel alpha and beta on the OpenCL backend
+"""
+import numpy
+
+def test_block_cg_hsa():
+    from pynufft import NUFFT_hsa
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    batch = 3
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (1000, 2))
+    NufftObj = NUFFT_hsa('ocl', 0, 0)
+    NufftObj.plan(om, Nd, Kd, Jd, batch = batch, gather = True)
+    single = NUFFT_hsa('ocl', 0, 0)
+    single.plan(om, Nd, Kd, Jd, gather = True)
+    
+    x = (rng.randn(*(Nd + (batch, ))) + 1.0j*rng.randn(*(Nd + (batch, )))).astype(numpy.complex64)
+    x[..., 1] = 1.0 # a smooth channel converges earlier
+    x[..., 2] *= 1e3 # a channel with a different scale
+    gy = NufftObj.forward(NufftObj.to_device(x))
+    y = gy.get()
+    
+    # the channels are independent systems
+    x1 = NufftObj.solve(gy, 'cg', maxiter = 10).get()
+    for bat in range(0, batch):
+        x2 = single.solve(single.to_device(numpy.ascontiguousarray(y[:, bat])), 'cg', maxiter = 10).get()
+        assert numpy.linalg.norm(x1[..., bat] - x2)/numpy.linalg.norm(x2) < 1e-3
+    
+    # each channel is frozen at its own tolerance
+    result = NufftObj.solve(gy, 'cg', maxiter = 100, tol = 1e-2, full_output = True)
+    assert result.residuals[-1] < 1e-2
+    x1 = result.x.get()
+    for bat in range(0, batch):
+        x2 = single.solve(single.to_device(numpy.ascontiguousarray(y[:, bat])), 'cg', maxiter = 100, tol = 1e-2, full_output = True)
+        assert x2.niter <= result.niter
+        assert numpy.linalg.norm(x1[..., bat] - x2.x.get())/numpy.linalg.norm(x2.x.get()) < 1e-3
+
+if __name__ == '__main__':
+    test_block_cg_hsa()
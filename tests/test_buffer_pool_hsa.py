@@ -0,0 +1,51 @@
+"""
+Test the device buffer pool of NUFFT_hsa on the OpenCL backend (e.g. pocl on CPU)
+"""
+import numpy
+
+def test_buffer_pool():
+    from pynufft import NUFFT_cpu, NUFFT_hsa
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    om = numpy.random.RandomState(0).uniform(-numpy.pi, numpy.pi, (300, 2))
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd)
+    A = NUFFT_hsa('ocl', 0, 0)
+    A.plan(om, Nd, Kd, Jd)
+    
+    x = numpy.random.RandomState(1).randn(*Nd).astype(numpy.complex64)
+    gx = A.to_device(x)
+    y0 = NufftObj.forward(x)
+    
+    gy = A.thr.array(A.multi_M, dtype = A.dtype)
+    gx2 = A.thr.array(A.multi_Nd, dtype = A.dtype)
+    A.forward(gx, out = gy)
+    A.adjoint(gy, out = gx2)
+    A.selfadjoint(gx, out = gx2)
+    buffers = dict(A.buffers)
+    
+    for pp in range(3): # steady state: the pool and the outputs are reused
+        assert A.forward(gx, out = gy) is gy
+        assert numpy.linalg.norm(gy.get() - y0)/numpy.linalg.norm(y0) < 1e-4
+        assert A.adjoint(gy, out = gx2) is gx2
+        assert A.selfadjoint(gx, out = gx2) is gx2
+        assert A.buffers.keys() == buffers.keys()
+        for key in buffers.keys():
+            assert A.buffers[key] is buffers[key]
+    
+    # the default outputs are new arrays, identical to the pooled results
+    assert numpy.allclose(A.forward(gx).get(), gy.get(), atol = 1e-5)
+    assert numpy.allclose(A.xx2k(A.x2xx(gx)).get(), A.xx2k(A.x2xx(gx), out = A.thr.array(A.multi_Kd, dtype = A.dtype)).get(), atol = 1e-4)
+    assert A.forward(gx) is not A.forward(gx)
+    
+    # in-place scaling and rescaling
+    gxx = A.x2xx(gx)
+    gx3 = A.thr.to_device(x)
+    assert A.x2xx(gx3, out = gx3) is gx3
+    assert numpy.allclose(gx3.get(), gxx.get(), atol = 1e-5)
+    assert numpy.allclose(A.xx2x(gx3, out = gx3).get(), A.xx2x(gxx).get(), atol = 1e-5)
+
+if __name__ == '__main__':
+    test_buffer_pool()
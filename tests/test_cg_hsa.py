@@ -0,0 +1,46 @@
+"""
+Test the device-resident conjugate gradient method of NUFFT_hsa on the OpenCL backend
+"""
+import numpy
+
+def test_cg_hsa():
+    from pynufft import NUFFT_hsa
+    from pynufft.linalg.solve_hsa import _cg
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (400, 2))
+    
+    NufftObj = NUFFT_hsa('ocl', 0, 0)
+    NufftObj.plan(om, Nd, Kd, Jd, gather = True) # deterministic and Hermitian A^H A
+    y = (rng.randn(400) + 1.0j*rng.randn(400)).astype(numpy.complex64)
+    gy = NufftObj.to_device(y)
+    
+    # the same iterations on the host, with the operator on the device
+    def A(k):
+        return NufftObj.y2k(NufftObj.k2y(NufftObj.to_device(k))).get().astype(numpy.complex128)
+    b = NufftObj.y2k(gy).get().astype(numpy.complex128)
+    x = b.copy()
+    r = b - A(x)
+    p = r.copy()
+    rsold = numpy.vdot(r, r)
+    for pp in range(0, 10):
+        Ap = A(p)
+        alpha = rsold/numpy.vdot(p, Ap)
+        x += alpha*p
+        r -= alpha*Ap
+        rsnew = numpy.vdot(r, r)
+        p = r + rsnew/rsold*p
+        rsold = rsnew
+    
+    k = _cg(NufftObj, gy, 10).get()
+    assert numpy.all(numpy.isfinite(k))
+    assert numpy.linalg.norm(k - x)/numpy.linalg.norm(x) < 1e-3
+    
+    x2 = NufftObj.solve(gy, 'cg', maxiter = 5)
+    assert x2.shape == Nd
+
+if __name__ == '__main__':
+    test_cg_hsa()
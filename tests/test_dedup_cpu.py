@@ -0,0 +1,90 @@
+"""
+Test the deduplication of coincident samples in NUFFT_cpu
+"""
+import numpy
+
+def radial_trajectory(n_spokes, n_readout):
+    # every spoke passes through the k-space center
+    r = numpy.linspace(-numpy.pi, numpy.pi, n_readout, endpoint = False)
+    theta = numpy.arange(0, n_spokes)*numpy.pi/n_spokes
+    om = numpy.stack((numpy.outer(numpy.cos(theta), r).ravel(), 
+                      numpy.outer(numpy.sin(theta), r).ravel()), axis = 1)
+    return om
+
+def test_dedup():
+    from pynufft import NUFFT_cpu
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    om = radial_trajectory(12, 32)
+    M = om.shape[0]
+    
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd, dedup = True)
+    NufftRef = NUFFT_cpu()
+    NufftRef.plan(om, Nd, Kd, Jd)
+    
+    assert NufftObj.st['M'] == M
+    assert NufftObj.multi_M == (M, )
+    assert NufftObj.sp.shape[0] < M # the center is stored once
+    
+    rng = numpy.random.RandomState(0)
+    x = rng.randn(*Nd) + 1.0j*rng.randn(*Nd)
+    y = rng.randn(M) + 1.0j*rng.randn(M)
+    
+    y1 = NufftObj.forward(x)
+    y0 = NufftRef.forward(x)
+    assert y1.shape == (M, )
+    assert numpy.linalg.norm(y1 - y0)/numpy.linalg.norm(y0) < 1e-5
+    
+    x1 = NufftObj.adjoint(y)
+    x0 = NufftRef.adjoint(y)
+    assert numpy.linalg.norm(x1 - x0)/numpy.linalg.norm(x0) < 1e-5
+    
+    x1 = NufftObj.solve(y0, 'cg', maxiter = 10)
+    x0 = NufftRef.solve(y0, 'cg', maxiter = 10)
+    assert numpy.linalg.norm(x1 - x0)/numpy.linalg.norm(x0) < 1e-3
+
+def test_dedup_batch_ongrid_subset():
+    from pynufft import NUFFT_cpu
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    om = radial_trajectory(12, 32) # the spokes along the axes are on the grid
+    M = om.shape[0]
+    batch = 3
+    
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd, batch = batch, ongrid = True, dedup = True)
+    NufftRef = NUFFT_cpu()
+    NufftRef.plan(om, Nd, Kd, Jd, batch = batch)
+    assert NufftObj.ongrid is not None
+    
+    rng = numpy.random.RandomState(1)
+    x = rng.randn(*(Nd + (batch, ))) + 1.0j*rng.randn(*(Nd + (batch, )))
+    y = rng.randn(M, batch) + 1.0j*rng.randn(M, batch)
+    
+    y0 = NufftRef.forward(x)
+    y1 = NufftObj.forward(x)
+    assert y1.shape == (M, batch)
+    assert numpy.linalg.norm(y1 - y0)/numpy.linalg.norm(y0) < 1e-5
+    x0 = NufftRef.adjoint(y)
+    x1 = NufftObj.adjoint(y)
+    assert numpy.linalg.norm(x1 - x0)/numpy.linalg.norm(x0) < 1e-5
+    
+    indices = numpy.arange(0, M)[::5]
+    sub = NufftObj.subset(indices)
+    subref = NufftRef.subset(indices)
+    assert sub.sp.shape[0] <= indices.size
+    y0 = subref.forward(x)
+    y1 = sub.forward(x)
+    assert numpy.linalg.norm(y1 - y0)/numpy.linalg.norm(y0) < 1e-5
+    x0 = subref.adjoint(y[indices])
+    x1 = sub.adjoint(y[indices])
+    assert numpy.linalg.norm(x1 - x0)/numpy.linalg.norm(x0) < 1e-5
+
+if __name__ == '__main__':
+    test_dedup()
+    test_dedup_batch_ongrid_subset()
@@ -0,0 +1,95 @@
+"""
+Test the proximal solvers 'fista' and 'admm' of NUFFT_cpu
+"""
+import numpy
+
+def _problem():
+    from pynufft import NUFFT_cpu
+    Nd = (32, 32)
+    Kd = (64, 64)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(1)
+    om = rng.uniform(-numpy.pi, numpy.pi, (2000, 2))
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd)
+    x = numpy.zeros(Nd, dtype = numpy.complex64)
+    x[8:24, 8:24] = 1
+    x[12:20, 12:20] = 2
+    y = NufftObj.forward(x)
+    y += 0.01*numpy.abs(y).max()*(rng.randn(2000) + 1.0j*rng.randn(2000))
+    return NufftObj, x, y
+
+def _tv_objective(NufftObj, x, y, lamb):
+    fidelity = 0.5*numpy.linalg.norm(NufftObj.forward(x) - y)**2/NufftObj.Kdprod # adjoint() is A^H/Kdprod
+    tv = numpy.sum(numpy.sqrt(sum(numpy.abs(numpy.roll(x, 1, axis) - x)**2 for axis in (0, 1))))
+    return fidelity + lamb*tv
+
+def test_prox():
+    from pynufft.linalg import solve_cpu
+    rng = numpy.random.RandomState(0)
+    x = rng.randn(16, 16) + 1.0j*rng.randn(16, 16)
+    
+    z = solve_cpu.prox_l1(x.copy(), 1.0)
+    s = numpy.abs(x)
+    assert numpy.allclose(numpy.abs(z), numpy.maximum(s - 1.0, 0))
+    assert numpy.allclose(z[s > 1]/numpy.abs(z[s > 1]), x[s > 1]/s[s > 1])
+    assert numpy.allclose(solve_cpu.prox_l2(x.copy(), 1.0), x/2)
+    
+    # the TV proximal operator decreases the objective and keeps the mean
+    def objective(z, threshold):
+        return 0.5*numpy.linalg.norm(z - x)**2 + threshold*numpy.sum(numpy.sqrt(sum(numpy.abs(numpy.roll(z, 1, axis) - z)**2 for axis in (0, 1))))
+    z = solve_cpu.prox_tv(x.copy(), 0.2)
+    assert objective(z, 0.2) < 0.9*objective(x, 0.2)
+    assert numpy.allclose(numpy.mean(z), numpy.mean(x))
+    z_exact = solve_cpu.prox_tv(x.copy(), 0.2, maxiter = 1000, tol = 1e-8)
+    assert objective(z, 0.2) < 1.001*objective(z_exact, 0.2)
+
+def test_power_iteration():
+    from pynufft.linalg import solve_cpu
+    NufftObj, x, y = _problem()
+    AHA = solve_cpu._normal_operator(NufftObj)
+    L = solve_cpu._power_iteration(AHA, NufftObj.st['Nd'], numpy.complex64, maxiter = 200, tol = 1e-6)
+    rng = numpy.random.RandomState(2)
+    for pp in range(0, 5):
+        u = rng.randn(32, 32) + 1.0j*rng.randn(32, 32)
+        assert numpy.real(numpy.vdot(u, AHA(u)))/numpy.vdot(u, u).real <= L*1.001
+    # the Toeplitz operator has the same norm
+    LT = solve_cpu._power_iteration(solve_cpu._normal_operator(NufftObj, toeplitz = True), NufftObj.st['Nd'], numpy.complex64, maxiter = 200, tol = 1e-6)
+    assert abs(LT - L) < 1e-3*L
+
+def test_fista_admm():
+    NufftObj, x, y = _problem()
+    
+    # without regularization, both solve the least squares problem
+    x_ls = NufftObj.solve(y, 'pcg', maxiter = 200)
+    for solver in ('fista', 'admm'):
+        x2 = NufftObj.solve(y, solver, maxiter = 200, prox = None)
+        assert numpy.linalg.norm(x2 - x_ls)/numpy.linalg.norm(x_ls) < 2e-2
+    
+    # TV: both converge to the same minimum
+    lamb = 1e-2
+    results = {}
+    for solver in ('fista', 'admm'):
+        result = NufftObj.solve(y, solver, maxiter = 100, prox = 'tv', lamb = lamb, full_output = True)
+        assert result.niter == 100
+        assert result.info['L'] > 0
+        results[solver] = _tv_objective(NufftObj, result.x, y, lamb)
+        assert numpy.linalg.norm(result.x - x)/numpy.linalg.norm(x) < numpy.linalg.norm(x_ls - x)/numpy.linalg.norm(x)
+    assert abs(results['fista'] - results['admm']) < 1e-2*results['admm']
+    
+    # the given L is used, tol exits early, and the Toeplitz operator gives the same iterates
+    result = NufftObj.solve(y, 'fista', maxiter = 100, prox = 'l1', lamb = 1e-3, L = 2.0, tol = 1e-3, full_output = True)
+    assert result.info['L'] == 2.0
+    assert result.niter < 100
+    x3 = NufftObj.solve(y, 'fista', maxiter = 20, prox = 'l1', lamb = 1e-3, L = 2.0)
+    x4 = NufftObj.solve(y, 'fista', maxiter = 20, prox = 'l1', lamb = 1e-3, L = 2.0, toeplitz = True)
+    assert numpy.linalg.norm(x4 - x3)/numpy.linalg.norm(x3) < 1e-3
+    
+    # a user-defined proximal operator: the projection onto the real images
+    x5 = NufftObj.solve(y, 'admm', maxiter = 20, prox = lambda x, threshold: x.real.astype(x.dtype))
+    assert numpy.allclose(x5.imag, 0)
+
+if __name__ == '__main__':
+    test_prox()
+    test_power_iteration()
+    test_fista_admm()
@@ -0,0 +1,44 @@
+"""
+Test the proximal solvers 'fista' and 'admm' of NUFFT_hsa on the OpenCL backend
+"""
+import numpy
+
+def test_fista_admm_hsa():
+    from pynufft import NUFFT_cpu, NUFFT_hsa
+    from pynufft.linalg import solve_hsa
+    
+    Nd = (32, 32)
+    Kd = (64, 64)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(1)
+    om = rng.uniform(-numpy.pi, numpy.pi, (2000, 2))
+    NufftObj = NUFFT_hsa('ocl', 0, 0)
+    NufftObj.plan(om, Nd, Kd, Jd, gather = True)
+    NufftCPU = NUFFT_cpu()
+    NufftCPU.plan(om, Nd, Kd, Jd)
+    x = numpy.zeros(Nd, dtype = numpy.complex64)
+    x[8:24, 8:24] = 1
+    x[12:20, 12:20] = 2
+    y = NufftCPU.forward(x)
+    y += 0.01*numpy.abs(y).max()*(rng.randn(2000) + 1.0j*rng.randn(2000))
+    y = y.astype(numpy.complex64)
+    gy = NufftObj.to_device(y)
+    
+    for solver, kwargs in (('fista', {'prox': 'l1', 'lamb': 1e-3}), 
+                           ('fista', {'prox': 'tv', 'lamb': 1e-2}), 
+                           ('admm', {'prox': 'tv', 'lamb': 1e-2}), 
+                           ('admm', {'prox': 'l2', 'lamb': 1e-2})):
+        x_cpu = NufftCPU.solve(y, solver, maxiter = 30, **kwargs)
+        result = NufftObj.solve(gy, solver, maxiter = 30, full_output = True, **kwargs)
+        x_hsa = result.x.get()
+        assert result.niter == 30
+        assert result.info['L'] == NufftObj.operator_norm() # the same result interface as NUFFT_cpu
+        assert numpy.linalg.norm(x_hsa - x_cpu)/numpy.linalg.norm(x_cpu) < 1e-2
+    
+    # the soft-thresholding kernel
+    u = (rng.randn(64) + 1.0j*rng.randn(64)).astype(numpy.complex64)
+    gu = solve_hsa.prox_l1(NufftObj, NufftObj.to_device(u), 1.0)
+    assert numpy.allclose(numpy.abs(gu.get()), numpy.maximum(numpy.abs(u) - 1.0, 0), atol = 1e-5)
+
+if __name__ == '__main__':
+    test_fista_admm_hsa()
@@ -0,0 +1,90 @@
+"""
+Test the fused kernels of NUFFT_hsa on the OpenCL backend (e.g. pocl on CPU)
+"""
+import numpy
+
+def test_fused_stages():
+    from pynufft import NUFFT_hsa
+    
+    rng = numpy.random.RandomState(0)
+    for Nd, Kd, Jd, batch in [((16, 16), (32, 32), (6, 6), None), 
+                              ((8, 10, 12), (16, 20, 24), (4, 5, 6), None), 
+                              ((16, 16), (32, 32), (6, 6), 3)]:
+        om = rng.uniform(-numpy.pi, numpy.pi, (100, len(Nd)))
+        A = NUFFT_hsa('ocl', 0, 0)
+        A.plan(om, Nd, Kd, Jd, batch = batch)
+        x = (rng.randn(*A.multi_Nd) + 1.0j*rng.randn(*A.multi_Nd)).astype(numpy.complex64)
+        gx = A.to_device(x)
+        
+        k0 = A.xx2k(A.x2xx(gx)).get()
+        k1 = A.x2k(gx).get()
+        assert numpy.linalg.norm(k1 - k0)/numpy.linalg.norm(k0) < 1e-5
+        
+        x0 = A.xx2x(A.k2xx(A.to_device(k0))).get()
+        x1 = A.k2x(A.to_device(k0)).get()
+        assert numpy.linalg.norm(x1 - x0)/numpy.linalg.norm(x0) < 1e-5
+        
+        if batch is not None: # coil multiply and reduce
+            coil = (rng.randn(*A.multi_Nd) + 1.0j*rng.randn(*A.multi_Nd)).astype(numpy.complex64)
+            A.set_sense(coil)
+            s = A.x2s(gx).get()
+            assert numpy.allclose(s, numpy.mean(coil.conj()*x, axis = -1), atol = 1e-5)
+            assert numpy.allclose(gx.get(), x) # x2s leaves the input unchanged
+            x2 = A.s2x(A.to_device(x[..., 0])).get()
+            assert numpy.allclose(x2, coil*x[..., 0:1], atol = 1e-5)
+
+def test_fused_tv():
+    from pynufft import NUFFT_hsa, helper
+    
+    Nd = (12, 10)
+    Kd = (24, 20)
+    Jd = (4, 4)
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (100, 2))
+    A = NUFFT_hsa('ocl', 0, 0)
+    A.plan(om, Nd, Kd, Jd)
+    ndims = len(Nd)
+    
+    def crandn(*shape):
+        return (rng.randn(*shape) + 1.0j*rng.randn(*shape)).astype(numpy.complex64)
+    x = crandn(*Nd)
+    AHyk = crandn(*Nd)
+    dd = crandn(ndims, *Nd)
+    bb = crandn(ndims, *Nd)
+    mu = 1.0
+    LMBD = 0.5
+    threshold = 1.0/LMBD
+    d_indx, dt_indx = helper.indxmap_diff(Nd)
+    
+    # host references of the unfused kernels
+    rhs0 = mu*AHyk
+    for pp in range(0, ndims):
+        diff = (dd[pp] - bb[pp]).ravel()
+        rhs0 += LMBD*(diff[dt_indx[pp]] - diff).reshape(Nd)
+    zz = numpy.stack([(x.ravel()[d_indx[pp]] - x.ravel()).reshape(Nd) for pp in range(0, ndims)])
+    st = zz + bb
+    s = numpy.sqrt(numpy.sum(abs(st)**2, axis = 0)) + 1e-6
+    r = (s > threshold)*(s - threshold)/s
+    dd0 = st*r
+    bb0 = bb + zz - dd0
+    
+    g_dd = A.thr.to_device(dd)
+    g_bb = A.thr.to_device(bb)
+    g_rhs = A.thr.array(Nd, dtype = numpy.complex64)
+    A.prg.cTVRhs(numpy.uint32(ndims), numpy.uint32(A.Ndprod), numpy.float32(mu), numpy.float32(LMBD), 
+                 A.thr.to_device(numpy.stack(dt_indx)), A.thr.to_device(AHyk), g_dd, g_bb, g_rhs, 
+                 local_size = None, global_size = int(A.Ndprod))
+    assert numpy.allclose(g_rhs.get(), rhs0, atol = 1e-5)
+    A.prg.cTVShrink(numpy.uint32(ndims), numpy.uint32(A.Ndprod), numpy.float32(threshold), 
+                    A.thr.to_device(numpy.stack(d_indx)), A.thr.to_device(x), g_bb, g_dd, 
+                    local_size = None, global_size = int(A.Ndprod))
+    assert numpy.allclose(g_dd.get(), dd0, atol = 1e-5)
+    assert numpy.allclose(g_bb.get(), bb0, atol = 1e-5)
+    
+    x2 = A.solve(A.to_device(crandn(100)), 'L1TVOLS', maxiter = 3, rho = 0.1).get()
+    assert x2.shape == Nd
+    assert numpy.all(numpy.isfinite(x2))
+
+if __name__ == '__main__':
+    test_fused_stages()
+    test_fused_tv()
@@ -0,0 +1,32 @@
+"""
+Test the atomic-free gridding (gather = True) of NUFFT_hsa on the OpenCL backend
+"""
+import numpy
+
+def test_gather_hsa():
+    from pynufft import NUFFT_cpu, NUFFT_hsa
+    
+    rng = numpy.random.RandomState(0)
+    for Nd, Kd, Jd, batch in [((16, 16), (32, 32), (6, 6), None), 
+                              ((8, 10, 12), (16, 20, 24), (4, 5, 6), None), 
+                              ((16, 16), (32, 32), (6, 6), 3)]:
+        om = rng.uniform(-numpy.pi, numpy.pi, (300, len(Nd)))
+        NufftObj = NUFFT_cpu()
+        NufftObj.plan(om, Nd, Kd, Jd, batch = batch)
+        A = NUFFT_hsa('ocl', 0, 0)
+        A.plan(om, Nd, Kd, Jd, batch = batch, gather = True)
+        
+        y = (rng.randn(*NufftObj.multi_M) + 1.0j*rng.randn(*NufftObj.multi_M)).astype(numpy.complex64)
+        gy = A.to_device(y)
+        
+        k0 = NufftObj.y2k(y)
+        k1 = A.y2k(gy).get()
+        assert numpy.linalg.norm(k1 - k0)/numpy.linalg.norm(k0) < 1e-4
+        assert numpy.array_equal(A.y2k(gy).get(), k1) # deterministic
+        
+        x0 = NufftObj.adjoint(y)
+        x1 = A.adjoint(gy).get()
+        assert numpy.linalg.norm(x1 - x0)/numpy.linalg.norm(x0) < 1e-4
+
+if __name__ == '__main__':
+    test_gather_hsa()
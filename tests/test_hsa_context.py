@@ -0,0 +1,74 @@
+"""
+Test the shared HSAContext of NUFFT_hsa on the OpenCL backend (e.g. pocl on CPU)
+"""
+import numpy
+
+def test_hsa_context():
+    import io
+    import contextlib
+    from pynufft import NUFFT_cpu, NUFFT_hsa
+    from pynufft.linalg.nufft_hsa import get_context, detect_api
+    
+    context = get_context('ocl', 0, 0)
+    assert get_context('ocl', 0, 0) is context
+    assert get_context() is get_context(detect_api(), 0, 0) # the default context is shared with the explicit API
+    
+    # the API of the default context is probed once per process
+    from pynufft.linalg import nufft_hsa
+    probes = []
+    detect = nufft_hsa.detect_api
+    nufft_hsa.detect_api = lambda: probes.append(1) or detect()
+    try:
+        assert get_context() is get_context()
+        assert NUFFT_hsa().context is get_context()
+    finally:
+        nufft_hsa.detect_api = detect
+    assert probes == []
+    
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        A = NUFFT_hsa('ocl', 0, 0)
+        B = NUFFT_hsa('ocl', 0, 0)
+    assert stdout.getvalue() == '' # quiet
+    assert A.context is B.context is context
+    assert A.prg is B.prg is context.prg # compiled once
+    assert A.thr is context.thr
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    om = numpy.random.RandomState(0).uniform(-numpy.pi, numpy.pi, (300, 2))
+    A.plan(om, Nd, Kd, Jd)
+    B.plan(om[:200], Nd, Kd, Jd)
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd)
+    
+    x = numpy.random.RandomState(1).randn(*Nd).astype(numpy.complex64)
+    y0 = NufftObj.forward(x)
+    y1 = A.forward(A.to_device(x)).get()
+    y2 = B.forward(B.to_device(x)).get()
+    assert numpy.linalg.norm(y1 - y0)/numpy.linalg.norm(y0) < 1e-4
+    assert numpy.linalg.norm(y2 - y0[:200])/numpy.linalg.norm(y0[:200]) < 1e-4
+
+def test_fft_cache():
+    from pynufft import NUFFT_hsa
+    from pynufft.linalg.nufft_hsa import prewarm
+    
+    Nd = (12, 20)
+    Kd = (24, 40)
+    Jd = (4, 4)
+    context = prewarm([(Kd, None), (Kd, 3)], 'ocl', 0, 0)
+    assert (Kd, (0, 1)) in context.ffts
+    assert (Kd + (3, ), (0, 1)) in context.ffts
+    
+    om = numpy.random.RandomState(0).uniform(-numpy.pi, numpy.pi, (100, 2))
+    A = NUFFT_hsa('ocl', 0, 0)
+    A.plan(om, Nd, Kd, Jd)
+    B = NUFFT_hsa('ocl', 0, 0)
+    B.plan(om, Nd, Kd, Jd, batch = 3)
+    assert A.fft is context.ffts[(Kd, (0, 1))] # no compilation at plan()
+    assert B.fft is context.ffts[(Kd + (3, ), (0, 1))]
+
+if __name__ == '__main__':
+    test_hsa_context()
+    test_fft_cache()
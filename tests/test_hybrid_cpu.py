@@ -0,0 +1,84 @@
+"""
+Test the hybrid Cartesian mode of NUFFT_cpu
+"""
+import numpy
+
+def test_hybrid():
+    from pynufft import NUFFT_cpu
+    
+    Nd = (16, 5, 12)
+    Kd = (32, 5, 24)
+    Jd = (6, 1, 6)
+    ft_axes = (0, 2)
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (150, 2))
+    M = om.shape[0]
+    
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd, ft_axes = ft_axes, hybrid = True)
+    NufftRef = NUFFT_cpu() # 2D NUFFT for each partition
+    NufftRef.plan(om, (16, 12), (32, 24), (6, 6))
+    
+    assert NufftObj.sp.shape == (M, 32*24) # no grid along the Cartesian axis
+    
+    x = rng.randn(*Nd) + 1.0j*rng.randn(*Nd)
+    y = rng.randn(M, Nd[1]) + 1.0j*rng.randn(M, Nd[1])
+    
+    y1 = NufftObj.forward(x)
+    assert y1.shape == (M, Nd[1])
+    x1 = NufftObj.adjoint(y)
+    assert x1.shape == Nd
+    for z in range(0, Nd[1]):
+        y0 = NufftRef.forward(x[:, z, :])
+        assert numpy.linalg.norm(y1[:, z] - y0)/numpy.linalg.norm(y0) < 1e-5
+        x0 = NufftRef.adjoint(y[:, z])
+        assert numpy.linalg.norm(x1[:, z, :] - x0)/numpy.linalg.norm(x0) < 1e-5
+    
+    x2 = NufftObj.selfadjoint(x)
+    x3 = NufftObj.adjoint(NufftObj.forward(x))
+    assert numpy.linalg.norm(x2 - x3)/numpy.linalg.norm(x3) < 1e-5
+    
+    x4 = NufftObj.solve(y1, 'cg', maxiter = 5)
+    assert x4.shape == Nd
+    # all the partitions are solved as one block-diagonal system
+    NufftBatch = NUFFT_cpu()
+    NufftBatch.plan(om, (16, 12), (32, 24), (6, 6), batch = Nd[1])
+    x0 = numpy.moveaxis(NufftBatch.solve(y1, 'cg', maxiter = 5), 2, 1)
+    assert numpy.linalg.norm(x4 - x0)/numpy.linalg.norm(x0) < 1e-4
+
+def test_hybrid_batch():
+    from pynufft import NUFFT_cpu
+    
+    Nd = (4, 16, 16)
+    Kd = (4, 32, 32)
+    Jd = (1, 6, 6)
+    batch = 3
+    rng = numpy.random.RandomState(1)
+    om = rng.uniform(-numpy.pi, numpy.pi, (120, 2))
+    M = om.shape[0]
+    
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd, ft_axes = (1, 2), batch = batch, hybrid = True)
+    NufftRef = NUFFT_cpu()
+    NufftRef.plan(om, Nd[1:], Kd[1:], Jd[1:], batch = batch)
+    
+    x = rng.randn(*(Nd + (batch, ))) + 1.0j*rng.randn(*(Nd + (batch, )))
+    y = rng.randn(M, Nd[0], batch) + 1.0j*rng.randn(M, Nd[0], batch)
+    
+    y1 = NufftObj.forward(x)
+    assert y1.shape == (M, Nd[0], batch)
+    x1 = NufftObj.adjoint(y)
+    assert x1.shape == Nd + (batch, )
+    for z in range(0, Nd[0]):
+        y0 = NufftRef.forward(x[z])
+        assert numpy.linalg.norm(y1[:, z] - y0)/numpy.linalg.norm(y0) < 1e-5
+        x0 = NufftRef.adjoint(y[:, z])
+        assert numpy.linalg.norm(x1[z] - x0)/numpy.linalg.norm(x0) < 1e-5
+    
+    sub = NufftObj.subset(numpy.arange(0, M, 2))
+    y2 = sub.forward(x)
+    assert numpy.linalg.norm(y2 - y1[::2])/numpy.linalg.norm(y1[::2]) < 1e-5
+
+if __name__ == '__main__':
+    test_hybrid()
+    test_hybrid_batch()
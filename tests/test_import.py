@@ -0,0 +1,19 @@
+"""
+Test that "import pynufft" stays lightweight for the CPU-only programs
+"""
+
+def test_import():
+    import sys
+    import os
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmark'))
+    try:
+        from benchmark_import import import_time
+    finally:
+        sys.path.pop(0)
+    seconds, heavy = import_time('import pynufft\npynufft.NUFFT_cpu()', repeat = 1)
+    assert heavy == []
+    seconds, heavy = import_time('from pynufft import NUFFT_hsa', repeat = 1)
+    assert 'matplotlib' not in heavy
+
+if __name__ == '__main__':
+    test_import()
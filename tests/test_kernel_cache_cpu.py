@@ -0,0 +1,48 @@
+"""
+Test the per-plan cache of the solver kernels (NUFFT_cpu.kernels)
+"""
+import numpy
+import tempfile
+
+def test_kernel_cache():
+    from pynufft import NUFFT_cpu, helper
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (1000, 2))
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd)
+    y = NufftObj.forward(rng.randn(*Nd) + 1.0j*rng.randn(*Nd))
+    assert NufftObj.kernels == {}
+    
+    x1 = NufftObj.solve(y, 'L1TVOLS', maxiter = 5, rho = 1.0)
+    assert sorted(NufftObj.kernels.keys()) == ['density', 'laplacian']
+    assert numpy.allclose(NufftObj.kernels['laplacian'], helper.create_laplacian_kernel(NufftObj))
+    density = NufftObj.kernels['density']
+    x2 = NufftObj.solve(y, 'L1TVOLS', maxiter = 5, rho = 1.0)
+    assert NufftObj.kernels['density'] is density # not recomputed
+    assert numpy.allclose(x1, x2)
+    
+    NufftObj.solve(y, 'pcg', maxiter = 5, toeplitz = True)
+    assert 'toeplitz' in NufftObj.kernels
+    
+    # the subset keeps the Laplacian only
+    sub = NufftObj.subset(numpy.arange(0, 500))
+    assert sorted(sub.kernels.keys()) == ['laplacian']
+    
+    # the kernels are saved with the plan
+    path = tempfile.mkdtemp()
+    NufftObj.save(path)
+    NufftLoad = NUFFT_cpu()
+    NufftLoad.load(path)
+    assert sorted(NufftLoad.kernels.keys()) == ['density', 'laplacian', 'toeplitz']
+    assert numpy.allclose(NufftLoad.kernels['density'], density)
+    assert numpy.allclose(NufftLoad.solve(y, 'L1TVOLS', maxiter = 5, rho = 1.0), x1)
+    
+    # plan() clears the cache
+    NufftObj.plan(om[:500], Nd, Kd, Jd)
+    assert NufftObj.kernels == {}
+
+if __name__ == '__main__':
+    test_kernel_cache()
@@ -0,0 +1,30 @@
+"""
+Test the per-plan cache of the solver kernels of NUFFT_hsa on the OpenCL backend
+"""
+import numpy
+
+def test_kernel_cache_hsa():
+    from pynufft import NUFFT_hsa
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (1000, 2))
+    NufftObj = NUFFT_hsa('ocl', 0, 0)
+    NufftObj.plan(om, Nd, Kd, Jd, gather = True)
+    x = (rng.randn(*Nd) + 1.0j*rng.randn(*Nd)).astype(numpy.complex64)
+    gy = NufftObj.forward(NufftObj.to_device(x))
+    
+    x1 = NufftObj.solve(gy, 'L1TVOLS', maxiter = 5, rho = 1.0).get()
+    assert sorted(NufftObj.kernels.keys()) == ['density', 'laplacian']
+    density = NufftObj.kernels['density']
+    x2 = NufftObj.solve(gy, 'L1TVOLS', maxiter = 5, rho = 1.0).get()
+    assert NufftObj.kernels['density'] is density # not recomputed
+    assert numpy.allclose(x1, x2, atol = 1e-5*numpy.abs(x1).max())
+    
+    NufftObj.plan(om, Nd, Kd, Jd, gather = True) # plan() clears the cache
+    assert NufftObj.kernels == {}
+
+if __name__ == '__main__':
+    test_kernel_cache_hsa()
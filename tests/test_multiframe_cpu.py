@@ -0,0 +1,72 @@
+"""
+Test NUFFT_multiframe against the per-frame NUFFT_cpu
+"""
+import numpy
+
+def test_multiframe():
+    from pynufft import NUFFT_cpu, NUFFT_multiframe
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    T = 4
+    M = 100
+    rng = numpy.random.RandomState(0)
+    om = [rng.uniform(-numpy.pi, numpy.pi, (M, 2)) for t in range(0, T)]
+    
+    NufftObj = NUFFT_multiframe()
+    NufftObj.plan(om, Nd, Kd, Jd)
+    assert NufftObj.multi_M == (M, T)
+    assert NufftObj.sp.shape == (M*T, 32*32*T)
+    
+    x = rng.randn(*(Nd + (T, ))) + 1.0j*rng.randn(*(Nd + (T, )))
+    y = rng.randn(M, T) + 1.0j*rng.randn(M, T)
+    
+    y1 = NufftObj.forward(x)
+    x1 = NufftObj.adjoint(y)
+    assert y1.shape == (M, T)
+    assert x1.shape == Nd + (T, )
+    for t in range(0, T):
+        NufftRef = NUFFT_cpu()
+        NufftRef.plan(om[t], Nd, Kd, Jd)
+        y0 = NufftRef.forward(x[..., t])
+        assert numpy.linalg.norm(y1[:, t] - y0)/numpy.linalg.norm(y0) < 1e-5
+        x0 = NufftRef.adjoint(y[:, t])
+        assert numpy.linalg.norm(x1[..., t] - x0)/numpy.linalg.norm(x0) < 1e-5
+    
+    x2 = NufftObj.solve(y1, 'cg', maxiter = 5)
+    assert x2.shape == Nd + (T, )
+    x3 = NufftObj.solve(y1, 'lsmr', maxiter = 5)
+    assert x3.shape == Nd + (T, )
+
+def test_multiframe_unsupported():
+    from pynufft import NUFFT_multiframe, PlanRegistry
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    T = 3
+    rng = numpy.random.RandomState(0)
+    om = [rng.uniform(-numpy.pi, numpy.pi, (100, 2)) for t in range(0, T)]
+    NufftObj = NUFFT_multiframe()
+    NufftObj.plan(om, Nd, Kd, Jd, batch = T)
+    y = NufftObj.forward(numpy.ones(Nd + (T, ), dtype = numpy.complex64))
+    
+    for call in (lambda: NufftObj.plan(om, Nd, Kd, Jd, batch = 2), 
+                 lambda: NufftObj.subset(numpy.arange(50)), 
+                 lambda: NufftObj.solve(y, 'cg', maxiter = 5, per_channel = True)):
+        try:
+            call()
+        except (TypeError, ValueError) as e:
+            assert 'NUFFT_multiframe' in str(e)
+        else:
+            raise AssertionError('the unsupported operation did not raise')
+    
+    registry = PlanRegistry(max_bytes = 2**40, nufft_class = NUFFT_multiframe)
+    A = registry.get(om, Nd, Kd, Jd)
+    assert registry.get(om, Nd, Kd, Jd) is A
+    assert A.multi_M == (100, T)
+
+if __name__ == '__main__':
+    test_multiframe()
+    test_multiframe_unsupported()
@@ -0,0 +1,89 @@
+"""
+Test the on-grid bypass of NUFFT_cpu
+"""
+import numpy
+
+def dft(x, om):
+    Nd = x.shape
+    grid = numpy.meshgrid(*[numpy.arange(0, N) - N/2 for N in Nd], indexing='ij')
+    y = numpy.empty((om.shape[0], ), dtype = numpy.complex128)
+    for m in range(0, om.shape[0]):
+        y[m] = numpy.sum(x * numpy.exp(-1.0j*sum(om[m, d]*grid[d] for d in range(0, len(Nd)))))
+    return y
+
+def hybrid_trajectory(Nd):
+    rng = numpy.random.RandomState(0)
+    # Cartesian calibration region on the Nd grid
+    c0, c1 = numpy.meshgrid(numpy.arange(-4, 4), numpy.arange(-4, 4), indexing = 'ij')
+    om_grid = numpy.stack((c0.ravel()*2*numpy.pi/Nd[0], c1.ravel()*2*numpy.pi/Nd[1]), axis = 1)
+    om_rand = rng.uniform(-numpy.pi, numpy.pi, (200, 2))
+    om = numpy.concatenate((om_rand[:100], om_grid, om_rand[100:]), axis = 0)
+    return om
+
+def test_ongrid():
+    from pynufft import NUFFT_cpu
+    from pynufft.src._helper import helper
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    om = hybrid_trajectory(Nd)
+    
+    mask, Gd = helper.detect_ongrid(om, Nd, Kd)
+    assert numpy.sum(mask) == 64
+    assert Gd == Nd # all on-grid samples are on the Nd grid
+    
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd, ongrid = True)
+    NufftRef = NUFFT_cpu()
+    NufftRef.plan(om, Nd, Kd, Jd)
+    
+    rng = numpy.random.RandomState(1)
+    x = rng.randn(*Nd) + 1.0j*rng.randn(*Nd)
+    y_exact = dft(x, om)
+    y = NufftObj.forward(x)
+    y_ref = NufftRef.forward(x)
+    
+    err = numpy.linalg.norm(y - y_exact)/numpy.linalg.norm(y_exact)
+    err_ref = numpy.linalg.norm(y_ref - y_exact)/numpy.linalg.norm(y_exact)
+    assert err < 1e-3 
+    assert err <= err_ref * 1.01
+    # the on-grid samples are exact
+    assert numpy.allclose(y[mask], y_exact[mask], atol = 1e-4*numpy.linalg.norm(y_exact))
+    
+    # adjoint test: <A x, y> = <x, A^H y>, where adjoint() is normalized by 1/prod(Kd)
+    y2 = rng.randn(om.shape[0]) + 1.0j*rng.randn(om.shape[0])
+    lhs = numpy.vdot(NufftObj.forward(x), y2)
+    rhs = numpy.vdot(x, NufftObj.adjoint(y2))*numpy.prod(Kd)
+    assert abs(lhs - rhs) < 1e-4*abs(lhs)
+    
+    x2 = NufftObj.adjoint(y2)
+    x2_ref = NufftRef.adjoint(y2)
+    assert numpy.linalg.norm(x2 - x2_ref) < 1e-3*numpy.linalg.norm(x2_ref)
+
+def test_ongrid_batch_subset():
+    from pynufft import NUFFT_cpu
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    om = hybrid_trajectory(Nd)
+    
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd, batch = 3, ongrid = True)
+    
+    rng = numpy.random.RandomState(2)
+    x = rng.randn(16, 16, 3) + 0.0j
+    y = NufftObj.forward(x)
+    assert y.shape == (om.shape[0], 3)
+    for bat in range(0, 3):
+        y_exact = dft(x[..., bat], om)
+        assert numpy.linalg.norm(y[:, bat] - y_exact) < 1e-3*numpy.linalg.norm(y_exact)
+    assert NufftObj.adjoint(y).shape == (16, 16, 3)
+    
+    NufftSub = NufftObj.subset(numpy.arange(50, 200))
+    assert numpy.allclose(NufftSub.forward(x), y[50:200], atol = 1e-5*numpy.linalg.norm(y))
+
+if __name__ == '__main__':
+    test_ongrid()
+    test_ongrid_batch_subset()
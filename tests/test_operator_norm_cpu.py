@@ -0,0 +1,75 @@
+"""
+Test operator_norm(), the power-iteration estimate of ||A^H A|| which is cached per plan
+"""
+import numpy
+import tempfile
+
+def test_operator_norm():
+    from pynufft import NUFFT_cpu
+    from pynufft.linalg.solve_cpu import _power_iteration, _normal_operator
+    Nd = (32, 32)
+    Kd = (64, 64)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (2000, 2))
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd)
+    
+    L_ref = _power_iteration(_normal_operator(NufftObj), Nd, numpy.complex64, maxiter = 1000, tol = 1e-7)
+    L = NufftObj.operator_norm()
+    assert abs(L - L_ref)/L_ref < 1e-2
+    assert NufftObj.kernels['operator_norm']['L'] == L
+    
+    # the cached estimate is reused, and a smaller tol recomputes it
+    assert NufftObj.operator_norm(tol = 1e-2) == L
+    L2 = NufftObj.operator_norm(maxiter = 1000, tol = 1e-6)
+    assert abs(L2 - L_ref)/L_ref < 1e-3
+    assert NufftObj.kernels['operator_norm']['tol'] == 1e-6
+    assert NufftObj.operator_norm() == L2
+    
+    # fista takes its step size from the cache
+    y = NufftObj.forward(rng.randn(*Nd).astype(numpy.complex64))
+    result = NufftObj.solve(y, 'fista', maxiter = 2, lamb = 0.0, full_output = True)
+    assert result.info['L'] == L2
+    
+    # the estimate is saved with the plan, and dropped by subset() and plan()
+    path = tempfile.mkdtemp()
+    NufftObj.save(path)
+    NufftLoad = NUFFT_cpu()
+    NufftLoad.load(path)
+    assert NufftLoad.kernels['operator_norm']['L'] == L2
+    sub = NufftObj.subset(numpy.arange(1000))
+    assert 'operator_norm' not in sub.kernels
+    assert sub.operator_norm() < L2
+    NufftObj.plan(om, Nd, Kd, Jd)
+    assert 'operator_norm' not in NufftObj.kernels
+
+def test_operator_norm_one2many2one():
+    from pynufft import NUFFT_cpu
+    Nd = (32, 32)
+    Kd = (64, 64)
+    Jd = (6, 6)
+    batch = 3
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (2000, 2))
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd, batch = batch)
+    L = NufftObj.operator_norm()
+    coil = (rng.randn(*(Nd + (batch, ))) + 1.0j*rng.randn(*(Nd + (batch, )))).astype(numpy.complex64)
+    coil /= numpy.sqrt(numpy.sum(numpy.abs(coil)**2, -1))[..., None]
+    NufftObj.set_sense(coil)
+    L_sense = NufftObj.operator_norm(one2many2one = True)
+    assert 0 < L_sense <= 1.01*L
+    assert NufftObj.kernels['operator_norm']['L'] == L
+    
+    # the estimate of the coil sensitivities is cleared by set_sense() and reset_sense()
+    NufftObj.reset_sense()
+    assert 'operator_norm_one2many2one' not in NufftObj.kernels
+    assert abs(NufftObj.operator_norm(one2many2one = True) - L)/L < 1e-2 # the coils are averaged
+    NufftObj.set_sense(coil)
+    assert 'operator_norm_one2many2one' not in NufftObj.kernels
+    assert 'operator_norm' in NufftObj.kernels
+
+if __name__ == '__main__':
+    test_operator_norm()
+    test_operator_norm_one2many2one()
@@ -0,0 +1,29 @@
+"""
+Test operator_norm() of NUFFT_hsa on the OpenCL backend
+"""
+import numpy
+
+def test_operator_norm_hsa():
+    from pynufft import NUFFT_cpu, NUFFT_hsa
+    
+    Nd = (32, 32)
+    Kd = (64, 64)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (2000, 2))
+    NufftObj = NUFFT_hsa('ocl', 0, 0)
+    NufftObj.plan(om, Nd, Kd, Jd, gather = True)
+    NufftCPU = NUFFT_cpu()
+    NufftCPU.plan(om, Nd, Kd, Jd)
+    
+    L = NufftObj.operator_norm(maxiter = 1000, tol = 1e-6)
+    L_cpu = NufftCPU.operator_norm(maxiter = 1000, tol = 1e-6)
+    assert abs(L - L_cpu)/L_cpu < 1e-3
+    assert NufftObj.operator_norm() == L # cached
+    
+    y = NufftObj.to_device((rng.randn(2000) + 1.0j*rng.randn(2000)).astype(numpy.complex64))
+    NufftObj.solve(y, 'fista', maxiter = 2, lamb = 0.0)
+    assert NufftObj.kernels['operator_norm']['L'] == L # fista takes its step size from the cache
+
+if __name__ == '__main__':
+    test_operator_norm_hsa()
@@ -0,0 +1,61 @@
+"""
+Test the image-domain conjugate gradient solver ('pcg') of NUFFT_cpu
+"""
+import numpy
+
+def test_pcg():
+    from pynufft import NUFFT_cpu
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(0)
+    # variable density: uniform samples and a dense center
+    om = numpy.concatenate((rng.uniform(-numpy.pi, numpy.pi, (600, 2)), 
+                            numpy.clip(rng.randn(1400, 2)*0.4, -numpy.pi, numpy.pi)))
+    M = om.shape[0]
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd)
+    
+    A = numpy.stack([NufftObj.forward(e.reshape(Nd)) for e in numpy.eye(numpy.prod(Nd))], axis = 1)
+    y = rng.randn(M) + 1.0j*rng.randn(M)
+    x0 = numpy.linalg.lstsq(A, y, rcond = None)[0].reshape(Nd)
+    
+    niter = {}
+    for toeplitz in (False, True):
+        for precond in (None, 'circulant'):
+            result = NufftObj.solve(y, 'pcg', maxiter = 500, tol = 1e-5, toeplitz = toeplitz, precond = precond, full_output = True)
+            assert result.x.shape == Nd
+            assert numpy.linalg.norm(result.x - x0)/numpy.linalg.norm(x0) < 1e-3
+            assert result.niter == len(result.residuals) < 500
+            assert result.residuals[-1] < 1e-5
+            assert result.time > 0
+            niter[(toeplitz, precond)] = result.niter
+    assert niter[(False, 'circulant')] < niter[(False, None)]
+    assert niter[(True, 'circulant')] < niter[(True, None)]
+    
+    x = NufftObj.solve(y, 'pcg', maxiter = 3) # without full_output
+    assert x.shape == Nd
+
+def test_pcg_batch():
+    from pynufft import NUFFT_cpu
+    
+    Nd = (16, 12)
+    Kd = (32, 24)
+    Jd = (6, 6)
+    batch = 2
+    rng = numpy.random.RandomState(1)
+    om = rng.uniform(-numpy.pi, numpy.pi, (800, 2))
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd, batch = batch)
+    x = rng.randn(*Nd + (batch, )) + 1.0j*rng.randn(*Nd + (batch, ))
+    y = NufftObj.forward(x)
+    
+    x1 = NufftObj.solve(y, 'pcg', maxiter = 200, tol = 1e-6, toeplitz = True, precond = 'circulant')
+    assert x1.shape == Nd + (batch, )
+    x2 = NufftObj.solve(y, 'pcg', maxiter = 200, tol = 1e-6)
+    assert numpy.linalg.norm(x1 - x2)/numpy.linalg.norm(x2) < 1e-3
+
+if __name__ == '__main__':
+    test_pcg()
+    test_pcg_batch()
@@ -0,0 +1,75 @@
+"""
+Test the independent per-channel solves of NUFFT_cpu.solve(..., per_channel = True)
+"""
+import numpy
+
+def _plan(**kwargs):
+    from pynufft import NUFFT_cpu
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    batch = 3
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (1000, 2))
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd, batch = batch, **kwargs)
+    x = rng.randn(*(Nd + (batch, ))) + 1.0j*rng.randn(*(Nd + (batch, )))
+    x[..., 1] *= 1e-3 # a channel with a different scale converges on its own tolerance
+    return NufftObj, NufftObj.forward(x)
+
+def test_per_channel():
+    from pynufft import NUFFT_cpu
+    NufftObj, y = _plan()
+    
+    for solver, kwargs in (('cg', {'maxiter': 20}), ('lsmr', {'maxiter': 20}), ('pcg', {'maxiter': 20})):
+        x = NufftObj.solve(y, solver, per_channel = True, **kwargs)
+        assert x.shape == NufftObj.multi_Nd
+        
+        # the same as the single-coil solves
+        single = NUFFT_cpu()
+        single.plan(NufftObj.st['om'], NufftObj.Nd, NufftObj.Kd, NufftObj.st['Jd'])
+        for bat in range(0, NufftObj.batch):
+            x1 = single.solve(y[:, bat], solver, **kwargs)
+            assert numpy.allclose(x[..., bat], x1, rtol = 1e-4, atol = 1e-6*numpy.abs(x1).max()), solver
+    
+    # each channel exits on its own tolerance
+    result = NufftObj.solve(y, 'cg', maxiter = 200, tol = 1e-3, per_channel = True, workers = 2, full_output = True)
+    assert result.x.shape == NufftObj.multi_Nd
+    assert len(result.info['channels']) == NufftObj.batch
+    assert result.niter == max(channel.niter for channel in result.info['channels'])
+    for channel in result.info['channels']:
+        assert channel.residuals[-1] < 1e-3
+    
+    # the processes attach the shared plan
+    x = NufftObj.solve(y, 'cg', maxiter = 20, per_channel = True, pool = 'process', workers = 2)
+    assert numpy.allclose(x, NufftObj.solve(y, 'cg', maxiter = 20, per_channel = True))
+
+def test_per_channel_hybrid():
+    from pynufft import NUFFT_cpu
+    Nd = (16, 16, 4)
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (1000, 2))
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, (32, 32, 4), (6, 6, 1), ft_axes = (0, 1), hybrid = True)
+    x = rng.randn(*Nd) + 1.0j*rng.randn(*Nd)
+    y = NufftObj.forward(x)
+    
+    x1 = NufftObj.solve(y, 'cg', maxiter = 20, per_channel = True) # each partition is solved independently
+    assert x1.shape == Nd
+    x2 = NufftObj.solve(y, 'cg', maxiter = 20) # the stacked system of all partitions
+    assert numpy.linalg.norm(x1 - x2)/numpy.linalg.norm(x2) < 1e-2
+
+def test_per_channel_dc():
+    # the single-coil view does not share the Pipe weights (shape multi_M) with the batch plan
+    for order in ((True, False), (False, True)):
+        NufftObj, y = _plan()
+        results = [NufftObj.solve(y, 'dc', maxiter = 5, per_channel = per_channel) for per_channel in order]
+        for x in results:
+            assert x.shape == NufftObj.multi_Nd
+        assert NufftObj.kernels['pipe_density']['W'].shape == NufftObj.multi_M
+        assert numpy.allclose(results[0], results[1], rtol = 1e-4, atol = 1e-6*numpy.abs(results[1]).max())
+
+if __name__ == '__main__':
+    test_per_channel()
+    test_per_channel_hybrid()
+    test_per_channel_dc()
@@ -0,0 +1,62 @@
+"""
+Test the Pipe density compensation of solve(..., 'dc'), which is cached per plan
+"""
+import numpy
+import tempfile
+
+def _radial(nr, ns):
+    r = numpy.linspace(-numpy.pi, numpy.pi, ns, endpoint = False)
+    a = numpy.arange(nr)*numpy.pi/nr
+    return numpy.stack([numpy.outer(numpy.cos(a), r).ravel(), numpy.outer(numpy.sin(a), r).ravel()], 1)
+
+def test_pipe_density():
+    from pynufft import NUFFT_cpu
+    Nd = (32, 32)
+    Kd = (64, 64)
+    Jd = (6, 6)
+    om = _radial(32, 64)
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd)
+    y = numpy.ones(om.shape[0], dtype = numpy.complex64)
+    
+    result = NufftObj.solve(y, 'dc', maxiter = 20, full_output = True)
+    assert result.niter == 20
+    assert result.residuals[-1] < 1e-1*result.residuals[0]
+    cache = NufftObj.kernels['pipe_density']
+    W = cache['W']
+    assert cache['niter'] == 20
+    E = NufftObj.k2y(NufftObj.y2k(W))
+    assert numpy.std(E)/numpy.abs(numpy.mean(E)) < 1e-2 # P P^H W is flat
+    assert numpy.allclose(numpy.mean(numpy.real(NufftObj.forward(NufftObj.adjoint(W)))), 1.0)
+    # the ramp of the radial trajectory
+    spoke = numpy.abs(W[:64])
+    assert spoke[32] < spoke[16] < spoke[0]
+    
+    # the cached weights are reused
+    x = NufftObj.solve(y, 'dc', maxiter = 10)
+    assert NufftObj.kernels['pipe_density']['W'] is W
+    assert numpy.allclose(x, NufftObj.adjoint(W*y))
+    
+    # more iterations continue from the cached weights
+    NufftObj.solve(y, 'dc', maxiter = 25)
+    assert NufftObj.kernels['pipe_density']['niter'] == 25
+    
+    # tol exits early
+    NufftObj.plan(om, Nd, Kd, Jd)
+    assert NufftObj.kernels == {}
+    result = NufftObj.solve(y, 'dc', maxiter = 100, tol = 1e-2, full_output = True)
+    assert result.niter < 100
+    assert NufftObj.kernels['pipe_density']['residual'] < 1e-2
+    
+    # the weights are saved with the plan
+    W = NufftObj.kernels['pipe_density']['W']
+    path = tempfile.mkdtemp()
+    NufftObj.save(path)
+    NufftLoad = NUFFT_cpu()
+    NufftLoad.load(path)
+    assert numpy.allclose(NufftLoad.kernels['pipe_density']['W'], W)
+    result = NufftLoad.solve(y, 'dc', maxiter = 100, tol = 1e-2, full_output = True)
+    assert result.niter == 0
+
+if __name__ == '__main__':
+    test_pipe_density()
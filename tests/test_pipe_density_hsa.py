@@ -0,0 +1,32 @@
+"""
+Test the Pipe density compensation of NUFFT_hsa on the OpenCL backend
+"""
+import numpy
+
+def test_pipe_density_hsa():
+    from pynufft import NUFFT_cpu, NUFFT_hsa
+    
+    Nd = (32, 32)
+    Kd = (64, 64)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (2000, 2))
+    NufftObj = NUFFT_hsa('ocl', 0, 0)
+    NufftObj.plan(om, Nd, Kd, Jd, gather = True)
+    NufftCPU = NUFFT_cpu()
+    NufftCPU.plan(om, Nd, Kd, Jd)
+    y = (rng.randn(2000) + 1.0j*rng.randn(2000)).astype(numpy.complex64)
+    
+    x = NufftObj.solve(NufftObj.to_device(y), 'dc', maxiter = 10).get()
+    x_cpu = NufftCPU.solve(y, 'dc', maxiter = 10)
+    assert numpy.linalg.norm(x - x_cpu)/numpy.linalg.norm(x_cpu) < 1e-3
+    W = NufftObj.kernels['pipe_density']['W']
+    NufftObj.solve(NufftObj.to_device(y), 'dc', maxiter = 10)
+    assert NufftObj.kernels['pipe_density']['W'] is W # not recomputed
+    
+    result = NufftObj.solve(NufftObj.to_device(y), 'dc', maxiter = 50, tol = 5e-2, full_output = True)
+    assert NufftObj.kernels['pipe_density']['residual'] < 5e-2
+    assert result.niter < 10
+
+if __name__ == '__main__':
+    test_pipe_density_hsa()
@@ -0,0 +1,94 @@
+"""
+Test the LRU plan registry
+"""
+import numpy
+
+def test_plan_registry():
+    from pynufft import PlanRegistry
+    from pynufft.linalg.plan_registry import plan_nbytes
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(0)
+    om = [rng.uniform(-numpy.pi, numpy.pi, (200, 2)) for n in range(0, 3)]
+    
+    registry = PlanRegistry(max_bytes = 2**40)
+    A = registry.get(om[0], Nd, Kd, Jd)
+    nbytes = plan_nbytes(A)
+    assert nbytes >= A.sp.data.nbytes + A.spH.data.nbytes
+    assert registry.get(om[0].copy(), Nd, Kd, Jd) is A # same trajectory
+    assert registry.get(om[0], Nd, Kd, Jd, batch = 2) is not A
+    assert registry.get(om[0], Nd, Kd, Jd, dedup = True) is not A
+    stats = registry.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 3
+    assert stats['plans'] == 3
+    assert stats['plan_time_saved'] > 0
+    
+    # room for two plans of om
+    registry = PlanRegistry(max_bytes = 2*nbytes + nbytes//2)
+    A = registry.get(om[0], Nd, Kd, Jd)
+    B = registry.get(om[1], Nd, Kd, Jd)
+    assert registry.get(om[0], Nd, Kd, Jd) is A # om[1] is now the least recently used
+    C = registry.get(om[2], Nd, Kd, Jd)
+    stats = registry.stats()
+    assert stats['evictions'] == 1
+    assert stats['resident_bytes'] == plan_nbytes(A) + plan_nbytes(C)
+    assert stats['resident_bytes'] <= registry.max_bytes
+    assert registry.get(om[0], Nd, Kd, Jd) is A
+    assert registry.get(om[1], Nd, Kd, Jd) is not B # re-planned
+    
+    registry.clear()
+    assert registry.stats()['resident_bytes'] == 0
+    
+    # the kernels cached by solve() are counted at the next lookup
+    registry = PlanRegistry(max_bytes = 2**40)
+    A = registry.get(om[0], Nd, Kd, Jd)
+    A.solve(A.forward(numpy.ones(Nd)), 'dc', maxiter = 2) # the Pipe weights
+    assert registry.get(om[0], Nd, Kd, Jd) is A
+    assert registry.stats()['resident_bytes'] == plan_nbytes(A) > nbytes
+
+def test_plan_registry_threads():
+    import threading
+    import time
+    from pynufft import NUFFT_cpu, PlanRegistry
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(0)
+    om = [rng.uniform(-numpy.pi, numpy.pi, (200, 2)) for n in range(0, 2)]
+    started = threading.Event()
+    release = threading.Event()
+    class SlowPlan(NUFFT_cpu):
+        plans = 0
+        def plan(self, om, *args, **kwargs):
+            SlowPlan.plans += 1
+            if om is slow:
+                started.set()
+                release.wait(10)
+            return NUFFT_cpu.plan(self, om, *args, **kwargs)
+    
+    registry = PlanRegistry(max_bytes = 2**40, nufft_class = SlowPlan)
+    slow = om[1]
+    A = registry.get(om[0], Nd, Kd, Jd)
+    results = []
+    threads = [threading.Thread(target = lambda: results.append(registry.get(om[1], Nd, Kd, Jd))) for n in range(0, 3)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(10)
+    time.sleep(0.1)
+    assert registry.get(om[0], Nd, Kd, Jd) is A # a hit is not blocked by the slow plan
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 3 and results[0] is results[1] is results[2]
+    assert SlowPlan.plans == 2 # the concurrent misses planned once
+    stats = registry.stats()
+    assert stats['misses'] == 2
+    assert stats['hits'] == 3
+
+if __name__ == '__main__':
+    test_plan_registry()
+    test_plan_registry_threads()
@@ -0,0 +1,47 @@
+"""
+Test the memory-mapped plan format of NUFFT_cpu
+"""
+import numpy
+
+def test_save_load():
+    import tempfile
+    import shutil
+    from pynufft import NUFFT_cpu
+    
+    Nd = (8, 8, 8)
+    Kd = (16, 16, 16)
+    Jd = (4, 4, 4)
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (300, 3))
+    
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd, batch = 2)
+    
+    path = tempfile.mkdtemp()
+    try:
+        NufftObj.save(path)
+        
+        NufftMap = NUFFT_cpu()
+        NufftMap.load(path)
+        # the CSR arrays are read-only views of the memory maps
+        assert not NufftMap.sp.data.flags.writeable
+        assert not NufftMap.spH.indices.flags.writeable
+        assert isinstance(NufftMap.sn, numpy.memmap)
+        assert NufftMap.multi_M == NufftObj.multi_M
+        assert NufftMap.Nd == NufftObj.Nd
+        
+        x = rng.randn(*(Nd + (2, ))) + 1.0j*rng.randn(*(Nd + (2, )))
+        y0 = NufftObj.forward(x)
+        assert numpy.allclose(NufftMap.forward(x), y0)
+        assert numpy.allclose(NufftMap.adjoint(y0), NufftObj.adjoint(y0))
+        
+        NufftMem = NUFFT_cpu()
+        NufftMem.load(path, mmap_mode = None)
+        assert NufftMem.sp.data.flags.writeable
+        assert numpy.allclose(NufftMem.forward(x), y0)
+        del NufftMap
+    finally:
+        shutil.rmtree(path)
+
+if __name__ == '__main__':
+    test_save_load()
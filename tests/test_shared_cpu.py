@@ -0,0 +1,54 @@
+"""
+Test the shared-memory plan of NUFFT_cpu
+"""
+import numpy
+import multiprocessing
+
+worker_nufft = None
+
+def init(handle):
+    global worker_nufft
+    from pynufft import NUFFT_cpu
+    worker_nufft = NUFFT_cpu()
+    worker_nufft.attach(handle)
+
+def forward(x):
+    return worker_nufft.forward(x)
+
+def test_shared():
+    from pynufft import NUFFT_cpu
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (200, 2))
+    
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd, ongrid = True, dedup = True)
+    handle = NufftObj.share()
+    try:
+        NufftView = NUFFT_cpu()
+        NufftView.attach(handle)
+        assert not NufftView.sp.data.flags.writeable
+        assert numpy.shares_memory(NufftView.sp.data, numpy.frombuffer(NufftView.attached_memory.buf, dtype = numpy.uint8))
+        
+        x = rng.randn(*Nd) + 1.0j*rng.randn(*Nd)
+        y0 = NufftObj.forward(x)
+        y1 = NufftView.forward(x)
+        assert numpy.allclose(y0, y1)
+        assert numpy.allclose(NufftObj.adjoint(y0), NufftView.adjoint(y0))
+        
+        pool = multiprocessing.get_context('fork').Pool(2, initializer = init, initargs = (handle, ))
+        try:
+            y2 = pool.map(forward, [x, 2*x])
+        finally:
+            pool.close()
+            pool.join()
+        assert numpy.allclose(y2[0], y0)
+        assert numpy.allclose(y2[1], 2*y0)
+    finally:
+        NufftObj.unshare()
+
+if __name__ == '__main__':
+    test_shared()
@@ -0,0 +1,65 @@
+"""
+Test the SolveResult, the callback and the tolerance of NUFFT_cpu.solve()
+"""
+import numpy
+
+def _plan():
+    from pynufft import NUFFT_cpu
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (1000, 2))
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd)
+    x = rng.randn(*Nd) + 1.0j*rng.randn(*Nd)
+    return NufftObj, NufftObj.forward(x)
+
+def test_solve_result():
+    from pynufft.linalg.solve_cpu import SolveResult
+    NufftObj, y = _plan()
+    
+    for solver, kwargs in (('cg', {'maxiter': 20}), ('bicgstab', {'maxiter': 20}), ('bicg', {'maxiter': 20}), 
+                           ('lgmres', {'maxiter': 5}), ('gmres', {'maxiter': 2, 'restart': 5}), 
+                           ('lsqr', {'iter_lim': 20}), ('lsmr', {'maxiter': 20}), 
+                           ('pcg', {'maxiter': 20}), ('L1TVOLS', {'maxiter': 5, 'rho': 0.1}), ('dc', {'maxiter': 5})):
+        calls = []
+        shapes = set()
+        def callback(niter, x, residual):
+            calls.append(niter)
+            if x is not None:
+                shapes.add(x.shape)
+        result = NufftObj.solve(y, solver, callback = callback, full_output = True, **kwargs)
+        assert isinstance(result, SolveResult)
+        assert result.solver == solver
+        assert result.x.shape == NufftObj.st['Nd']
+        assert result.niter > 0
+        assert len(result.times) == len(result.residuals) == result.niter
+        assert calls == list(range(1, result.niter + 1))
+        if solver not in ('lsqr', 'lsmr', 'dc'):
+            assert shapes == {NufftObj.st['Nd']}, solver # the image, not the Kd grid
+        assert result.time >= numpy.sum(result.times)*0.99
+        if solver in ('cg', 'bicgstab', 'pcg', 'lsqr'):
+            assert numpy.isfinite(result.residuals[-1])
+        if solver in ('lsqr', 'lsmr'):
+            assert result.info['itn'] == result.niter
+        repr(result)
+        
+        x = NufftObj.solve(y, solver, **kwargs) # the default output is the image
+        assert x.shape == NufftObj.st['Nd']
+
+def test_early_exit():
+    NufftObj, y = _plan()
+    
+    for solver, kwargs in (('cg', {'maxiter': 200}), ('bicgstab', {'maxiter': 200}), ('pcg', {'maxiter': 200}), 
+                           ('L1TVOLS', {'maxiter': 200, 'rho': 1.0})):
+        result = NufftObj.solve(y, solver, tol = 5e-2, full_output = True, **kwargs)
+        assert result.niter < 200
+        assert result.residuals[-1] < 5e-2
+        
+        result = NufftObj.solve(y, solver, callback = lambda niter, x, residual: niter >= 3, full_output = True, **kwargs)
+        assert result.niter == 3
+
+if __name__ == '__main__':
+    test_solve_result()
+    test_early_exit()
@@ -0,0 +1,47 @@
+"""
+Test the SolveResult, the callback and the tolerance of NUFFT_hsa.solve() on the OpenCL backend
+"""
+import numpy
+
+def test_solve_result_hsa():
+    from pynufft import NUFFT_hsa
+    from pynufft.linalg.solve_cpu import SolveResult
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (1000, 2))
+    NufftObj = NUFFT_hsa('ocl', 0, 0)
+    NufftObj.plan(om, Nd, Kd, Jd, gather = True)
+    x = (rng.randn(*Nd) + 1.0j*rng.randn(*Nd)).astype(numpy.complex64)
+    gy = NufftObj.forward(NufftObj.to_device(x))
+    
+    for solver, kwargs in (('cg', {}), ('L1TVOLS', {'rho': 1.0})):
+        calls = []
+        images = []
+        def callback(niter, x, residual):
+            calls.append(niter)
+            images.append(x.get())
+        result = NufftObj.solve(gy, solver, maxiter = 5, callback = callback, full_output = True, **kwargs)
+        assert isinstance(result, SolveResult)
+        assert result.x.shape == Nd
+        assert result.niter == 5
+        assert calls == [1, 2, 3, 4, 5]
+        assert images[-1].shape == Nd # the image, not the Kd grid
+        assert numpy.allclose(images[-1], result.x.get(), atol = 1e-5*numpy.abs(images[-1]).max())
+        assert numpy.all(numpy.isfinite(result.residuals))
+        
+        result = NufftObj.solve(gy, solver, maxiter = 200, tol = 5e-2, full_output = True, **kwargs)
+        assert result.niter < 200
+        assert result.residuals[-1] < 5e-2
+        
+        result = NufftObj.solve(gy, solver, maxiter = 200, callback = lambda niter, x, residual: niter >= 3, full_output = True, **kwargs)
+        assert result.niter == 3
+    
+    # the residuals of cg decrease
+    result = NufftObj.solve(gy, 'cg', maxiter = 10, full_output = True)
+    assert result.residuals[-1] < result.residuals[0]
+
+if __name__ == '__main__':
+    test_solve_result_hsa()
@@ -0,0 +1,65 @@
+"""
+Test NUFFT_cpu.subset()
+"""
+import numpy
+
+def test_subset():
+    from pynufft import NUFFT_cpu
+    
+    Nd = (32, 32)  # image size
+    Kd = (64, 64)  # k-space size
+    Jd = (6, 6)  # interpolation size
+    om = numpy.random.RandomState(0).uniform(-numpy.pi, numpy.pi, (2000, 2))
+    
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd)
+    
+    image = numpy.random.RandomState(1).randn(*Nd) + 0.0j
+    y = NufftObj.forward(image)
+    
+    mask = numpy.arange(0, 2000) % 3 == 0
+    NufftSub = NufftObj.subset(mask)
+    
+    # the subset shares the scaling factor and the preindex arrays
+    assert NufftSub.sn is NufftObj.sn
+    assert NufftSub.KdCPUorder is NufftObj.KdCPUorder
+    assert NufftSub.st['M'] == numpy.sum(mask)
+    
+    NufftRef = NUFFT_cpu()
+    NufftRef.plan(om[mask], Nd, Kd, Jd)
+    
+    y_sub = NufftSub.forward(image)
+    assert numpy.allclose(y_sub, y[mask], atol = 1e-5*numpy.linalg.norm(y))
+    
+    x_sub = NufftSub.adjoint(y[mask])
+    x_ref = NufftRef.adjoint(y[mask])
+    assert numpy.allclose(x_sub, x_ref, atol = 1e-5*numpy.linalg.norm(x_ref))
+    
+    # the parent plan is not changed by the subset
+    assert NufftObj.st['M'] == 2000
+    assert NufftObj.forward(image).shape == (2000, )
+
+def test_subset_batch():
+    from pynufft import NUFFT_cpu
+    
+    Nd = (32, 32)
+    Kd = (64, 64)
+    Jd = (6, 6)
+    om = numpy.random.RandomState(0).uniform(-numpy.pi, numpy.pi, (2000, 2))
+    
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd, batch = 4)
+    
+    x = numpy.random.RandomState(1).randn(32, 32, 4) + 0.0j
+    y = NufftObj.forward(x)
+    
+    indices = numpy.arange(100, 700)
+    NufftSub = NufftObj.subset(indices)
+    y_sub = NufftSub.forward(x)
+    assert y_sub.shape == (600, 4)
+    assert numpy.allclose(y_sub, y[indices], atol = 1e-5*numpy.linalg.norm(y))
+    assert NufftSub.adjoint(y_sub).shape == (32, 32, 4)
+
+if __name__ == '__main__':
+    test_subset()
+    test_subset_batch()
@@ -0,0 +1,53 @@
+"""
+Test the in-place finite differences and shrinkage of L1TVOLS (solve_cpu._TVEngine)
+"""
+import numpy
+
+def test_diff():
+    from pynufft import helper
+    from pynufft.linalg.solve_cpu import cDiff, _TVEngine
+    rng = numpy.random.RandomState(0)
+    for Nd in ((7, ), (6, 5), (4, 1, 3)):
+        x = (rng.randn(*Nd) + 1.0j*rng.randn(*Nd)).astype(numpy.complex64)
+        d_indx, dt_indx = helper.indxmap_diff(Nd)
+        out = numpy.empty_like(x)
+        for pp in range(0, len(Nd)):
+            _TVEngine.diff(x, pp, out)
+            assert numpy.allclose(out, cDiff(x, d_indx[pp]))
+            _TVEngine.diff(x, pp, out, transpose = True)
+            assert numpy.allclose(out, cDiff(x, dt_indx[pp]))
+
+def test_threads():
+    from pynufft import NUFFT_cpu
+    from pynufft.linalg.solve_cpu import _TVEngine
+    rng = numpy.random.RandomState(0)
+    Nd = (12, 10, 8)
+    x = (rng.randn(*Nd) + 1.0j*rng.randn(*Nd)).astype(numpy.complex64)
+    AHyk = (rng.randn(*Nd) + 1.0j*rng.randn(*Nd)).astype(numpy.complex64)
+    results = []
+    for threads in (None, 3):
+        engine = _TVEngine(Nd, numpy.complex64, threads)
+        bb = numpy.zeros((3, ) + Nd, dtype = numpy.complex64)
+        dd = numpy.zeros((3, ) + Nd, dtype = numpy.complex64)
+        rhs = numpy.empty(Nd, dtype = numpy.complex64)
+        for pp in range(0, 3):
+            engine.rhs(AHyk, dd, bb, 1.0, 2.0, rhs)
+            engine.shrink(x + pp, bb, dd, 0.5)
+        engine.close()
+        results += [(rhs, bb, dd), ]
+    for a, b in zip(results[0], results[1]):
+        assert numpy.allclose(a, b)
+    
+    # the solver
+    Nd = (16, 16)
+    om = rng.uniform(-numpy.pi, numpy.pi, (1000, 2))
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, (32, 32), (6, 6))
+    y = NufftObj.forward(rng.randn(*Nd) + 1.0j*rng.randn(*Nd))
+    x1 = NufftObj.solve(y, 'L1TVOLS', maxiter = 10, rho = 1.0)
+    x2 = NufftObj.solve(y, 'L1TVOLS', maxiter = 10, rho = 1.0, threads = 2)
+    assert numpy.allclose(x1, x2)
+
+if __name__ == '__main__':
+    test_diff()
+    test_threads()
@@ -0,0 +1,66 @@
+"""
+Test the warm start (x0 and state) of NUFFT_cpu.solve() across dynamic frames
+"""
+import numpy
+
+def _frames():
+    from pynufft import NUFFT_cpu
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (1000, 2))
+    NufftObj = NUFFT_cpu()
+    NufftObj.plan(om, Nd, Kd, Jd)
+    x1 = rng.randn(*Nd) + 1.0j*rng.randn(*Nd)
+    x2 = x1 + 0.01*(rng.randn(*Nd) + 1.0j*rng.randn(*Nd)) # the next frame is slightly different
+    return NufftObj, NufftObj.forward(x1), NufftObj.forward(x2)
+
+def test_warm_start():
+    NufftObj, y1, y2 = _frames()
+    
+    for solver, kwargs in (('cg', {'maxiter': 200}), ('bicgstab', {'maxiter': 200}), ('pcg', {'maxiter': 200}), 
+                           ('lsmr', {'maxiter': 200})):
+        x1 = NufftObj.solve(y1, solver, tol = 1e-2, **kwargs)
+        cold = NufftObj.solve(y2, solver, tol = 1e-2, full_output = True, **kwargs)
+        warm = NufftObj.solve(y2, solver, tol = 1e-2, full_output = True, x0 = x1, **kwargs)
+        assert warm.niter < cold.niter, solver
+        assert warm.x.shape == NufftObj.st['Nd']
+        
+    # L1TVOLS is warm started by the split-Bregman state of the previous frame
+    state = {}
+    x1 = NufftObj.solve(y1, 'L1TVOLS', maxiter = 200, rho = 1.0, tol = 1e-2, state = state)
+    cold = NufftObj.solve(y2, 'L1TVOLS', maxiter = 200, rho = 1.0, tol = 1e-2, full_output = True)
+    warm = NufftObj.solve(y2, 'L1TVOLS', maxiter = 200, rho = 1.0, tol = 1e-2, full_output = True, x0 = x1, state = state)
+    assert warm.niter < cold.niter
+    assert numpy.linalg.norm(warm.x - cold.x)/numpy.linalg.norm(cold.x) < 0.1
+    
+    # x0 alone seeds the split variables, so the first iterations are closer to the solution
+    first = NufftObj.solve(y2, 'L1TVOLS', maxiter = 1, rho = 1.0, x0 = x1)
+    assert numpy.linalg.norm(first - x1)/numpy.linalg.norm(x1) < 0.3
+    for maxiter in (1, 10):
+        x_cold = NufftObj.solve(y2, 'L1TVOLS', maxiter = maxiter, rho = 1.0)
+        x_warm = NufftObj.solve(y2, 'L1TVOLS', maxiter = maxiter, rho = 1.0, x0 = x1)
+        assert numpy.linalg.norm(x_warm - cold.x) < numpy.linalg.norm(x_cold - cold.x)
+
+def test_state():
+    NufftObj, y1, y2 = _frames()
+    
+    state = {}
+    x1 = NufftObj.solve(y1, 'L1TVOLS', maxiter = 10, rho = 1.0, state = state)
+    assert sorted(state.keys()) == ['AHyk', 'bb', 'dd']
+    assert len(state['bb']) == len(state['dd']) == 2
+    
+    # continuing the state of the same frame is the same as more iterations
+    x2 = NufftObj.solve(y1, 'L1TVOLS', maxiter = 10, rho = 1.0, x0 = x1, state = state)
+    x20 = NufftObj.solve(y1, 'L1TVOLS', maxiter = 20, rho = 1.0)
+    assert numpy.linalg.norm(x2 - x20)/numpy.linalg.norm(x20) < 1e-6
+    
+    # the next frame
+    AHyk = state['AHyk'].copy()
+    NufftObj.solve(y2, 'L1TVOLS', maxiter = 5, rho = 1.0, x0 = x2, state = state)
+    assert not numpy.allclose(state['AHyk'], AHyk)
+
+if __name__ == '__main__':
+    test_warm_start()
+    test_state()
@@ -0,0 +1,46 @@
+"""
+Test the warm start (x0 and state) of NUFFT_hsa.solve() on the OpenCL backend
+"""
+import numpy
+
+def test_warm_start_hsa():
+    from pynufft import NUFFT_hsa
+    
+    Nd = (16, 16)
+    Kd = (32, 32)
+    Jd = (6, 6)
+    rng = numpy.random.RandomState(0)
+    om = rng.uniform(-numpy.pi, numpy.pi, (1000, 2))
+    NufftObj = NUFFT_hsa('ocl', 0, 0)
+    NufftObj.plan(om, Nd, Kd, Jd, gather = True)
+    x1 = (rng.randn(*Nd) + 1.0j*rng.randn(*Nd)).astype(numpy.complex64)
+    x2 = (x1 + 0.01*(rng.randn(*Nd) + 1.0j*rng.randn(*Nd))).astype(numpy.complex64) # the next frame
+    gy1 = NufftObj.forward(NufftObj.to_device(x1))
+    gy2 = NufftObj.forward(NufftObj.to_device(x2))
+    
+    # cg starts from x0, which can be a numpy or a device array
+    x = NufftObj.solve(gy1, 'cg', maxiter = 200, tol = 1e-2)
+    cold = NufftObj.solve(gy2, 'cg', maxiter = 200, tol = 1e-2, full_output = True)
+    warm = NufftObj.solve(gy2, 'cg', maxiter = 200, tol = 1e-2, full_output = True, x0 = x)
+    assert warm.niter < cold.niter
+    warm2 = NufftObj.solve(gy2, 'cg', maxiter = 200, tol = 1e-2, full_output = True, x0 = x.get())
+    assert warm2.niter == warm.niter
+    
+    # L1TVOLS continues from the split-Bregman state of the previous frame
+    state = {}
+    x = NufftObj.solve(gy1, 'L1TVOLS', maxiter = 200, rho = 1.0, tol = 1e-2, state = state)
+    assert sorted(state.keys()) == ['AHyk', 'bb', 'dd']
+    assert state['bb'].shape == (2, ) + Nd
+    cold = NufftObj.solve(gy2, 'L1TVOLS', maxiter = 200, rho = 1.0, tol = 1e-2, full_output = True)
+    warm = NufftObj.solve(gy2, 'L1TVOLS', maxiter = 200, rho = 1.0, tol = 1e-2, full_output = True, x0 = x, state = state)
+    assert warm.niter < cold.niter
+    assert numpy.linalg.norm(warm.x.get() - cold.x.get())/numpy.linalg.norm(cold.x.get()) < 0.1
+    
+    # x0 alone seeds the split variables, so the first iteration is close to x0
+    first = NufftObj.solve(gy2, 'L1TVOLS', maxiter = 1, rho = 1.0, x0 = x).get()
+    assert numpy.linalg.norm(first - x.get())/numpy.linalg.norm(x.get()) < 0.3
+    x_cold = NufftObj.solve(gy2, 'L1TVOLS', maxiter = 1, rho = 1.0).get()
+    assert numpy.linalg.norm(first - cold.x.get()) < numpy.linalg.norm(x_cold - cold.x.get())
+
+if __name__ == '__main__':
+    test_warm_start_hsa()